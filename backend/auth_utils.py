@@ -1,7 +1,12 @@
 from fastapi import Request, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import supabase_client, fallback_db, is_using_fallback
+from database import supabase_auth, fallback_db, is_using_fallback, run_fallback, get_supabase_with_auth, UserScopedClient
 from models import User
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import asyncio
+import hashlib
+import time
 import jwt
 import os
 
@@ -9,8 +14,157 @@ import os
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 
+# Supabase access token verification
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+SUPABASE_JWKS_TTL_SECONDS = int(os.getenv("SUPABASE_JWKS_TTL_SECONDS", "600"))
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))
+
 security = HTTPBearer()
 
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified access tokens -> User.
+    Keys are token hashes (raw tokens are never kept) and every entry
+    expires at its token's own `exp` claim.
+    """
+    def __init__(self, max_size: int = TOKEN_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, tuple[float, User]]" = OrderedDict()
+    
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+    
+    def get(self, token: str) -> Optional[User]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user
+    
+    def put(self, token: str, user: User, expires_at: float):
+        key = self._key(token)
+        self._entries[key] = (expires_at, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def discard(self, token: str):
+        self._entries.pop(self._key(token), None)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class JWKSCache:
+    """Signing keys from the Supabase JWKS endpoint, refreshed on TTL or unknown kid"""
+    MIN_REFRESH_INTERVAL = 30
+    
+    def __init__(self, ttl: int = SUPABASE_JWKS_TTL_SECONDS):
+        self.ttl = ttl
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def get_key(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        if kid in self._keys and time.time() - self._fetched_at < self.ttl:
+            return self._keys[kid]
+        async with self._lock:
+            if time.time() - self._fetched_at >= self.MIN_REFRESH_INTERVAL:
+                await self._refresh()
+        return self._keys.get(kid)
+    
+    async def _refresh(self):
+        if supabase_auth is None:
+            return
+        try:
+            jwks = await supabase_auth.get_jwks()
+        except Exception as e:
+            print(f"Failed to fetch Supabase JWKS: {e}")
+            return
+        keys = {}
+        for jwk in jwks.get('keys', []):
+            try:
+                keys[jwk.get('kid')] = jwt.PyJWK(jwk)
+            except jwt.PyJWKError:
+                continue
+        self._keys = keys
+        self._fetched_at = time.time()
+
+
+token_cache = TokenCache()
+jwks_cache = JWKSCache()
+
+
+async def _decode_supabase_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a Supabase access token locally.
+    Returns the claims, or None when no key material is available for it.
+    Raises jwt.InvalidTokenError (or ExpiredSignatureError) for bad tokens.
+    """
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get('alg')
+    if algorithm == 'HS256':
+        if not SUPABASE_JWT_SECRET:
+            return None
+        key = SUPABASE_JWT_SECRET
+    elif algorithm in ('RS256', 'ES256'):
+        key = await jwks_cache.get_key(header.get('kid'))
+        if key is None:
+            return None
+    else:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {algorithm}")
+    
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=SUPABASE_JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]}
+    )
+
+
+async def verify_supabase_token(token: str) -> Optional[User]:
+    """
+    Resolve a Supabase access token to a User.
+    Served from the token cache when possible, then verified locally with the
+    project JWT secret / JWKS, and only falls back to the Supabase Auth API
+    when neither is configured. Returns None if the token is not valid.
+    """
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    
+    claims = await _decode_supabase_token(token)
+    if claims is not None:
+        user = User(id=claims['sub'], email=claims.get('email', ''), created_at=None)
+        expires_at = claims['exp']
+    else:
+        user_data = await supabase_auth.get_user(token)
+        if user_data is None:
+            return None
+        user = User(
+            id=user_data['id'],
+            email=user_data['email'],
+            created_at=user_data['created_at']
+        )
+        # Already verified by Supabase, the signature check is not needed here
+        expires_at = jwt.decode(token, options={"verify_signature": False}).get('exp')
+    
+    if expires_at:
+        token_cache.put(token, user, float(expires_at))
+    return user
+
 async def get_current_user_flexible(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     """
     Authentication function that works with both JWT tokens and fallback database
@@ -30,7 +184,7 @@ async def get_current_user_flexible(request: Request, credentials: HTTPAuthoriza
                         headers={"WWW-Authenticate": "Bearer"},
                     )
                 
-                user = fallback_db.get_user_by_id(user_id)
+                user = await run_fallback(fallback_db.get_user_by_id, user_id)
                 if user is None:
                     raise HTTPException(
                         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -56,20 +210,24 @@ async def get_current_user_flexible(request: Request, credentials: HTTPAuthoriza
                     headers={"WWW-Authenticate": "Bearer"},
                 )
         else:
-            # Verify JWT token with Supabase
+            # Verify Supabase JWT token (locally when the JWT secret / JWKS is available)
             try:
-                response = supabase_client.auth.get_user(credentials.credentials)
-                if response.user is None:
+                user = await verify_supabase_token(credentials.credentials)
+                if user is None:
                     raise HTTPException(
                         status_code=status.HTTP_401_UNAUTHORIZED,
                         detail="Invalid authentication credentials",
                         headers={"WWW-Authenticate": "Bearer"},
                     )
                 
-                return User(
-                    id=response.user.id,
-                    email=response.user.email,
-                    created_at=response.user.created_at
+                return user
+            except HTTPException:
+                raise
+            except jwt.ExpiredSignatureError:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token expired",
+                    headers={"WWW-Authenticate": "Bearer"},
                 )
             except Exception as e:
                 print(f"Supabase auth error: {e}")
@@ -86,4 +244,18 @@ async def get_current_user_flexible(request: Request, credentials: HTTPAuthoriza
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+def get_user_supabase(request: Request) -> UserScopedClient:
+    """
+    Get a Supabase client scoped to the caller's bearer token (for RLS)
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+    
+    access_token = auth_header.split(" ")[1]
+    user_supabase = get_supabase_with_auth(access_token)
+    if not user_supabase:
+        raise HTTPException(status_code=500, detail="Failed to create authenticated Supabase client")
+    return user_supabase
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request cost of FallbackDatabase lookups as total users grow
+===========================================================================
+
+Fills the fallback database with N users (each with a few tasks and
+categories) and times the calls made by sign-in and list requests:
+get_user_by_email, get_tasks_by_user and get_categories_by_user.
+
+With the secondary indexes the per-call time should stay flat as N grows.
+
+Usage (from the backend folder):
+    python benchmarks/bench_fallback_indexes.py [--users 1000,10000,100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import FallbackDatabase  # noqa: E402
+
+TASKS_PER_USER = 5
+CATEGORIES_PER_USER = 2
+LOOKUPS = 2000
+
+
+def populate(db: FallbackDatabase, user_count: int):
+    for i in range(user_count):
+        user = db.create_user({'email': f'user{i}@example.com', 'password_hash': 'x'})
+        for j in range(TASKS_PER_USER):
+            db.create_task({
+                'user_id': user['id'],
+                'title': f'Task {j}',
+                'dueAt': f'2030-01-{j + 1:02d}T09:00:00',
+                'isStarred': j == 0
+            })
+        for j in range(CATEGORIES_PER_USER):
+            db.create_category({'user_id': user['id'], 'name': f'Category {j}'})
+
+
+def time_per_call(func, args_list) -> float:
+    """Average microseconds per call"""
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def run(user_counts):
+    print(f"{'users':>10} {'tasks':>10} {'by_email (us)':>15} {'tasks (us)':>12} {'categories (us)':>16}")
+    for user_count in user_counts:
+        db = FallbackDatabase()
+        populate(db, user_count)
+        sample = [str(random.randint(1, user_count)) for _ in range(LOOKUPS)]
+        emails = [(f'user{int(user_id) - 1}@example.com',) for user_id in sample]
+        user_ids = [(user_id,) for user_id in sample]
+        print(
+            f"{user_count:>10} {len(db.tasks):>10} "
+            f"{time_per_call(db.get_user_by_email, emails):>15.2f} "
+            f"{time_per_call(db.get_tasks_by_user, user_ids):>12.2f} "
+            f"{time_per_call(db.get_categories_by_user, user_ids):>16.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", default="1000,10000,100000",
+                        help="comma separated total user counts")
+    args = parser.parse_args()
+    run([int(n) for n in args.users.split(",")])
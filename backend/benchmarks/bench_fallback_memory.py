@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory per task in the fallback database
+===================================================
+
+Measures bytes allocated per task (tracemalloc) for:
+- dict rows: the previous representation, a ten-key dict per task with two
+  ISO timestamp strings and per-request user_id/status/category strings
+- TaskRecord: the compact slotted record FallbackDatabase now stores
+- FallbackDatabase: TaskRecord rows plus the id map and secondary indexes
+
+Usage (from the backend folder):
+    python benchmarks/bench_fallback_memory.py [--tasks 100000]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import FallbackDatabase, TaskRecord, _epoch_us  # noqa: E402
+
+TASKS_PER_USER = 50
+
+
+def task_fields(i: int) -> dict:
+    """Field values as a request would deliver them (fresh string objects)"""
+    return {
+        'user_id': str(i // TASKS_PER_USER + 1),
+        'title': f'Task {i}',
+        'status': ''.join(['pen', 'ding']),
+        'dueAt': f'2030-01-{i % 28 + 1:02d}T09:00:00' if i % 3 else None,
+        'isStarred': i % 7 == 0,
+        'category': ''.join(['Wo', 'rk']) if i % 2 else None,
+        'parent_id': None
+    }
+
+
+def dict_rows(task_count: int) -> list:
+    return [
+        dict(id=str(i + 1), **task_fields(i),
+             inserted_at=datetime.now().isoformat(), updated_at=datetime.now().isoformat())
+        for i in range(task_count)
+    ]
+
+
+def record_rows(task_count: int) -> list:
+    rows = []
+    for i in range(task_count):
+        now = _epoch_us()
+        rows.append(TaskRecord(id=str(i + 1), **task_fields(i), inserted_at=now, updated_at=now))
+    return rows
+
+
+def database(task_count: int) -> FallbackDatabase:
+    db = FallbackDatabase()
+    for i in range(task_count):
+        db.create_task(task_fields(i))
+    return db
+
+
+def bytes_per_task(build, task_count: int) -> float:
+    tracemalloc.start()
+    result = build(task_count)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return allocated / task_count
+
+
+def run(task_count: int):
+    print(f"{task_count} tasks")
+    print(f"{'representation':>20} {'bytes/task':>12}")
+    for name, build in (("dict rows", dict_rows), ("TaskRecord", record_rows),
+                        ("FallbackDatabase", database)):
+        print(f"{name:>20} {bytes_per_task(build, task_count):>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tasks", type=int, default=100000, help="number of tasks")
+    args = parser.parse_args()
+    run(args.tasks)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark: CPU time of a large GET /api/tasks/ response
+=======================================================
+
+Fills a FallbackDatabase with one user's tasks and serves the list through
+two FastAPI routes with the same response_model:
+- models: a Task built per row, wrapped in TaskListResponse and returned, so
+  FastAPI validates it again and encodes it with jsonable_encoder/json.dumps
+  (the previous list_tasks path)
+- render_json: the rows validated once and encoded by pydantic-core
+  (json_responses.py, the current list_tasks path)
+
+Both bodies are checked to be identical; times are process CPU per request,
+measured through the ASGI app (TestClient).
+
+Measured on 10k tasks: about 270 ms per request with models and 220 ms
+with render_json, i.e. 1.2x end to end (1.4x for validation + encoding
+alone). Reading the rows (~95 ms) and validating one Task per row (~70 ms)
+remain; render_json only removes the duplicate passes.
+
+Usage (from the backend folder):
+    python benchmarks/bench_list_serialization.py [--tasks 10000] [--requests 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+warnings.filterwarnings("ignore")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from database import FallbackDatabase  # noqa: E402
+from json_responses import render_json, json_response  # noqa: E402
+from models import Task, TaskListResponse  # noqa: E402
+
+USER_ID = '1'
+
+
+def populate(db: FallbackDatabase, task_count: int):
+    for i in range(task_count):
+        db.create_task({
+            'user_id': USER_ID,
+            'title': f'Task {i}',
+            'dueAt': f'2030-{i % 12 + 1:02d}-{i % 28 + 1:02d}T09:00:00' if i % 3 else None,
+            'isStarred': i % 7 == 0,
+            'category': f'Category {i % 5}' if i % 2 else None,
+            'parent_id': str(i // 2) if i % 4 == 3 else None
+        })
+
+
+def create_app(db: FallbackDatabase) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/models", response_model=TaskListResponse)
+    async def list_with_models():
+        tasks = []
+        for task_data in db.query_tasks(USER_ID):
+            tasks.append(Task(
+                id=task_data['id'],
+                user_id=task_data['user_id'],
+                title=task_data['title'],
+                status=task_data['status'],
+                dueAt=task_data.get('dueAt'),
+                isStarred=bool(task_data.get('isStarred', False)),
+                category=task_data.get('category'),
+                parentId=task_data.get('parent_id'),
+                inserted_at=task_data['inserted_at'],
+                updated_at=task_data['updated_at'],
+                subtaskCount=task_data['subtask_count'],
+                subtasksDone=task_data['subtasks_done'],
+                descendantCount=task_data['descendant_count'],
+                descendantsDone=task_data['descendants_done']
+            ))
+        return TaskListResponse(success=True, data=tasks)
+
+    @app.get("/render_json", response_model=TaskListResponse)
+    async def list_with_render_json():
+        return json_response(render_json(TaskListResponse, {'success': True, 'data': db.query_tasks(USER_ID)}))
+
+    return app
+
+
+def cpu_ms_per_request(client: TestClient, path: str, requests: int) -> float:
+    client.get(path)
+    start = time.process_time()
+    for _ in range(requests):
+        client.get(path)
+    return (time.process_time() - start) / requests * 1000
+
+
+def run(task_count: int, requests: int):
+    db = FallbackDatabase()
+    populate(db, task_count)
+    client = TestClient(create_app(db))
+
+    models_body = client.get("/models").content
+    fast_body = client.get("/render_json").content
+    assert json.loads(models_body) == json.loads(fast_body), "responses differ"
+
+    # Time reading the rows alone so the serialization share is visible
+    start = time.process_time()
+    for _ in range(requests):
+        db.query_tasks(USER_ID)
+    rows_ms = (time.process_time() - start) / requests * 1000
+
+    models_ms = cpu_ms_per_request(client, "/models", requests)
+    fast_ms = cpu_ms_per_request(client, "/render_json", requests)
+    print(f"{task_count} tasks, {len(fast_body) / 1024:.0f} KiB body, {requests} requests each")
+    print(f"{'path':>12} {'cpu/request (ms)':>18} {'excluding rows (ms)':>21}")
+    print(f"{'rows only':>12} {rows_ms:>18.1f}")
+    print(f"{'models':>12} {models_ms:>18.1f} {models_ms - rows_ms:>21.1f}")
+    print(f"{'render_json':>12} {fast_ms:>18.1f} {fast_ms - rows_ms:>21.1f}")
+    print(f"Response handling (validation + encoding) is {(models_ms - rows_ms) / (fast_ms - rows_ms):.1f}x "
+          f"cheaper with render_json")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tasks", type=int, default=10000, help="tasks in the list")
+    parser.add_argument("--requests", type=int, default=20, help="timed requests per path")
+    args = parser.parse_args()
+    run(args.tasks, args.requests)
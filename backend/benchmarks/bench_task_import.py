@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: POST /api/tasks/import throughput on the fallback database
+=====================================================================
+
+Signs up a user on the app (in process, through the ASGI transport) and
+imports an NDJSON file of N tasks: one in ten is a top-level task, the rest
+are its subtasks, and every task has a due date so each one schedules a
+reminder. Prints the tasks imported per second for each chunk size.
+
+Select the store as for the server (FALLBACK_DB_BACKEND=memory|sqlite,
+FALLBACK_DB_JOURNAL_DIR); Supabase must not be configured.
+
+Usage (from the backend folder):
+    python benchmarks/bench_task_import.py [--tasks 50000] [--chunk-sizes 100,1000,5000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+warnings.filterwarnings("ignore")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+
+
+def ndjson_file(task_count: int) -> bytes:
+    return "".join(json.dumps({
+        'id': f'source-{i}',
+        'title': f'Task {i}',
+        'dueAt': f'2031-{i % 12 + 1:02d}-{i % 28 + 1:02d}T09:00:00',
+        'isStarred': i % 7 == 0,
+        'category': 'Work' if i % 2 else None,
+        'parentId': f'source-{i - i % 10}' if i % 10 else None
+    }) + "\n" for i in range(task_count)).encode()
+
+
+async def run(task_count: int, chunk_sizes):
+    body = ndjson_file(task_count)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        print(f"{'chunk size':>10} {'tasks':>8} {'seconds':>8} {'tasks/s':>9}")
+        for run_number, chunk_size in enumerate(chunk_sizes):
+            response = await client.post("/api/auth/signup", json={
+                'email': f'import-{run_number}-{time.time_ns()}@example.com',
+                'password': 'benchmark'
+            })
+            headers = {'Authorization': f"Bearer {response.json()['access_token']}"}
+            start = time.perf_counter()
+            response = await client.post("/api/tasks/import", params={'chunk_size': chunk_size},
+                                         content=body, headers=headers)
+            elapsed = time.perf_counter() - start
+            result = response.json()
+            assert result['imported'] == task_count, result
+            print(f"{chunk_size:>10} {task_count:>8} {elapsed:>8.2f} {task_count / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tasks", type=int, default=50000, help="tasks in the import file")
+    parser.add_argument("--chunk-sizes", default="100,1000,5000", help="comma separated chunk sizes")
+    args = parser.parse_args()
+    asyncio.run(run(args.tasks, [int(n) for n in args.chunk_sizes.split(",")]))
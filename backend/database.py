@@ -18,14 +18,42 @@ Database: Supabase (PostgreSQL)
 Deployment: Render
 """
 import os
+import asyncio
+import httpx
+from abc import ABC, abstractmethod
 from supabase import create_client, Client
-from typing import Dict, List, Any, Optional
+from postgrest import AsyncPostgrestClient
+from typing import Deque, Dict, List, Any, Optional, Set, Tuple, Union
+from collections import defaultdict, deque
+from sortedcontainers import SortedList
+import heapq
+import base64
 import json
+import sys
+import time
 from datetime import datetime
 
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY", "")
+# Optional: lets background jobs (reminder rehydration) read every user's tasks past RLS
+SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+
+# Fallback storage: "memory" (per-process) or "sqlite" (shared by all workers on the host)
+FALLBACK_DB_BACKEND = os.getenv("FALLBACK_DB_BACKEND", "memory").lower()
+FALLBACK_DB_PATH = os.getenv("FALLBACK_DB_PATH", "sentinel_fallback.db")
+# Optional snapshot + journal persistence for the memory backend (see journal.py)
+FALLBACK_DB_JOURNAL_DIR = os.getenv("FALLBACK_DB_JOURNAL_DIR")
+FALLBACK_DB_FSYNC_INTERVAL_MS = int(os.getenv("FALLBACK_DB_FSYNC_INTERVAL_MS", "50"))
+FALLBACK_DB_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("FALLBACK_DB_SNAPSHOT_INTERVAL_SECONDS", "300"))
+
+# How long deleted tasks are remembered for GET /api/tasks/changes; older cursors must resync
+TASK_TOMBSTONE_RETENTION_SECONDS = int(os.getenv("TASK_TOMBSTONE_RETENTION_SECONDS", str(7 * 86400)))
+
+# Connection pool sizing for the shared PostgREST client
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "100"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+SUPABASE_POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
 
 # Initialize Supabase client
 supabase_client: Optional[Client] = None
@@ -42,15 +70,627 @@ if SUPABASE_URL and SUPABASE_KEY:
 else:
     print("[ERROR] Missing Supabase environment variables")
 
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=SUPABASE_POOL_KEEPALIVE_EXPIRY
+    )
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client backed by a bounded pool of keep-alive connections"""
+
+    def create_session(self, base_url: str, headers: Dict[str, str], timeout: Union[int, float, httpx.Timeout]) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=_pool_limits()
+        )
+
+
+class _ScopedRequestBuilder:
+    """Wraps a PostgREST request builder so every query carries the caller's token"""
+
+    def __init__(self, builder, auth_headers: Dict[str, str]):
+        self._builder = builder
+        self._auth_headers = auth_headers
+
+    def _scoped(self, query):
+        # Request-level headers override the pool's default anon Authorization
+        query.headers.update(self._auth_headers)
+        return query
+
+    def select(self, *columns: str, **kwargs):
+        return self._scoped(self._builder.select(*columns, **kwargs))
+
+    def insert(self, json: Any, **kwargs):
+        return self._scoped(self._builder.insert(json, **kwargs))
+
+    def upsert(self, json: Any, **kwargs):
+        return self._scoped(self._builder.upsert(json, **kwargs))
+
+    def update(self, json: Dict[str, Any], **kwargs):
+        return self._scoped(self._builder.update(json, **kwargs))
+
+    def delete(self, **kwargs):
+        return self._scoped(self._builder.delete(**kwargs))
+
+
+class UserScopedClient:
+    """Per-request view of the shared PostgREST pool authenticated as one user.
+
+    Construction is free: no new HTTP client is created and no shared session
+    state is touched, the access token is only attached to outgoing queries.
+    Queries are executed with ``await query.execute()``.
+    """
+
+    def __init__(self, access_token: str):
+        self._auth_headers = {"Authorization": f"Bearer {access_token}"}
+
+    def table(self, table_name: str) -> _ScopedRequestBuilder:
+        return _ScopedRequestBuilder(postgrest_pool.from_(table_name), self._auth_headers)
+
+    def rpc(self, function: str, params: Dict[str, Any]):
+        """Call a database function as the user (RLS applies inside SECURITY INVOKER functions)"""
+        query = postgrest_pool.rpc(function, params)
+        query.headers.update(self._auth_headers)
+        return query
+
+
+class SupabaseAuthError(Exception):
+    """Error returned by the Supabase Auth (GoTrue) API"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SupabaseAuth:
+    """Stateless async client for the Supabase Auth (GoTrue) REST API.
+
+    Unlike ``supabase_client.auth`` it never stores a session, so one instance
+    can safely serve concurrent requests for different users.
+    """
+
+    def __init__(self, base_url: str, api_key: str):
+        self._api_key = api_key
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"apikey": api_key},
+            timeout=10,
+            limits=_pool_limits()
+        )
+
+    def _headers(self, access_token: Optional[str] = None) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {access_token or self._api_key}"}
+
+    @staticmethod
+    def _raise_for_error(response: httpx.Response):
+        if response.is_success:
+            return
+        try:
+            body = response.json()
+            message = body.get('msg') or body.get('error_description') or body.get('message') or response.text
+        except ValueError:
+            message = response.text
+        raise SupabaseAuthError(message, response.status_code)
+
+    async def get_user(self, access_token: str) -> Optional[Dict[str, Any]]:
+        """Get the user for an access token, or None if the token is not valid"""
+        response = await self._http.get("/user", headers=self._headers(access_token))
+        if response.status_code in (401, 403):
+            return None
+        self._raise_for_error(response)
+        return response.json()
+
+    async def sign_in_with_password(self, email: str, password: str) -> Optional[Dict[str, Any]]:
+        """Sign in and return the session (access_token, user), or None for bad credentials"""
+        response = await self._http.post(
+            "/token",
+            params={"grant_type": "password"},
+            json={"email": email, "password": password},
+            headers=self._headers()
+        )
+        if response.status_code in (400, 401):
+            return None
+        self._raise_for_error(response)
+        return response.json()
+
+    async def sign_up(self, email: str, password: str) -> Dict[str, Any]:
+        """Sign up and return {'user': ..., 'session': ... or None}"""
+        response = await self._http.post(
+            "/signup",
+            json={"email": email, "password": password},
+            headers=self._headers()
+        )
+        self._raise_for_error(response)
+        body = response.json()
+        if 'access_token' in body:
+            return {'user': body.get('user'), 'session': body}
+        # Email confirmation required: the body is the user itself
+        return {'user': body if body.get('id') else None, 'session': None}
+
+    async def get_jwks(self) -> Dict[str, Any]:
+        """Get the project's public signing keys (JWKS)"""
+        response = await self._http.get("/.well-known/jwks.json")
+        self._raise_for_error(response)
+        return response.json()
+
+    async def sign_out(self, access_token: str):
+        """Revoke the refresh tokens of the access token's session"""
+        response = await self._http.post("/logout", headers=self._headers(access_token))
+        self._raise_for_error(response)
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+# Process-wide async clients, shared by every request
+postgrest_pool: Optional[PooledPostgrestClient] = None
+supabase_auth: Optional[SupabaseAuth] = None
+if SUPABASE_URL and SUPABASE_KEY:
+    postgrest_pool = PooledPostgrestClient(
+        f"{SUPABASE_URL}/rest/v1",
+        headers={
+            "apikey": SUPABASE_KEY,
+            "Authorization": f"Bearer {SUPABASE_KEY}"
+        }
+    )
+    supabase_auth = SupabaseAuth(f"{SUPABASE_URL}/auth/v1", SUPABASE_KEY)
+
+# Service role client for server-side jobs only; never used for user requests
+service_postgrest: Optional[PooledPostgrestClient] = None
+if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY:
+    service_postgrest = PooledPostgrestClient(
+        f"{SUPABASE_URL}/rest/v1",
+        headers={
+            "apikey": SUPABASE_SERVICE_ROLE_KEY,
+            "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}"
+        }
+    )
+
+
+async def close_supabase_pools():
+    """Close the shared Supabase connection pools (called on shutdown)"""
+    if postgrest_pool is not None:
+        await postgrest_pool.aclose()
+    if supabase_auth is not None:
+        await supabase_auth.aclose()
+    if service_postgrest is not None:
+        await service_postgrest.aclose()
+
+
+def task_sort_key(task: Dict[str, Any]) -> tuple:
+    """Task list order: starred first, then by due date (undated last), then id"""
+    due_at = task.get('dueAt')
+    return (not task.get('isStarred', False), due_at is None, due_at or '', task['id'])
+
+
+def encode_task_cursor(sort_key: tuple) -> str:
+    """Encode a task_sort_key() as an opaque pagination cursor"""
+    raw = json.dumps(list(sort_key), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_task_cursor(cursor: str) -> tuple:
+    """Decode a pagination cursor back into a task_sort_key(), raising ValueError if malformed"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    key = json.loads(raw)
+    if (not isinstance(key, list) or len(key) != 4
+            or not all(isinstance(part, bool) for part in key[:2])
+            or not all(isinstance(part, str) for part in key[2:])):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def encode_change_cursor(seq: int, issued_at: float, after_id: Optional[str] = None) -> str:
+    """Encode a change sequence and the time it was handed out as an opaque sync cursor.
+    Supabase cursors also carry the id of the last task handed out in that transaction."""
+    value = [seq, issued_at] if after_id is None else [seq, issued_at, after_id]
+    raw = json.dumps(value, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_change_cursor(cursor: str) -> Tuple[int, float, Optional[str]]:
+    """Decode a sync cursor back into (seq, issued_at, after_id), raising ValueError if malformed"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    value = json.loads(raw)
+    if (not isinstance(value, list) or len(value) not in (2, 3) or not isinstance(value[0], int)
+            or isinstance(value[0], bool) or not isinstance(value[1], (int, float))
+            or (len(value) == 3 and not isinstance(value[2], str))):
+        raise ValueError("Invalid cursor")
+    return value[0], float(value[1]), value[2] if len(value) == 3 else None
+
+
+def _epoch_us() -> int:
+    return time.time_ns() // 1000
+
+
+def _epoch_us_to_iso(value: int) -> str:
+    """Local ISO timestamp, same shape as datetime.now().isoformat()"""
+    return datetime.fromtimestamp(value // 1_000_000).replace(microsecond=value % 1_000_000).isoformat()
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+class TaskRecord:
+    """
+    Compact in-memory task row used by FallbackDatabase.
+    Slots instead of a per-task dict, interned user_id/status/category strings
+    and integer epoch-microsecond timestamps; to_dict() builds the API shape.
+    The subtask counters are derived: maintained by the database, left out of
+    as_tuple() (journal and snapshot) and rebuilt on load.
+    """
+    __slots__ = ('id', 'user_id', 'title', 'status', 'dueAt', 'isStarred',
+                 'category', 'parent_id', 'inserted_at', 'updated_at',
+                 'subtask_count', 'subtasks_done', 'descendant_count', 'descendants_done')
+    
+    def __init__(self, id: str, user_id: str, title: str, status: str, dueAt: Optional[str],
+                 isStarred: bool, category: Optional[str], parent_id: Optional[str],
+                 inserted_at: int, updated_at: int):
+        self.id = id
+        self.user_id = sys.intern(user_id)
+        self.title = title
+        self.status = sys.intern(status)
+        self.dueAt = dueAt
+        self.isStarred = bool(isStarred)
+        self.category = _intern(category)
+        self.parent_id = parent_id
+        self.inserted_at = inserted_at
+        self.updated_at = updated_at
+        self.subtask_count = self.subtasks_done = 0
+        self.descendant_count = self.descendants_done = 0
+    
+    def __reduce__(self):
+        return (TaskRecord, self.as_tuple())
+    
+    def as_tuple(self) -> tuple:
+        return (self.id, self.user_id, self.title, self.status, self.dueAt, self.isStarred,
+                self.category, self.parent_id, self.inserted_at, self.updated_at)
+    
+    def sort_key(self) -> tuple:
+        """Same as task_sort_key(self.to_dict())"""
+        return (not self.isStarred, self.dueAt is None, self.dueAt or '', self.id)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'title': self.title,
+            'status': self.status,
+            'dueAt': self.dueAt,
+            'isStarred': self.isStarred,
+            'category': self.category,
+            'parent_id': self.parent_id,
+            'inserted_at': _epoch_us_to_iso(self.inserted_at),
+            'updated_at': _epoch_us_to_iso(self.updated_at),
+            'subtask_count': self.subtask_count,
+            'subtasks_done': self.subtasks_done,
+            'descendant_count': self.descendant_count,
+            'descendants_done': self.descendants_done
+        }
+
+
+class TaskOrderIndex(dict):
+    """
+    user_id -> SortedList of the user's task_sort_key() tuples. After a bulk
+    load each user's keys are left unsorted and only sorted on first use, so
+    a restart does not sort every user's list up front.
+    """
+    
+    def __init__(self, unsorted: Optional[Dict[str, List[tuple]]] = None):
+        super().__init__()
+        self._unsorted = dict(unsorted or {})
+    
+    def __missing__(self, user_id: str) -> SortedList:
+        order = self[user_id] = SortedList(self._unsorted.pop(user_id, ()))
+        return order
+    
+    def get(self, user_id: str, default: Any = None) -> Any:
+        if user_id in self._unsorted:
+            return self[user_id]
+        return super().get(user_id, default)
+    
+    def values(self):
+        for user_id in list(self._unsorted):
+            self[user_id]
+        return super().values()
+
+
+TASK_UPDATABLE_FIELDS = {'title', 'status', 'dueAt', 'isStarred', 'category', 'parent_id', 'user_id'}
+# Fields that move a task in its ancestors' subtask counters
+TASK_ROLLUP_FIELDS = ('parent_id', 'status', 'user_id')
+
+
+class StorageBackend(ABC):
+    """
+    Storage interface for fallback mode (used when Supabase is not configured).
+    Rows are plain dicts in the API shape; ids are strings. Methods taking a
+    user_id only touch rows owned by that user and return None/False otherwise.
+    Supabase mode goes through the async PostgREST client instead.
+    """
+    
+    # Calls can wait on disk or on other processes' locks; async code then
+    # reaches the backend through run_fallback(), off the event loop
+    blocking = False
+    
+    @abstractmethod
+    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]: ...
+    
+    @abstractmethod
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def list_users(self) -> List[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def create_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]: ...
+    
+    @abstractmethod
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def count_tasks(self) -> int: ...
+    
+    @abstractmethod
+    def get_tasks_by_user(self, user_id: str) -> List[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def get_all_tasks(self) -> List[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def query_tasks(self, user_id: str, after: Optional[tuple] = None, limit: Optional[int] = None,
+                    status: Optional[str] = None, category: Optional[str] = None,
+                    is_starred: Optional[bool] = None, parent_id: Optional[str] = None,
+                    due_from: Optional[str] = None, due_to: Optional[str] = None) -> List[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def get_child_tasks(self, parent_id: str, user_id: str) -> List[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def get_task_subtree(self, task_id: str, user_id: str, max_depth: int, limit: int) -> List[Dict[str, Any]]:
+        """
+        The task and its descendants down to `max_depth` levels below it,
+        breadth first (siblings in list order), at most `limit` rows; [] if the
+        task is not the user's
+        """
+    
+    @abstractmethod
+    def query_due_tasks(self, due_from: str, due_to: str) -> List[Dict[str, Any]]:
+        """Every user's tasks that are not done with due_from <= dueAt < due_to, by due date"""
+    
+    @abstractmethod
+    def update_task(self, task_id: str, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def delete_task(self, task_id: str, user_id: str) -> bool: ...
+    
+    @abstractmethod
+    def update_task_subtree(self, task_id: str, user_id: str, update_data: Dict[str, Any]) -> List[str]:
+        """Apply `update_data` to the task and all of its descendants at once; returns their ids ([] if not the user's task)"""
+    
+    @abstractmethod
+    def delete_task_subtree(self, task_id: str, user_id: str) -> List[str]:
+        """Delete the task and all of its descendants at once; returns their ids ([] if not the user's task)"""
+    
+    @abstractmethod
+    def get_task_changes(self, user_id: str, since: Optional[int], limit: int) -> List[Tuple[int, str, Optional[Dict[str, Any]]]]:
+        """
+        Up to `limit` (change seq, task id, row) entries for the user's tasks
+        changed after seq `since`, oldest first; row is None for a deleted task.
+        With since=None, every live task and no deletions.
+        """
+    
+    @abstractmethod
+    def task_changes_valid_from(self) -> float:
+        """Epoch seconds from which the change history is complete (cursors handed out earlier must resync)"""
+    
+    @abstractmethod
+    def apply_task_batch(self, user_id: str, operations: List[Tuple[str, Optional[str], Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Apply (op, task_id, data) operations in order, op being 'create',
+        'update' or 'delete'. Returns the created/updated/deleted row of each,
+        None where the task was not found.
+        """
+    
+    @abstractmethod
+    def create_tasks(self, user_id: str, tasks_data: List[Dict[str, Any]]) -> List[str]:
+        """Create many tasks for one user in one pass; returns their ids in order"""
+    
+    @abstractmethod
+    def create_category(self, category_data: Dict[str, Any]) -> Dict[str, Any]: ...
+    
+    @abstractmethod
+    def get_categories_by_user(self, user_id: str) -> List[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def get_category(self, category_id: str, user_id: str) -> Optional[Dict[str, Any]]: ...
+    
+    @abstractmethod
+    def update_category(self, category_id: str, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a category; a new name is carried over to the user's tasks filed under the old one"""
+    
+    @abstractmethod
+    def delete_category(self, category_id: str, user_id: str, move_to: Optional[str] = None) -> bool:
+        """Delete a category; the user's tasks filed under it move to category `move_to` (None: uncategorised)"""
+
+
 # Fallback in-memory database for development/testing
-class FallbackDatabase:
+class FallbackDatabase(StorageBackend):
     def __init__(self):
-        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.tasks: Dict[str, TaskRecord] = {}
         self.users: Dict[str, Dict[str, Any]] = {}
         self.categories: Dict[str, Dict[str, Any]] = {}
         self._next_task_id = 1
         self._next_user_id = 1
         self._next_category_id = 1
+        # Secondary indexes, maintained by every create/update/delete so that
+        # lookups cost O(rows for this user) instead of O(rows for all users)
+        self._user_id_by_email: Dict[str, str] = {}
+        # Per-user task order as sorted task_sort_key() tuples, kept up to date
+        # in O(log n) so list reads never have to sort
+        self._task_order_by_user: Dict[str, SortedList] = TaskOrderIndex()
+        self._category_ids_by_user: Dict[str, Set[str]] = defaultdict(set)
+        self._child_ids_by_parent: Dict[str, Set[str]] = defaultdict(set)
+        # (user_id, category name) -> task ids, so renaming or deleting a
+        # category rewrites only the tasks filed under it
+        self._task_ids_by_category: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        # (dueAt, id) of every dated task, for due date range scans across users
+        self._tasks_by_due = SortedList()
+        # Change log: each user's task ids in change order (id -> change stamp).
+        # Deleted ids stay as tombstones until TASK_TOMBSTONE_RETENTION_SECONDS,
+        # so reading the changes since a cursor costs O(changes).
+        self._changes_by_user: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._tombstones: Deque[Tuple[int, str, str]] = deque()
+        self._last_change_us = 0
+        self._changes_valid_from = time.time()
+    
+    @staticmethod
+    def _index_add(index: Dict[str, Any], key: Optional[str], entry: Any):
+        if key is not None:
+            index[key].add(entry)
+    
+    @staticmethod
+    def _index_remove(index: Dict[str, Any], key: Optional[str], entry: Any):
+        entries = index.get(key)
+        if entries is None:
+            return
+        entries.discard(entry)
+        if not entries:
+            del index[key]
+    
+    @staticmethod
+    def _category_key(user_id: str, category: Optional[str]) -> Optional[Tuple[str, str]]:
+        return (user_id, category) if category is not None else None
+    
+    def _index_task(self, task: TaskRecord):
+        self._index_add(self._task_order_by_user, task.user_id, task.sort_key())
+        self._index_add(self._child_ids_by_parent, task.parent_id, task.id)
+        self._index_add(self._task_ids_by_category, self._category_key(task.user_id, task.category), task.id)
+        if task.dueAt is not None:
+            self._tasks_by_due.add((task.dueAt, task.id))
+    
+    def _unindex_task(self, task: TaskRecord):
+        self._index_remove(self._task_order_by_user, task.user_id, task.sort_key())
+        self._index_remove(self._child_ids_by_parent, task.parent_id, task.id)
+        self._index_remove(self._task_ids_by_category, self._category_key(task.user_id, task.category), task.id)
+        if task.dueAt is not None:
+            self._tasks_by_due.discard((task.dueAt, task.id))
+    
+    def _rebuild_indexes(self):
+        """Recompute every secondary index from the tables (bulk load)"""
+        self._user_id_by_email = {user['email']: user_id for user_id, user in self.users.items()}
+        task_keys: Dict[str, List[tuple]] = defaultdict(list)
+        self._child_ids_by_parent = defaultdict(set)
+        self._task_ids_by_category = defaultdict(set)
+        for task in self.tasks.values():
+            task_keys[task.user_id].append(task.sort_key())
+            if task.parent_id is not None:
+                self._child_ids_by_parent[task.parent_id].add(task.id)
+            if task.category is not None:
+                self._task_ids_by_category[(task.user_id, task.category)].add(task.id)
+        self._task_order_by_user = TaskOrderIndex(task_keys)
+        self._tasks_by_due = SortedList((task.dueAt, task.id) for task in self.tasks.values() if task.dueAt is not None)
+        self._changes_by_user = defaultdict(dict)
+        for task in sorted(self.tasks.values(), key=lambda task: task.updated_at):
+            self._changes_by_user[task.user_id][task.id] = task.updated_at
+            self._last_change_us = max(self._last_change_us, task.updated_at)
+        self._category_ids_by_user = defaultdict(set)
+        for category in self.categories.values():
+            self._category_ids_by_user[category['user_id']].add(category['id'])
+        # Subtask counters: each task counts itself in its parent and every ancestor
+        for task in self.tasks.values():
+            task.subtask_count = task.subtasks_done = task.descendant_count = task.descendants_done = 0
+        for task in self.tasks.values():
+            if task.parent_id is not None:
+                self._roll_up(task, 1, subtree=False, touch=False)
+    
+    def _parent_record(self, task: TaskRecord) -> Optional[TaskRecord]:
+        """The task's parent, if it belongs to the same user (only those count a task as a subtask)"""
+        parent = self.tasks.get(task.parent_id) if task.parent_id is not None else None
+        return parent if parent is not None and parent.user_id == task.user_id else None
+    
+    def _roll_up(self, task: TaskRecord, sign: int, subtree: bool = True, touch: bool = True):
+        """
+        Add (sign=1) or remove (sign=-1) the task in the subtask counters of its
+        parent and its ancestors: O(depth). The walk stops at a parent owned by
+        another user. With subtree, the task's own descendants move with it.
+        With touch, every changed ancestor gets a new updated_at / change
+        stamp, as the Supabase trigger does.
+        """
+        parent = self._parent_record(task)
+        if parent is None:
+            return
+        done = int(task.status == 'done')
+        parent.subtask_count += sign
+        parent.subtasks_done += sign * done
+        count, count_done = 1, done
+        if subtree:
+            count, count_done = count + task.descendant_count, count_done + task.descendants_done
+        seen = {task.id}
+        while parent is not None and parent.id not in seen:
+            seen.add(parent.id)
+            parent.descendant_count += sign * count
+            parent.descendants_done += sign * count_done
+            if touch:
+                parent.updated_at = self._next_change_us()
+                self._log_change(parent.user_id, parent.id, parent.updated_at)
+                self._record_task(parent)
+            parent = self._parent_record(parent)
+    
+    def _roll_up_children(self, task: TaskRecord, sign: int, touch: bool = True):
+        """Add or remove the task's direct subtasks (with their subtrees) in its counters and its ancestors'"""
+        for child in self._child_records(task.id, task.user_id):
+            if child is not task:
+                self._roll_up(child, sign, touch=touch)
+    
+    def _next_change_us(self) -> int:
+        """Strictly increasing epoch-microsecond stamp: a task's updated_at and its change sequence"""
+        self._last_change_us = max(_epoch_us(), self._last_change_us + 1)
+        return self._last_change_us
+    
+    def _log_change(self, user_id: str, task_id: str, stamp: int):
+        changes = self._changes_by_user[user_id]
+        # Re-insert so the dict stays in change order
+        changes.pop(task_id, None)
+        changes[task_id] = stamp
+    
+    def _log_deletion(self, user_id: str, task_id: str):
+        stamp = self._next_change_us()
+        self._log_change(user_id, task_id, stamp)
+        self._tombstones.append((stamp, user_id, task_id))
+        cutoff = stamp - TASK_TOMBSTONE_RETENTION_SECONDS * 1_000_000
+        while self._tombstones and self._tombstones[0][0] < cutoff:
+            old_stamp, old_user_id, old_task_id = self._tombstones.popleft()
+            changes = self._changes_by_user.get(old_user_id)
+            if changes is not None and changes.get(old_task_id) == old_stamp:
+                del changes[old_task_id]
+    
+    # Change hooks, called after every committed mutation with the new row
+    # (or the deleted id). No-ops here; overridden by the journaled database.
+    
+    def _record_user(self, user: Dict[str, Any]):
+        pass
+    
+    def _record_task(self, task: TaskRecord):
+        pass
+    
+    def _record_task_deleted(self, task_id: str):
+        pass
+    
+    def _record_category(self, category: Dict[str, Any]):
+        pass
+    
+    def _record_category_deleted(self, category_id: str):
+        pass
     
     def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new user in fallback database"""
@@ -66,45 +706,145 @@ class FallbackDatabase:
             'updated_at': datetime.now().isoformat()
         }
         self.users[user_id] = user
+        self._user_id_by_email[user['email']] = user_id
+        self._record_user(user)
         return user
     
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
-        for user in self.users.values():
-            if user['email'] == email:
-                return user
-        return None
+        user_id = self._user_id_by_email.get(email)
+        return self.users.get(user_id) if user_id is not None else None
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         return self.users.get(user_id)
     
+    def list_users(self) -> List[Dict[str, Any]]:
+        """Get all users"""
+        return list(self.users.values())
+    
     def create_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new task"""
+        return self._create_record(task_data).to_dict()
+    
+    def _create_record(self, task_data: Dict[str, Any]) -> TaskRecord:
         task_id = str(self._next_task_id)
         self._next_task_id += 1
         
-        task = {
-            'id': task_id,
-            'user_id': task_data['user_id'],
-            'title': task_data['title'],
-            'status': task_data.get('status', 'pending'),
-            'dueAt': task_data.get('dueAt'),
-            'isStarred': task_data.get('isStarred', False),
-            'category': task_data.get('category'),
-            'parent_id': task_data.get('parent_id'),
-            'inserted_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
+        now = self._next_change_us()
+        task = TaskRecord(
+            id=task_id,
+            user_id=task_data['user_id'],
+            title=task_data['title'],
+            status=task_data.get('status', 'pending'),
+            dueAt=task_data.get('dueAt'),
+            isStarred=task_data.get('isStarred', False),
+            category=task_data.get('category'),
+            parent_id=task_data.get('parent_id'),
+            inserted_at=now,
+            updated_at=now
+        )
         self.tasks[task_id] = task
+        self._index_task(task)
+        self._log_change(task.user_id, task_id, now)
+        self._record_task(task)
+        self._roll_up(task, 1)
         return task
     
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task by ID, regardless of owner"""
+        task = self.tasks.get(task_id)
+        return task.to_dict() if task is not None else None
+    
+    def count_tasks(self) -> int:
+        """Count all tasks"""
+        return len(self.tasks)
+    
     def get_tasks_by_user(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all tasks for a user"""
-        user_tasks = [task for task in self.tasks.values() if task['user_id'] == user_id]
-        # Sort by starred first, then by due date
-        user_tasks.sort(key=lambda x: (not x['isStarred'], x.get('dueAt', '')))
-        return user_tasks
+        """Get all tasks for a user, starred first, then by due date"""
+        return [self.tasks[key[-1]].to_dict() for key in self._task_order_by_user.get(user_id, ())]
+    
+    def get_all_tasks(self) -> List[Dict[str, Any]]:
+        """Get every user's tasks, starred first, then by due date"""
+        return [self.tasks[key[-1]].to_dict() for key in heapq.merge(*self._task_order_by_user.values())]
+    
+    def query_tasks(self, user_id: str, after: Optional[tuple] = None, limit: Optional[int] = None,
+                    status: Optional[str] = None, category: Optional[str] = None,
+                    is_starred: Optional[bool] = None, parent_id: Optional[str] = None,
+                    due_from: Optional[str] = None, due_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get up to `limit` of a user's tasks in list order, starting after the
+        `after` sort key. Starred and dueAt range filters seek within the sorted
+        index; status and category are checked while walking it.
+        """
+        if parent_id is not None:
+            order = SortedList(task.sort_key() for task in self._child_records(parent_id, user_id))
+        else:
+            order = self._task_order_by_user.get(user_id)
+            if order is None:
+                return []
+        
+        page = []
+        groups = [not is_starred] if is_starred is not None else [False, True]
+        for group in groups:
+            start = (group, False, due_from) if due_from is not None else (group,)
+            if after is not None and after >= start:
+                keys = order.irange(minimum=after, inclusive=(False, True))
+            else:
+                keys = order.irange(minimum=start)
+            
+            for key in keys:
+                not_starred, undated, due_at, task_id = key
+                if not_starred != group:
+                    break
+                # Undated tasks sort last in each group, so any dueAt bound ends the walk
+                if (due_from is not None or due_to is not None) and undated:
+                    break
+                if due_to is not None and due_at > due_to:
+                    break
+                task = self.tasks[task_id]
+                if status is not None and task.status != status:
+                    continue
+                if category is not None and task.category != category:
+                    continue
+                page.append(task.to_dict())
+                if limit is not None and len(page) >= limit:
+                    return page
+        return page
+    
+    def _child_records(self, parent_id: str, user_id: str) -> List[TaskRecord]:
+        children = (self.tasks[task_id] for task_id in self._child_ids_by_parent.get(parent_id, ()))
+        return [task for task in children if task.user_id == user_id]
+    
+    def get_child_tasks(self, parent_id: str, user_id: str) -> List[Dict[str, Any]]:
+        """Get the direct subtasks of a task"""
+        return [task.to_dict() for task in self._child_records(parent_id, user_id)]
+    
+    def get_task_subtree(self, task_id: str, user_id: str, max_depth: int, limit: int) -> List[Dict[str, Any]]:
+        """Walk the parent index level by level from the task"""
+        root = self.tasks.get(task_id)
+        if root is None or root.user_id != user_id:
+            return []
+        
+        subtree, level, seen = [root], [root], {task_id}
+        for _ in range(max_depth):
+            if not level or len(subtree) >= limit:
+                break
+            next_level = []
+            for task in level:
+                children = [child for child in self._child_records(task.id, user_id) if child.id not in seen]
+                children.sort(key=TaskRecord.sort_key)
+                seen.update(child.id for child in children)
+                next_level.extend(children)
+            subtree.extend(next_level)
+            level = next_level
+        return [task.to_dict() for task in subtree[:limit]]
+    
+    def query_due_tasks(self, due_from: str, due_to: str) -> List[Dict[str, Any]]:
+        """Get every user's tasks that are not done with due_from <= dueAt < due_to, by due date"""
+        keys = self._tasks_by_due.irange((due_from,), (due_to,), inclusive=(True, False))
+        tasks = (self.tasks[task_id] for _, task_id in keys)
+        return [task.to_dict() for task in tasks if task.status != 'done']
     
     def update_task(self, task_id: str, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update a task"""
@@ -112,15 +852,59 @@ class FallbackDatabase:
             return None
         
         task = self.tasks[task_id]
-        if task['user_id'] != user_id:
+        if task.user_id != user_id:
             return None
         
+        return self._update_record(task, user_id, update_data).to_dict()
+    
+    def _update_record(self, task: TaskRecord, user_id: str, update_data: Dict[str, Any]) -> TaskRecord:
+        task_id = task.id
+        old_sort_key, old_parent_id, old_due_at = task.sort_key(), task.parent_id, task.dueAt
+        old_category_key = self._category_key(user_id, task.category)
+        moved = any(key in update_data and update_data[key] != getattr(task, key) for key in TASK_ROLLUP_FIELDS)
+        owner_changed = 'user_id' in update_data and update_data['user_id'] != task.user_id
+        if owner_changed:
+            # Its subtasks only count while they have the same owner
+            self._roll_up_children(task, -1)
+        if moved:
+            self._roll_up(task, -1)
+        
         # Update fields
         for key, value in update_data.items():
-            if key in task:
-                task[key] = value
+            if key in TASK_UPDATABLE_FIELDS:
+                setattr(task, key, value)
+        task.user_id = sys.intern(task.user_id)
+        task.status = sys.intern(task.status)
+        task.category = _intern(task.category)
+        task.isStarred = bool(task.isStarred)
+        if moved:
+            self._roll_up(task, 1)
+        if owner_changed:
+            self._roll_up_children(task, 1)
         
-        task['updated_at'] = datetime.now().isoformat()
+        new_sort_key = task.sort_key()
+        if task.user_id != user_id or new_sort_key != old_sort_key:
+            self._index_remove(self._task_order_by_user, user_id, old_sort_key)
+            self._index_add(self._task_order_by_user, task.user_id, new_sort_key)
+        if task.parent_id != old_parent_id:
+            self._index_remove(self._child_ids_by_parent, old_parent_id, task_id)
+            self._index_add(self._child_ids_by_parent, task.parent_id, task_id)
+        new_category_key = self._category_key(task.user_id, task.category)
+        if new_category_key != old_category_key:
+            self._index_remove(self._task_ids_by_category, old_category_key, task_id)
+            self._index_add(self._task_ids_by_category, new_category_key, task_id)
+        if task.dueAt != old_due_at:
+            if old_due_at is not None:
+                self._tasks_by_due.discard((old_due_at, task_id))
+            if task.dueAt is not None:
+                self._tasks_by_due.add((task.dueAt, task_id))
+        
+        task.updated_at = self._next_change_us()
+        if task.user_id != user_id:
+            # Gone from the previous owner's point of view
+            self._log_deletion(user_id, task_id)
+        self._log_change(task.user_id, task_id, task.updated_at)
+        self._record_task(task)
         return task
     
     def delete_task(self, task_id: str, user_id: str) -> bool:
@@ -129,12 +913,93 @@ class FallbackDatabase:
             return False
         
         task = self.tasks[task_id]
-        if task['user_id'] != user_id:
+        if task.user_id != user_id:
             return False
         
-        del self.tasks[task_id]
+        self._delete_record(task)
         return True
     
+    def _delete_record(self, task: TaskRecord):
+        del self.tasks[task.id]
+        self._unindex_task(task)
+        self._roll_up(task, -1)
+        self._log_deletion(task.user_id, task.id)
+        self._record_task_deleted(task.id)
+    
+    def _subtree_records(self, task_id: str, user_id: str) -> List[TaskRecord]:
+        """The task and every descendant, collected through the parent index"""
+        root = self.tasks.get(task_id)
+        if root is None or root.user_id != user_id:
+            return []
+        subtree, seen = [root], {task_id}
+        for task in subtree:
+            for child in self._child_records(task.id, user_id):
+                if child.id not in seen:
+                    seen.add(child.id)
+                    subtree.append(child)
+        return subtree
+    
+    def update_task_subtree(self, task_id: str, user_id: str, update_data: Dict[str, Any]) -> List[str]:
+        """Collect the subtree from the parent index, then update each task in one pass"""
+        subtree = self._subtree_records(task_id, user_id)
+        for task in subtree:
+            self._update_record(task, user_id, update_data)
+        return [task.id for task in subtree]
+    
+    def delete_task_subtree(self, task_id: str, user_id: str) -> List[str]:
+        """Collect the subtree from the parent index, then delete each task in one pass"""
+        subtree = self._subtree_records(task_id, user_id)
+        for task in subtree:
+            self._delete_record(task)
+        return [task.id for task in subtree]
+    
+    def get_task_changes(self, user_id: str, since: Optional[int], limit: int) -> List[Tuple[int, str, Optional[Dict[str, Any]]]]:
+        """Walk the user's change log back from the newest entry to `since`"""
+        changes = self._changes_by_user.get(user_id)
+        if not changes:
+            return []
+        newer = []
+        for task_id in reversed(changes):
+            stamp = changes[task_id]
+            if since is not None and stamp <= since:
+                break
+            newer.append((stamp, task_id))
+        
+        result = []
+        for stamp, task_id in reversed(newer):
+            task = self.tasks.get(task_id)
+            row = task.to_dict() if task is not None and task.user_id == user_id else None
+            if row is None and since is None:
+                continue
+            result.append((stamp, task_id, row))
+            if len(result) >= limit:
+                break
+        return result
+    
+    def task_changes_valid_from(self) -> float:
+        """Process start, or the end of the journal load for a journaled database"""
+        return self._changes_valid_from
+    
+    def apply_task_batch(self, user_id: str, operations: List[Tuple[str, Optional[str], Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        """Apply create/update/delete operations in one pass"""
+        results = []
+        for op, task_id, data in operations:
+            if op == 'create':
+                results.append(self.create_task({**data, 'user_id': user_id}))
+            elif op == 'update':
+                results.append(self.update_task(task_id, user_id, data))
+            else:
+                task = self.tasks.get(task_id)
+                deleted = task.to_dict() if task is not None and task.user_id == user_id else None
+                if deleted is not None:
+                    self.delete_task(task_id, user_id)
+                results.append(deleted)
+        return results
+    
+    def create_tasks(self, user_id: str, tasks_data: List[Dict[str, Any]]) -> List[str]:
+        """Create many tasks in one pass, without building a response row for each"""
+        return [self._create_record({**task_data, 'user_id': user_id}).id for task_data in tasks_data]
+    
     def create_category(self, category_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new category"""
         category_id = str(self._next_category_id)
@@ -149,15 +1014,24 @@ class FallbackDatabase:
             'updated_at': datetime.now().isoformat()
         }
         self.categories[category_id] = category
+        self._index_add(self._category_ids_by_user, category['user_id'], category_id)
+        self._record_category(category)
         return category
     
     def get_categories_by_user(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all categories for a user"""
-        user_categories = [cat for cat in self.categories.values() if cat['user_id'] == user_id]
+        user_categories = [self.categories[cat_id] for cat_id in self._category_ids_by_user.get(user_id, ())]
         # Sort by name
         user_categories.sort(key=lambda x: x['name'])
         return user_categories
     
+    def get_category(self, category_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get one of the user's categories by ID"""
+        category = self.categories.get(category_id)
+        if category is None or category['user_id'] != user_id:
+            return None
+        return category
+    
     def update_category(self, category_id: str, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update a category"""
         if category_id not in self.categories:
@@ -166,16 +1040,24 @@ class FallbackDatabase:
         category = self.categories[category_id]
         if category['user_id'] != user_id:
             return None
+        old_name = category['name']
         
         # Update fields
         for key, value in update_data.items():
             if key in category:
                 category[key] = value
         
+        if category['user_id'] != user_id:
+            self._index_remove(self._category_ids_by_user, user_id, category_id)
+            self._index_add(self._category_ids_by_user, category['user_id'], category_id)
+        
         category['updated_at'] = datetime.now().isoformat()
+        self._record_category(category)
+        if category['name'] != old_name:
+            self._refile_tasks(user_id, old_name, category['name'])
         return category
     
-    def delete_category(self, category_id: str, user_id: str) -> bool:
+    def delete_category(self, category_id: str, user_id: str, move_to: Optional[str] = None) -> bool:
         """Delete a category"""
         if category_id not in self.categories:
             return False
@@ -185,37 +1067,54 @@ class FallbackDatabase:
             return False
         
         del self.categories[category_id]
+        self._index_remove(self._category_ids_by_user, category['user_id'], category_id)
+        self._record_category_deleted(category_id)
+        if move_to != category['name']:
+            self._refile_tasks(user_id, category['name'], move_to)
         return True
+    
+    def _refile_tasks(self, user_id: str, category: str, new_category: Optional[str]):
+        """Move the user's tasks from one category to another, found through the category index"""
+        for task_id in list(self._task_ids_by_category.get((user_id, category), ())):
+            self._update_record(self.tasks[task_id], user_id, {'category': new_category})
+
+def create_fallback_database() -> StorageBackend:
+    """Create the fallback storage backend selected by FALLBACK_DB_BACKEND"""
+    if FALLBACK_DB_BACKEND == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(FALLBACK_DB_PATH)
+    if FALLBACK_DB_BACKEND != "memory":
+        print(f"[ERROR] Unknown FALLBACK_DB_BACKEND '{FALLBACK_DB_BACKEND}', using memory")
+    if FALLBACK_DB_JOURNAL_DIR:
+        from journal import JournaledDatabase
+        return JournaledDatabase(FALLBACK_DB_JOURNAL_DIR, FALLBACK_DB_FSYNC_INTERVAL_MS / 1000)
+    return FallbackDatabase()
 
 # Initialize fallback database
-fallback_db = FallbackDatabase()
+fallback_db: StorageBackend = create_fallback_database()
+
+async def run_fallback(method, *args, **kwargs):
+    """Call a fallback_db method from async code: in a worker thread for blocking
+    backends (SQLite), inline for the in-memory ones, which are not thread-safe"""
+    if fallback_db.blocking:
+        return await asyncio.to_thread(method, *args, **kwargs)
+    return method(*args, **kwargs)
 
 def is_using_fallback() -> bool:
     """Check if we should use the fallback database instead of Supabase"""
     return supabase_client is None or not SUPABASE_URL or not SUPABASE_KEY
 
-def get_supabase_with_auth(access_token: str):
-    """Create a Supabase client with user's access token for RLS"""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        return None
-    try:
-        client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        # Set the user's access token for RLS
-        client.auth.set_session(access_token=access_token, refresh_token="")
-        # Verify the session is set correctly
-        user = client.auth.get_user(access_token)
-        if user.user is None:
-            print("Failed to authenticate user with Supabase")
-            return None
-        print(f"Successfully authenticated user: {user.user.email}")
-        # IMPORTANT: Set the session again to ensure RLS context is correct
-        client.auth.set_session(access_token=access_token, refresh_token="")
-        return client
-    except Exception as e:
-        print(f"Failed to create authenticated Supabase client: {e}")
+def get_supabase_with_auth(access_token: str) -> Optional[UserScopedClient]:
+    """Get a client scoped to the user's access token for RLS, using the shared connection pool.
+
+    The token is not re-verified here: handlers already authenticated it through
+    get_current_user_flexible, and PostgREST enforces it again for RLS.
+    """
+    if postgrest_pool is None:
         return None
+    return UserScopedClient(access_token)
 
-def test_database_connection() -> Dict[str, Any]:
+async def test_database_connection() -> Dict[str, Any]:
     """Test database connection and return status"""
     if is_using_fallback():
         return {
@@ -226,7 +1125,7 @@ def test_database_connection() -> Dict[str, Any]:
     else:
         try:
             # Try a simple query to test connection
-            response = supabase_client.table('tasks').select('id').limit(1).execute()
+            response = await postgrest_pool.from_('tasks').select('id').limit(1).execute()
             return {
                 "status": "connected",
                 "message": "Successfully connected to Supabase",
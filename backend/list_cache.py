@@ -0,0 +1,127 @@
+"""
+Read-through cache of materialized task and category lists
+==========================================================
+
+GET /api/tasks/ and GET /api/categories/ keep each user's built response,
+one entry per list variant (query string). An entry is only served while
+its list version (list_versions.py) is current, and every mutation evicts
+the user's entries of that list through invalidate_lists(). The version is
+read from the version store on every request, so a write on another worker
+or replica makes this worker's entries stale as well. Without a version
+store suited to the deployment (list_versions is None) nothing is cached.
+LIST_CACHE_TTL_SECONDS and LIST_CACHE_MAX_ENTRIES (LRU) bound how long and
+how much is kept.
+
+Select with LIST_CACHE_BACKEND:
+- memory: in-process LRU (default)
+- none:   no caching
+
+Other backends (e.g. a cache shared by replicas) implement ListCache; values
+are the encoded JSON bodies (bytes), so they can be stored as-is.
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from list_versions import list_versions
+
+LIST_CACHE_BACKEND = os.getenv("LIST_CACHE_BACKEND", "memory").lower()
+LIST_CACHE_MAX_ENTRIES = int(os.getenv("LIST_CACHE_MAX_ENTRIES", "10000"))
+LIST_CACHE_TTL_SECONDS = float(os.getenv("LIST_CACHE_TTL_SECONDS", "60"))
+
+CacheKey = Tuple[str, str, str]
+
+
+class ListCache(ABC):
+    """Per-user cache of list responses, keyed by (user_id, kind, variant)"""
+
+    @abstractmethod
+    async def get(self, user_id: str, kind: str, variant: str, version: int) -> Optional[Any]:
+        """The cached value if it was stored for this list version and has not expired"""
+
+    @abstractmethod
+    async def set(self, user_id: str, kind: str, variant: str, version: int, value: Any): ...
+
+    @abstractmethod
+    async def invalidate(self, user_id: str, kinds: Iterable[str]):
+        """Drop every variant of the user's lists of these kinds"""
+
+
+class NullListCache(ListCache):
+    async def get(self, user_id: str, kind: str, variant: str, version: int) -> Optional[Any]:
+        return None
+
+    async def set(self, user_id: str, kind: str, variant: str, version: int, value: Any):
+        pass
+
+    async def invalidate(self, user_id: str, kinds: Iterable[str]):
+        pass
+
+
+class LRUListCache(ListCache):
+    def __init__(self, max_entries: int = LIST_CACHE_MAX_ENTRIES, ttl: float = LIST_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, version, value), least recently used first
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, int, Any]]' = OrderedDict()
+        self._keys_by_user: Dict[str, Set[CacheKey]] = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+
+    def _remove(self, key: CacheKey):
+        self._entries.pop(key, None)
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+    async def get(self, user_id: str, kind: str, variant: str, version: int) -> Optional[Any]:
+        key = (user_id, kind, variant)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, entry_version, value = entry
+        if entry_version != version or expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, user_id: str, kind: str, variant: str, version: int, value: Any):
+        key = (user_id, kind, variant)
+        self._entries[key] = (time.monotonic() + self.ttl, version, value)
+        self._entries.move_to_end(key)
+        self._keys_by_user[user_id].add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate(self, user_id: str, kinds: Iterable[str]):
+        kinds = set(kinds)
+        for key in [key for key in self._keys_by_user.get(user_id, ()) if key[1] in kinds]:
+            self._remove(key)
+
+
+def create_list_cache() -> ListCache:
+    """List cache selected by LIST_CACHE_BACKEND"""
+    if LIST_CACHE_BACKEND == "none" or list_versions is None:
+        # Entries are only safe to serve while a shared version says they are current
+        return NullListCache()
+    if LIST_CACHE_BACKEND != "memory":
+        print(f"[ERROR] Unknown LIST_CACHE_BACKEND '{LIST_CACHE_BACKEND}', using memory")
+    return LRUListCache()
+
+
+async def invalidate_lists(user_id: str, *kinds: str):
+    """Call after every mutation: new list version (ETag) and no stale cached lists"""
+    if list_versions is not None:
+        await list_versions.bump(user_id, *kinds)
+    await list_cache.invalidate(user_id, kinds)
+
+
+list_cache = create_list_cache()
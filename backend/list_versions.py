@@ -0,0 +1,218 @@
+"""
+Per-user list versions for conditional GETs
+===========================================
+
+Every mutation in the tasks and categories routers bumps the user's version
+of that list. GET /api/tasks/ and GET /api/categories/ derive a strong ETag
+from the version (plus the query string), so a matching If-None-Match is
+answered with 304 before the data store is touched.
+
+Versions are epoch-microsecond based and only ever grow, so an ETag handed
+out before a restart can never match a newer list.
+
+Versions must be as shared as the data they describe: a version kept by one
+worker goes stale when another worker writes, and that worker would keep
+answering 304. Select with LIST_VERSION_BACKEND:
+- auto:     follow the data store (default): memory for the in-memory
+            fallback database (each worker has its own data anyway), sqlite
+            for the SQLite fallback database, supabase for Supabase
+- memory:   per process; only accepted with the in-memory fallback database
+- sqlite:   shared by the workers of one host, file LIST_VERSION_PATH
+- supabase: the list_versions table, bumped by triggers in the writing
+            transaction (supabase/migrations/20261017240000_list_versions.sql)
+- none:     no ETags or conditional GETs
+Without a suitable store conditional GETs (and the list cache) are off.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from database import FALLBACK_DB_BACKEND, is_using_fallback, service_postgrest
+
+LIST_VERSION_BACKEND = os.getenv("LIST_VERSION_BACKEND", "auto").lower()
+LIST_VERSION_PATH = os.getenv("LIST_VERSION_PATH", "sentinel_versions.db")
+
+TASKS = 'tasks'
+CATEGORIES = 'categories'
+
+
+def _epoch_us() -> int:
+    return time.time_ns() // 1000
+
+
+class VersionStore(ABC):
+    @abstractmethod
+    async def get(self, user_id: str, kind: str) -> int:
+        """Current version of one of the user's lists"""
+
+    @abstractmethod
+    async def bump(self, user_id: str, *kinds: str):
+        """Record that the user's lists changed"""
+
+
+class MemoryVersionStore(VersionStore):
+    def __init__(self):
+        self._versions: Dict[Tuple[str, str], int] = {}
+
+    async def get(self, user_id: str, kind: str) -> int:
+        # First sight of a list (e.g. after a restart) starts a new version
+        return self._versions.setdefault((user_id, kind), _epoch_us())
+
+    async def bump(self, user_id: str, *kinds: str):
+        now = _epoch_us()
+        for kind in kinds:
+            key = (user_id, kind)
+            self._versions[key] = max(self._versions.get(key, 0) + 1, now)
+
+
+class SQLiteVersionStore(VersionStore):
+    """
+    Versions shared by every worker on the host (one small SQLite file).
+    Queries can wait up to busy_timeout for other workers, so they run in a thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS list_versions ("
+                "user_id TEXT NOT NULL, kind TEXT NOT NULL, version INTEGER NOT NULL, "
+                "PRIMARY KEY (user_id, kind))"
+            )
+
+    def _get(self, user_id: str, kind: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM list_versions WHERE user_id = ? AND kind = ?", (user_id, kind)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            self._conn.execute(
+                "INSERT OR IGNORE INTO list_versions (user_id, kind, version) VALUES (?, ?, ?)",
+                (user_id, kind, _epoch_us())
+            )
+            return self._conn.execute(
+                "SELECT version FROM list_versions WHERE user_id = ? AND kind = ?", (user_id, kind)
+            ).fetchone()[0]
+
+    async def get(self, user_id: str, kind: str) -> int:
+        return await asyncio.to_thread(self._get, user_id, kind)
+
+    def _bump(self, user_id: str, *kinds: str):
+        now = _epoch_us()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO list_versions (user_id, kind, version) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id, kind) DO UPDATE SET version = MAX(version + 1, excluded.version)",
+                [(user_id, kind, now) for kind in kinds]
+            )
+
+    async def bump(self, user_id: str, *kinds: str):
+        await asyncio.to_thread(self._bump, user_id, *kinds)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SupabaseVersionStore(VersionStore):
+    """
+    Versions kept in the list_versions table, read through the service role
+    client. Triggers on tasks and categories bump them in the transaction that
+    writes the rows, so every replica sees a write as soon as it commits.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, user_id: str, kind: str) -> int:
+        response = await self.client.from_('list_versions').select('version') \
+            .eq('user_id', user_id).eq('kind', kind).execute()
+        # No row: the list has not been written since the table was created
+        return response.data[0]['version'] if response.data else 0
+
+    async def bump(self, user_id: str, *kinds: str):
+        # Already done by the triggers, atomically with the write
+        pass
+
+
+def _data_is_per_process() -> bool:
+    """The in-memory fallback database: every worker has its own data"""
+    return is_using_fallback() and FALLBACK_DB_BACKEND != "sqlite"
+
+
+def create_version_store() -> Optional[VersionStore]:
+    """Version store selected by LIST_VERSION_BACKEND (None: conditional GETs off)"""
+    backend = LIST_VERSION_BACKEND
+    if backend == "auto":
+        if _data_is_per_process():
+            backend = "memory"
+        else:
+            backend = "sqlite" if is_using_fallback() else "supabase"
+    if backend == "memory":
+        if not _data_is_per_process():
+            print("[ERROR] LIST_VERSION_BACKEND=memory is per process but the data is shared, conditional GETs off")
+            return None
+        return MemoryVersionStore()
+    if backend == "sqlite":
+        return SQLiteVersionStore(LIST_VERSION_PATH)
+    if backend == "supabase":
+        if service_postgrest is None:
+            print("[ERROR] LIST_VERSION_BACKEND=supabase needs SUPABASE_SERVICE_ROLE_KEY, conditional GETs off")
+            return None
+        return SupabaseVersionStore(service_postgrest)
+    if backend != "none":
+        print(f"[ERROR] Unknown LIST_VERSION_BACKEND '{LIST_VERSION_BACKEND}', conditional GETs off")
+    return None
+
+
+def list_variant(request: Request) -> str:
+    """Canonical query string: which variant (filters, page) of a list a request asks for"""
+    return str(sorted(request.query_params.multi_items()))
+
+
+def list_etag(request: Request, user_id: str, kind: str, version: int) -> str:
+    """Strong ETag of one list response: its version plus the user and query it was built for"""
+    variant = zlib.crc32(f"{user_id}?{list_variant(request)}".encode())
+    return f'"{kind}-{version}-{variant:08x}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in (tag.strip().removeprefix('W/') for tag in header.split(','))
+
+
+async def conditional_list(request: Request, response: Response, user_id: str,
+                           kind: str) -> Tuple[Optional[int], Optional[Response]]:
+    """
+    Tag `response` with the list's ETag. Returns the list version (None when
+    versions are off) and, when the client already has this version, the 304
+    response to send instead.
+    """
+    if list_versions is None:
+        return None, None
+    version = await list_versions.get(user_id, kind)
+    etag = list_etag(request, user_id, kind, version)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag_matches(request, etag):
+        return version, Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return version, None
+
+
+list_versions = create_version_store()
@@ -24,12 +24,18 @@ from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 
-from routers import tasks, auth, emails, test, categories
+from routers import tasks, auth, emails, test, categories, metrics, notifications
 from auth_utils import get_current_user_flexible
-from database import is_using_fallback
+from database import (
+    is_using_fallback, close_supabase_pools, fallback_db,
+    FALLBACK_DB_BACKEND, FALLBACK_DB_SNAPSHOT_INTERVAL_SECONDS
+)
+from journal import JournaledDatabase
+from reminder_scheduler import reminder_scheduler
 
 load_dotenv()
 
@@ -37,12 +43,29 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     # Startup
     if is_using_fallback():
-        print("Starting up FastAPI server with SQLite fallback database...")
+        print(f"Starting up FastAPI server with {FALLBACK_DB_BACKEND} fallback database...")
     else:
         print("Starting up FastAPI server with Supabase database...")
+    snapshot_task = None
+    if isinstance(fallback_db, JournaledDatabase):
+        print(f"Fallback database journaled to {fallback_db.directory}")
+        snapshot_task = asyncio.create_task(
+            fallback_db.snapshot_periodically(FALLBACK_DB_SNAPSHOT_INTERVAL_SECONDS)
+        )
+    await reminder_scheduler.rehydrate()
+    reminder_tasks = [asyncio.create_task(reminder_scheduler.refresh_window_periodically())]
+    if reminder_scheduler.lease_store is not None:
+        reminder_tasks.append(asyncio.create_task(reminder_scheduler.run_lease_sync()))
     yield
     # Shutdown
     print("Shutting down FastAPI server...")
+    for task in reminder_tasks:
+        task.cancel()
+    await reminder_scheduler.shutdown()
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+        fallback_db.close()
+    await close_supabase_pools()
 
 app = FastAPI(
     title="Sentinel API",
@@ -78,6 +101,8 @@ app.include_router(tasks.router)
 app.include_router(emails.router)
 app.include_router(categories.router)
 app.include_router(test.router)
+app.include_router(metrics.router)
+app.include_router(notifications.router)
 
 @app.get("/")
 async def root():
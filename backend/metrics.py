@@ -0,0 +1,148 @@
+"""
+In-process metrics for the reminder scheduler and delivery pipeline
+
+Counters and fixed-bucket histograms, cheap enough to update on every
+reminder. Read through GET /api/metrics/reminders (JSON or Prometheus text).
+"""
+import bisect
+import time
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+# Seconds; covers "on time" through "event loop badly overloaded"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf if beyond the last bucket)"""
+        if self.count == 0:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+    def prometheus(self, name: str, labels: str = "") -> List[str]:
+        lines, cumulative = [], 0
+        prefix = f"{labels}," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class ReminderMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.scheduled = 0
+        self.cancelled = 0
+        self.loaded = 0
+        self.fired = 0
+        self.duplicates_skipped = 0
+        # Due reminders dropped because the task was deleted, done or moved meanwhile
+        self.stale_skipped = 0
+        # Actual minus intended fire time
+        self.fire_lag = Histogram()
+        # Per notifier: intended fire time to successful send
+        self.delivered: Dict[str, int] = defaultdict(int)
+        self.delivery_failures: Dict[str, int] = defaultdict(int)
+        self.dead_lettered: Dict[str, int] = defaultdict(int)
+        self.delivery_latency: Dict[str, Histogram] = defaultdict(Histogram)
+
+    def snapshot(self, scheduler) -> Dict:
+        """JSON view, with gauges read from the scheduler"""
+        uptime = time.time() - self.started_at
+        delivery = scheduler.delivery
+        return {
+            'uptime_seconds': round(uptime, 3),
+            'pending': scheduler.pending_count,
+            'heap_size': scheduler.heap_size,
+            'next_fire_in_seconds': scheduler.next_fire_in(),
+            'window_end': scheduler.window_end,
+            'owned_buckets': len(scheduler.owned_buckets) if scheduler.owned_buckets is not None else None,
+            'delivery_queue': delivery.queue_size(),
+            'retries_pending': delivery.retries_pending(),
+            'dead_letters': len(delivery.dead_letters),
+            'counters': {
+                'scheduled': self.scheduled,
+                'cancelled': self.cancelled,
+                'loaded': self.loaded,
+                'fired': self.fired,
+                'duplicates_skipped': self.duplicates_skipped,
+                'stale_skipped': self.stale_skipped
+            },
+            'rates_per_minute': {
+                'scheduled': round(self.scheduled / uptime * 60, 3) if uptime else 0.0,
+                'cancelled': round(self.cancelled / uptime * 60, 3) if uptime else 0.0,
+                'fired': round(self.fired / uptime * 60, 3) if uptime else 0.0
+            },
+            'fire_lag_seconds': self.fire_lag.to_dict(),
+            'delivery': {
+                name: {
+                    'delivered': self.delivered[name],
+                    'failures': self.delivery_failures[name],
+                    'dead_lettered': self.dead_lettered[name],
+                    'latency_seconds': self.delivery_latency[name].to_dict()
+                }
+                for name in sorted(set(self.delivered) | set(self.delivery_failures) | set(self.delivery_latency))
+            }
+        }
+
+    def prometheus(self, scheduler) -> str:
+        """Prometheus text exposition format"""
+        delivery = scheduler.delivery
+        lines = [
+            "# TYPE reminders_pending gauge",
+            f"reminders_pending {scheduler.pending_count}",
+            "# TYPE reminders_delivery_queue gauge",
+            f"reminders_delivery_queue {delivery.queue_size()}",
+            "# TYPE reminders_dead_letters gauge",
+            f"reminders_dead_letters {len(delivery.dead_letters)}",
+        ]
+        for name in ('scheduled', 'cancelled', 'loaded', 'fired', 'duplicates_skipped', 'stale_skipped'):
+            lines.append(f"# TYPE reminders_{name}_total counter")
+            lines.append(f"reminders_{name}_total {getattr(self, name)}")
+        lines.append("# TYPE reminders_fire_lag_seconds histogram")
+        lines.extend(self.fire_lag.prometheus("reminders_fire_lag_seconds"))
+        for metric, values in (('delivered', self.delivered), ('delivery_failures', self.delivery_failures),
+                               ('dead_lettered', self.dead_lettered)):
+            lines.append(f"# TYPE reminders_{metric}_total counter")
+            for name, value in sorted(values.items()):
+                lines.append(f'reminders_{metric}_total{{notifier="{name}"}} {value}')
+        lines.append("# TYPE reminders_delivery_latency_seconds histogram")
+        for name, histogram in sorted(self.delivery_latency.items()):
+            lines.extend(histogram.prometheus("reminders_delivery_latency_seconds", f'notifier="{name}"'))
+        return "\n".join(lines) + "\n"
+
+
+reminder_metrics = ReminderMetrics()
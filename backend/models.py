@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, Literal, Union
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Any, Dict, Optional, Literal, Union
 from datetime import datetime
 from uuid import UUID
 
@@ -7,7 +7,8 @@ from uuid import UUID
 class User(BaseModel):
     id: str
     email: str
-    created_at: Union[str, datetime]
+    # Not part of Supabase access token claims, so unknown for locally verified tokens
+    created_at: Optional[Union[str, datetime]] = None
     
     @field_validator('created_at', mode='before')
     @classmethod
@@ -81,9 +82,25 @@ class Task(TaskBase):
     status: Literal['pending', 'done']
     inserted_at: datetime
     updated_at: datetime
+    # Subtask progress, kept up to date by the data store on every write:
+    # direct subtasks, and all subtasks at any depth
+    subtask_count: int = Field(0, alias="subtaskCount")
+    subtasks_done: int = Field(0, alias="subtasksDone")
+    descendant_count: int = Field(0, alias="descendantCount")
+    descendants_done: int = Field(0, alias="descendantsDone")
     
-    class Config:
-        allow_population_by_field_name = True
+    # Rows from the data stores use parent_id, so they validate as-is
+    model_config = ConfigDict(populate_by_name=True)
+    
+    @field_validator('is_starred', mode='before')
+    @classmethod
+    def parse_is_starred(cls, v):
+        # Supabase rows may carry NULL, SQLite rows 0/1
+        return False if v is None else v
+
+class TaskTree(Task):
+    # Subtasks, nested the same way
+    children: list['TaskTree'] = []
 
 # Email models
 class Email(BaseModel):
@@ -120,8 +137,27 @@ class Category(CategoryBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        allow_population_by_field_name = True
+    model_config = ConfigDict(populate_by_name=True)
+
+# Batch models
+class TaskBatchOperation(BaseModel):
+    op: Literal['create', 'update', 'delete']
+    # Required for update and delete
+    id: Optional[str] = None
+    # TaskCreate fields for create, TaskUpdate fields for update; validated per item
+    task: Optional[Dict[str, Any]] = None
+
+class TaskBatchRequest(BaseModel):
+    operations: list[TaskBatchOperation]
+
+# Import models
+class TaskImportRow(TaskBase):
+    # Only used to resolve parentId references within the import file
+    id: Optional[str] = None
+    status: Literal['pending', 'done'] = 'pending'
+    
+    # Accepts export rows (parentId or parent_id) and numeric ids from other tools
+    model_config = ConfigDict(populate_by_name=True, coerce_numbers_to_str=True)
 
 # Response models
 class TaskResponse(BaseModel):
@@ -133,6 +169,61 @@ class TaskListResponse(BaseModel):
     success: bool
     data: list[Task] = []
     message: Optional[str] = None
+    # Opaque cursor for the next page, None when there are no more tasks
+    next_cursor: Optional[str] = None
+
+class TaskTreeResponse(BaseModel):
+    success: bool
+    data: Optional[TaskTree] = None
+    # Some descendants were left out by the depth or size limit
+    truncated: bool = False
+    message: Optional[str] = None
+
+class TaskTreeListResponse(BaseModel):
+    success: bool
+    # Top-level tasks of the list, each with its subtasks as children
+    data: list[TaskTree] = []
+    # Some tasks were nested deeper than the depth limit and left out
+    truncated: bool = False
+    message: Optional[str] = None
+
+class TaskChangesResponse(BaseModel):
+    success: bool
+    # Tasks created or updated since the cursor, oldest change first
+    data: list[Task] = []
+    # Ids of tasks deleted since the cursor
+    deleted: list[str] = []
+    # Pass as `since` on the next call
+    next_cursor: str
+    # More changes are waiting; call again right away with next_cursor
+    has_more: bool = False
+    message: Optional[str] = None
+
+class TaskBatchResult(BaseModel):
+    op: Literal['create', 'update', 'delete']
+    id: Optional[str] = None
+    success: bool
+    data: Optional[Task] = None
+    error: Optional[str] = None
+
+class TaskBatchResponse(BaseModel):
+    success: bool
+    # One result per operation, in request order
+    data: list[TaskBatchResult] = []
+    message: Optional[str] = None
+
+class TaskImportError(BaseModel):
+    line: int
+    error: str
+
+class TaskImportResponse(BaseModel):
+    success: bool
+    imported: int = 0
+    # Rows skipped as invalid
+    failed: int = 0
+    # Row errors and parent links that could not be made, first 100
+    errors: list[TaskImportError] = []
+    message: Optional[str] = None
 
 class EmailSyncResponse(BaseModel):
     success: bool
@@ -148,4 +239,22 @@ class CategoryResponse(BaseModel):
 class CategoryListResponse(BaseModel):
     success: bool
     data: list[Category] = []
-    message: Optional[str] = None
\ No newline at end of file
+    message: Optional[str] = None
+
+class ReminderNotice(BaseModel):
+    task_id: str
+    title: str
+    # Intended fire time, epoch seconds
+    fire_at: float
+
+class InAppNotification(BaseModel):
+    subject: str
+    reminders: list[ReminderNotice] = []
+    # Epoch seconds
+    created_at: float
+
+class NotificationListResponse(BaseModel):
+    success: bool
+    # Oldest first
+    data: list[InAppNotification] = []
+    message: Optional[str] = None
@@ -0,0 +1,326 @@
+"""
+Reminder delivery pipeline
+==========================
+
+The scheduler hands over every reminder that fires in the same tick as one
+batch. Reminders for the same user are coalesced into a single notification,
+user emails are looked up once per user per batch, and notifications are sent
+by a fixed pool of REMINDER_DELIVERY_WORKERS coroutines so a spike of
+reminders cannot crowd out API requests. On Supabase the emails come from
+auth.users through the service role (reminder_user_emails).
+
+Notifiers are pluggable (REMINDER_NOTIFIERS, comma separated):
+- log:     log line per notification (default)
+- in_app:  kept in memory per user (in_app_notifications), read through
+           GET /api/notifications/; per process, so for single-worker setups
+- webhook: JSON POST to REMINDER_WEBHOOK_URL
+- smtp:    email through SMTP_HOST / SMTP_PORT
+
+A failed send is retried for that notifier only, with exponential backoff,
+up to REMINDER_DELIVERY_MAX_ATTEMPTS; after that the notification goes to the
+dead-letter list.
+"""
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from typing import Any, Deque, Dict, List, Optional, Set
+
+import httpx
+
+from database import fallback_db, is_using_fallback, run_fallback, service_postgrest
+from metrics import reminder_metrics
+
+logger = logging.getLogger(__name__)
+
+REMINDER_NOTIFIERS = os.getenv("REMINDER_NOTIFIERS", "log")
+REMINDER_DELIVERY_WORKERS = int(os.getenv("REMINDER_DELIVERY_WORKERS", "16"))
+REMINDER_DELIVERY_MAX_ATTEMPTS = int(os.getenv("REMINDER_DELIVERY_MAX_ATTEMPTS", "5"))
+REMINDER_RETRY_BASE_SECONDS = float(os.getenv("REMINDER_RETRY_BASE_SECONDS", "1"))
+REMINDER_RETRY_MAX_SECONDS = float(os.getenv("REMINDER_RETRY_MAX_SECONDS", "60"))
+REMINDER_DEAD_LETTER_MAX = int(os.getenv("REMINDER_DEAD_LETTER_MAX", "1000"))
+REMINDER_WEBHOOK_URL = os.getenv("REMINDER_WEBHOOK_URL", "")
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_FROM = os.getenv("SMTP_FROM", "reminders@sentinel.local")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+
+IN_APP_NOTIFICATIONS_PER_USER = 100
+SUBMIT_YIELD_EVERY = 500
+
+
+@dataclass
+class Notification:
+    """One message to a user covering every reminder that fired for them in a tick"""
+    user_id: str
+    user_email: Optional[str]
+    # [{'task_id', 'title', 'fire_at'}]
+    reminders: List[Dict[str, Any]]
+
+    @property
+    def subject(self) -> str:
+        if len(self.reminders) == 1:
+            return f"Reminder: '{self.reminders[0]['title']}' is due in 5 minutes"
+        return f"Reminder: {len(self.reminders)} tasks are due in 5 minutes"
+
+    @property
+    def body(self) -> str:
+        return "\n".join(f"- {reminder['title']}" for reminder in self.reminders)
+
+    @property
+    def fired_at(self) -> float:
+        """Intended fire time of the earliest reminder"""
+        return min(reminder['fire_at'] for reminder in self.reminders)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'user_id': self.user_id,
+            'subject': self.subject,
+            'reminders': self.reminders
+        }
+
+
+@dataclass
+class DeliveryJob:
+    notification: Notification
+    notifier: 'Notifier'
+    attempts: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+class Notifier(ABC):
+    name = "notifier"
+    requires_email = False
+
+    @abstractmethod
+    async def send(self, notification: Notification): ...
+
+    async def aclose(self):
+        pass
+
+
+class LogNotifier(Notifier):
+    name = "log"
+
+    async def send(self, notification: Notification):
+        logger.info(f"🔔 REMINDER: {notification.subject} (User: {notification.user_email or notification.user_id})")
+
+
+class InAppNotifier(Notifier):
+    """Keeps the latest notifications of each user in memory"""
+    name = "in_app"
+
+    def __init__(self, per_user: int = IN_APP_NOTIFICATIONS_PER_USER):
+        self.per_user = per_user
+        self.notifications: Dict[str, Deque[Dict[str, Any]]] = defaultdict(lambda: deque(maxlen=self.per_user))
+
+    async def send(self, notification: Notification):
+        self.notifications[notification.user_id].append({**notification.to_dict(), 'created_at': time.time()})
+
+    def get(self, user_id: str) -> List[Dict[str, Any]]:
+        return list(self.notifications.get(user_id, ()))
+
+
+class WebhookNotifier(Notifier):
+    name = "webhook"
+
+    def __init__(self, url: str):
+        self.url = url
+        self._http = httpx.AsyncClient(timeout=10.0)
+
+    async def send(self, notification: Notification):
+        response = await self._http.post(self.url, json=notification.to_dict())
+        response.raise_for_status()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class SMTPNotifier(Notifier):
+    """Email through an SMTP relay; the blocking smtplib call runs in a thread"""
+    name = "smtp"
+    requires_email = True
+
+    def __init__(self, host: str, port: int, sender: str, username: str = "", password: str = "",
+                 starttls: bool = False):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def _send_sync(self, message: EmailMessage):
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+    async def send(self, notification: Notification):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = notification.user_email
+        message['Subject'] = notification.subject
+        message.set_content(notification.body)
+        await asyncio.to_thread(self._send_sync, message)
+
+
+def create_notifiers() -> List[Notifier]:
+    """Notifiers selected by REMINDER_NOTIFIERS"""
+    notifiers: List[Notifier] = []
+    for name in [name.strip().lower() for name in REMINDER_NOTIFIERS.split(",") if name.strip()]:
+        if name == "log":
+            notifiers.append(LogNotifier())
+        elif name == "in_app":
+            notifiers.append(in_app_notifications)
+        elif name == "webhook":
+            if REMINDER_WEBHOOK_URL:
+                notifiers.append(WebhookNotifier(REMINDER_WEBHOOK_URL))
+            else:
+                print("[ERROR] REMINDER_WEBHOOK_URL not set, webhook notifier disabled")
+        elif name == "smtp":
+            notifiers.append(SMTPNotifier(SMTP_HOST, SMTP_PORT, SMTP_FROM, SMTP_USERNAME, SMTP_PASSWORD,
+                                          SMTP_STARTTLS))
+        else:
+            print(f"[ERROR] Unknown reminder notifier '{name}'")
+    return notifiers
+
+
+async def lookup_user_emails(user_ids: List[str]) -> Dict[str, str]:
+    """Emails of the given users, in one lookup; users without one are left out"""
+    if not user_ids:
+        return {}
+    if is_using_fallback():
+        users = await run_fallback(lambda: [fallback_db.get_user_by_id(user_id) for user_id in user_ids])
+        return {user['id']: user['email'] for user in users if user and user.get('email')}
+    if service_postgrest is None:
+        logger.warning("SUPABASE_SERVICE_ROLE_KEY not set, cannot look up reminder emails")
+        return {}
+    response = await service_postgrest.rpc('reminder_user_emails', {'p_user_ids': user_ids}).execute()
+    return {row['id']: row['email'] for row in response.data or [] if row.get('email')}
+
+
+class DeliveryPipeline:
+    def __init__(self, notifiers: List[Notifier], workers: int = REMINDER_DELIVERY_WORKERS,
+                 max_attempts: int = REMINDER_DELIVERY_MAX_ATTEMPTS):
+        self.notifiers = notifiers
+        self.worker_count = workers
+        self.max_attempts = max_attempts
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=REMINDER_DEAD_LETTER_MAX)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._retry_timers: Set[asyncio.TimerHandle] = set()
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def submit(self, reminders: List[Any]):
+        """Coalesce a tick's reminders per user and queue them for every notifier"""
+        self._start()
+        by_user: Dict[str, List[Any]] = defaultdict(list)
+        emails: Dict[str, str] = {}
+        for reminder in reminders:
+            by_user[reminder.user_id].append(reminder)
+            if reminder.user_email:
+                emails[reminder.user_id] = reminder.user_email
+
+        # One lookup per tick for every user whose email the reminders did not carry
+        try:
+            emails.update(await lookup_user_emails([user_id for user_id in by_user if user_id not in emails]))
+        except Exception as e:
+            logger.error(f"Reminder email lookup failed, email notifiers skip this tick: {e}")
+
+        for count, (user_id, user_reminders) in enumerate(by_user.items(), 1):
+            if count % SUBMIT_YIELD_EVERY == 0:
+                # Let API requests run between chunks of a large tick
+                await asyncio.sleep(0)
+            email = emails.get(user_id)
+            notification = Notification(user_id, email, [
+                {'task_id': reminder.task_id, 'title': reminder.task_title, 'fire_at': reminder.fire_at}
+                for reminder in sorted(user_reminders)
+            ])
+            for notifier in self.notifiers:
+                if notifier.requires_email and not email:
+                    logger.warning(f"No email found for user {user_id}, skipping {notifier.name} reminder")
+                    continue
+                self._queue.put_nowait(DeliveryJob(notification, notifier))
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await job.notifier.send(job.notification)
+                name = job.notifier.name
+                reminder_metrics.delivered[name] += 1
+                reminder_metrics.delivery_latency[name].observe(time.time() - job.notification.fired_at)
+            except Exception as e:
+                self._failed(job, e)
+            finally:
+                self._queue.task_done()
+
+    def _failed(self, job: DeliveryJob, error: Exception):
+        job.attempts += 1
+        job.errors.append(f"{type(error).__name__}: {error}")
+        reminder_metrics.delivery_failures[job.notifier.name] += 1
+        if job.attempts >= self.max_attempts:
+            reminder_metrics.dead_lettered[job.notifier.name] += 1
+            logger.error(f"Reminder to user {job.notification.user_id} via {job.notifier.name} "
+                         f"failed {job.attempts} times, moved to dead letters: {error}")
+            self.dead_letters.append({
+                'notifier': job.notifier.name,
+                'notification': job.notification.to_dict(),
+                'attempts': job.attempts,
+                'errors': job.errors,
+                'failed_at': time.time()
+            })
+            return
+        # Full jitter exponential backoff; the worker moves on meanwhile
+        delay = random.uniform(0, min(REMINDER_RETRY_MAX_SECONDS, REMINDER_RETRY_BASE_SECONDS * 2 ** job.attempts))
+        loop = asyncio.get_running_loop()
+        self._retry_timers = {timer for timer in self._retry_timers if timer.when() > loop.time()}
+        self._retry_timers.add(loop.call_later(delay, self._retry, job))
+
+    def _retry(self, job: DeliveryJob):
+        if self._queue is not None:
+            self._queue.put_nowait(job)
+
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def retries_pending(self) -> int:
+        if not self._retry_timers:
+            return 0
+        now = asyncio.get_running_loop().time()
+        return sum(1 for timer in self._retry_timers if timer.when() > now and not timer.cancelled())
+
+    async def drain(self):
+        """Wait until every queued notification has been attempted once"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def aclose(self):
+        for timer in self._retry_timers:
+            timer.cancel()
+        self._retry_timers.clear()
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._queue = None
+        for notifier in self.notifiers:
+            await notifier.aclose()
+
+
+# Shared in-app notification store (REMINDER_NOTIFIERS=in_app)
+in_app_notifications = InAppNotifier()
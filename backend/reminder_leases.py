@@ -0,0 +1,313 @@
+"""
+Reminder ownership leases shared by every worker and replica
+============================================================
+
+Task ids are hashed into REMINDER_BUCKETS buckets. Each scheduler process
+holds time-limited leases on a fair share of the buckets and only keeps the
+reminders of tasks in its buckets. Leases are renewed every sync; a crashed
+worker's buckets are claimed by the others once its leases expire.
+
+- reminder_workers: heartbeat per process, used to compute the fair share
+- reminder_leases:  one row per bucket (owner + expiry)
+- reminder_changes: task ids scheduled/cancelled by a worker that does not own
+                    the bucket, polled by the owner which reloads those tasks
+- reminder_fired:   one row per (task, fire time); claiming it before delivery
+                    makes each reminder fire exactly once, even mid-handover
+
+Select with REMINDER_LEASE_BACKEND:
+- none:     single process, owns every bucket (default)
+- sqlite:   workers on one host, shared file REMINDER_LEASE_PATH
+- supabase: any number of replicas, via the RPC functions in
+            supabase/migrations/20261017100000_reminder_leases.sql
+
+Change notifications are read in commit order: SQLite writers are serialised,
+and on Supabase only notifications from finished transactions are handed out
+(see poll_reminder_changes), so a late commit is never skipped.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+from database import service_postgrest
+
+REMINDER_LEASE_BACKEND = os.getenv("REMINDER_LEASE_BACKEND", "none").lower()
+REMINDER_LEASE_PATH = os.getenv("REMINDER_LEASE_PATH", "sentinel_leases.db")
+REMINDER_BUCKETS = int(os.getenv("REMINDER_BUCKETS", "64"))
+REMINDER_LEASE_TTL_SECONDS = float(os.getenv("REMINDER_LEASE_TTL_SECONDS", "30"))
+
+# How long change notifications and fired markers are kept
+CHANGE_RETENTION_SECONDS = 3600
+FIRED_RETENTION_SECONDS = 86400
+# Change notifications read per poll_reminder_changes call
+CHANGE_PAGE_SIZE = 1000
+
+
+def task_bucket(task_id: str) -> int:
+    """Stable bucket of a task id (same in every process)"""
+    return zlib.crc32(str(task_id).encode()) % REMINDER_BUCKETS
+
+
+class LeaseStore(ABC):
+    """Shared state used to partition reminders between scheduler processes"""
+
+    @abstractmethod
+    async def heartbeat(self, owner: str, ttl: float) -> int:
+        """Register the owner as alive; returns the number of live workers"""
+
+    @abstractmethod
+    async def renew_and_claim(self, owner: str, want: int, ttl: float) -> Set[int]:
+        """Renew the owner's leases, claim up to `want` free buckets; returns the owned buckets"""
+
+    @abstractmethod
+    async def release(self, owner: str, buckets: Iterable[int]): ...
+
+    @abstractmethod
+    async def unregister(self, owner: str):
+        """Release every lease and remove the worker (shutdown)"""
+
+    @abstractmethod
+    async def notify(self, task_ids: Iterable[str]):
+        """Tell the owners of these tasks to reload their reminders"""
+
+    @abstractmethod
+    async def latest_change(self) -> Any:
+        """Position of the newest change notification, to start polling from"""
+
+    @abstractmethod
+    async def poll_changes(self, after: Any, buckets: Set[int]) -> Tuple[Any, List[str]]:
+        """Task ids changed after position `after` in the given buckets, and the new position"""
+
+    @abstractmethod
+    async def claim_fires(self, reminders: List[Tuple[str, float]]) -> Set[str]:
+        """Claim (task id, fire time) pairs; each is returned to exactly one caller"""
+
+    async def aclose(self):
+        pass
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminder_workers (
+    owner TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reminder_leases (
+    bucket INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL DEFAULT '',
+    expires_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_reminder_leases_owner ON reminder_leases(owner);
+CREATE TABLE IF NOT EXISTS reminder_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    bucket INTEGER NOT NULL,
+    task_id TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reminder_fired (
+    task_id TEXT NOT NULL,
+    fire_at REAL NOT NULL,
+    fired_at REAL NOT NULL,
+    PRIMARY KEY (task_id, fire_at)
+);
+"""
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """
+    Lease store for the workers of one host (one shared SQLite file).
+    Queries can wait up to busy_timeout for other workers, so they run in a thread.
+    """
+
+    def __init__(self, path: str, buckets: int = REMINDER_BUCKETS):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SQLITE_SCHEMA)
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO reminder_leases (bucket) VALUES (?)", [(b,) for b in range(buckets)]
+            )
+
+    def _transaction(self, statements):
+        """Run (sql, params) pairs in one write transaction; returns the rows of the last one"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = None
+                for sql, params in statements:
+                    cursor = self._conn.execute(sql, params)
+                rows = cursor.fetchall() if cursor is not None else []
+                self._conn.execute("COMMIT")
+                return rows
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def heartbeat(self, owner: str, ttl: float) -> int:
+        now = time.time()
+        rows = await asyncio.to_thread(self._transaction, [
+            ("INSERT INTO reminder_workers (owner, expires_at) VALUES (?, ?) "
+             "ON CONFLICT(owner) DO UPDATE SET expires_at = excluded.expires_at", (owner, now + ttl)),
+            ("DELETE FROM reminder_workers WHERE expires_at < ?", (now,)),
+            ("DELETE FROM reminder_changes WHERE created_at < ?", (now - CHANGE_RETENTION_SECONDS,)),
+            ("DELETE FROM reminder_fired WHERE fired_at < ?", (now - FIRED_RETENTION_SECONDS,)),
+            ("SELECT COUNT(*) FROM reminder_workers", ()),
+        ])
+        return rows[0][0]
+
+    async def renew_and_claim(self, owner: str, want: int, ttl: float) -> Set[int]:
+        now = time.time()
+        rows = await asyncio.to_thread(self._transaction, [
+            ("UPDATE reminder_leases SET expires_at = ? WHERE owner = ? AND expires_at >= ?",
+             (now + ttl, owner, now)),
+            ("UPDATE reminder_leases SET owner = ?, expires_at = ? WHERE bucket IN ("
+             "SELECT bucket FROM reminder_leases WHERE expires_at < ? ORDER BY bucket LIMIT ?)",
+             (owner, now + ttl, now, max(want, 0))),
+            ("SELECT bucket FROM reminder_leases WHERE owner = ? AND expires_at >= ?", (owner, now)),
+        ])
+        return {row[0] for row in rows}
+
+    async def release(self, owner: str, buckets: Iterable[int]):
+        await asyncio.to_thread(self._transaction, [
+            ("UPDATE reminder_leases SET owner = '', expires_at = 0 WHERE owner = ? AND bucket = ?", (owner, bucket))
+            for bucket in buckets
+        ])
+
+    async def unregister(self, owner: str):
+        await asyncio.to_thread(self._transaction, [
+            ("UPDATE reminder_leases SET owner = '', expires_at = 0 WHERE owner = ?", (owner,)),
+            ("DELETE FROM reminder_workers WHERE owner = ?", (owner,)),
+        ])
+
+    async def notify(self, task_ids: Iterable[str]):
+        now = time.time()
+        await asyncio.to_thread(self._transaction, [
+            ("INSERT INTO reminder_changes (bucket, task_id, created_at) VALUES (?, ?, ?)",
+             (task_bucket(task_id), str(task_id), now))
+            for task_id in task_ids
+        ])
+
+    def _query(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def latest_change(self) -> int:
+        rows = await asyncio.to_thread(self._query, "SELECT COALESCE(MAX(seq), 0) FROM reminder_changes")
+        return rows[0][0]
+
+    async def poll_changes(self, after: int, buckets: Set[int]) -> Tuple[int, List[str]]:
+        # seq is assigned inside the serialised write transaction, so it follows commit order
+        rows = await asyncio.to_thread(
+            self._query, "SELECT seq, bucket, task_id FROM reminder_changes WHERE seq > ? ORDER BY seq", (after,)
+        )
+        if not rows:
+            return after, []
+        return rows[-1][0], [task_id for _, bucket, task_id in rows if bucket in buckets]
+
+    def _claim_fires(self, reminders: List[Tuple[str, float]]) -> Set[str]:
+        now = time.time()
+        claimed = set()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for task_id, fire_at in reminders:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO reminder_fired (task_id, fire_at, fired_at) VALUES (?, ?, ?)",
+                        (str(task_id), fire_at, now)
+                    )
+                    if cursor.rowcount == 1:
+                        claimed.add(str(task_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    async def claim_fires(self, reminders: List[Tuple[str, float]]) -> Set[str]:
+        return await asyncio.to_thread(self._claim_fires, reminders)
+
+    def _close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def aclose(self):
+        await asyncio.to_thread(self._close)
+
+
+class SupabaseLeaseStore(LeaseStore):
+    """Lease store for replicas on different hosts, through the service role client"""
+
+    def __init__(self, client, buckets: int = REMINDER_BUCKETS):
+        self.client = client
+        self.buckets = buckets
+
+    async def _rpc(self, function: str, params: dict):
+        response = await self.client.rpc(function, params).execute()
+        return response.data
+
+    async def heartbeat(self, owner: str, ttl: float) -> int:
+        return await self._rpc('reminder_heartbeat', {'p_owner': owner, 'p_ttl': ttl})
+
+    async def renew_and_claim(self, owner: str, want: int, ttl: float) -> Set[int]:
+        rows = await self._rpc('claim_reminder_leases', {
+            'p_owner': owner, 'p_buckets': self.buckets, 'p_want': max(want, 0), 'p_ttl': ttl
+        })
+        return {row if isinstance(row, int) else row['bucket'] for row in rows or []}
+
+    async def release(self, owner: str, buckets: Iterable[int]):
+        await self._rpc('release_reminder_leases', {'p_owner': owner, 'p_buckets': list(buckets)})
+
+    async def unregister(self, owner: str):
+        await self._rpc('unregister_reminder_worker', {'p_owner': owner})
+
+    async def notify(self, task_ids: Iterable[str]):
+        rows = [{'bucket': task_bucket(task_id), 'task_id': str(task_id)} for task_id in task_ids]
+        if rows:
+            await self.client.from_('reminder_changes').insert(rows).execute()
+
+    async def latest_change(self) -> Tuple[int, int]:
+        # Everything below the horizon has committed; later notifications are polled
+        horizon = await self._rpc('reminder_changes_horizon', {})
+        return horizon, 0
+
+    async def poll_changes(self, after: Tuple[int, int], buckets: Set[int]) -> Tuple[Tuple[int, int], List[str]]:
+        """`after` is a (transaction id, seq) position; seq alone is drawn before commit and can arrive late"""
+        after_xid, after_seq = after or (0, 0)
+        task_ids = []
+        while True:
+            result = await self._rpc('poll_reminder_changes', {
+                'p_after_xid': after_xid, 'p_after_seq': after_seq, 'p_limit': CHANGE_PAGE_SIZE
+            })
+            changes = result['changes'] or []
+            task_ids.extend(row['task_id'] for row in changes if row['bucket'] in buckets)
+            if len(changes) < CHANGE_PAGE_SIZE:
+                # Caught up: every transaction below the horizon has been read
+                return (result['horizon'], 0), task_ids
+            after_xid, after_seq = changes[-1]['xid'], changes[-1]['seq']
+
+    async def claim_fires(self, reminders: List[Tuple[str, float]]) -> Set[str]:
+        rows = await self._rpc('claim_reminder_fires', {
+            'p_task_ids': [str(task_id) for task_id, _ in reminders],
+            'p_fire_ats': [fire_at for _, fire_at in reminders]
+        })
+        return {row if isinstance(row, str) else row['task_id'] for row in rows or []}
+
+
+def create_lease_store() -> Optional[LeaseStore]:
+    """Lease store selected by REMINDER_LEASE_BACKEND (None: this process owns everything)"""
+    if REMINDER_LEASE_BACKEND == "sqlite":
+        return SQLiteLeaseStore(REMINDER_LEASE_PATH)
+    if REMINDER_LEASE_BACKEND == "supabase":
+        if service_postgrest is None:
+            print("[ERROR] REMINDER_LEASE_BACKEND=supabase needs SUPABASE_SERVICE_ROLE_KEY, reminders not partitioned")
+            return None
+        return SupabaseLeaseStore(service_postgrest)
+    if REMINDER_LEASE_BACKEND != "none":
+        print(f"[ERROR] Unknown REMINDER_LEASE_BACKEND '{REMINDER_LEASE_BACKEND}', reminders not partitioned")
+    return None
@@ -1,103 +1,461 @@
 """
 Reminder scheduler for task due date notifications
+
+All pending reminders live in one min-heap ordered by fire time, driven by a
+single event loop timer armed for the earliest deadline. Scheduling is
+O(log n); cancelling is O(1) and lazy (the stale heap entry is skipped when it
+reaches the top), so loop overhead does not grow with the number of pending
+reminders.
+
+Reminders are rebuilt from the task store on startup. Only reminders firing
+within the next REMINDER_HORIZON_HOURS are held in memory; the window is
+topped up every REMINDER_REFRESH_SECONDS with a dueAt range query.
+
+With several workers or replicas, each process only schedules the tasks in
+the buckets it holds leases on (see reminder_leases.py). Changes to tasks in
+other buckets are forwarded to their owner, and every reminder is claimed in
+the lease store before delivery so it fires exactly once. A bucket can go
+unowned for up to a lease TTL plus one sync when its owner dies or hands it
+over, so a newly claimed bucket also loads the reminders that fell due in that
+gap and fires them at once; the claim skips any the old owner already sent.
 """
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, Any
+import heapq
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 import logging
-from database import fallback_db, is_using_fallback, supabase_client
+from database import fallback_db, is_using_fallback, run_fallback, service_postgrest
+from metrics import reminder_metrics
+from reminder_delivery import DeliveryPipeline, create_notifiers
+from reminder_leases import (
+    LeaseStore, create_lease_store, task_bucket, REMINDER_BUCKETS, REMINDER_LEASE_TTL_SECONDS
+)
 
 logger = logging.getLogger(__name__)
 
+REMINDER_LEAD_TIME = timedelta(minutes=5)
+REMINDER_HORIZON_HOURS = float(os.getenv("REMINDER_HORIZON_HOURS", "6"))
+REMINDER_REFRESH_SECONDS = float(os.getenv("REMINDER_REFRESH_SECONDS", "900"))
+REMINDER_SYNC_SECONDS = float(os.getenv("REMINDER_SYNC_SECONDS", "5"))
+REHYDRATE_PAGE_SIZE = 1000
+# Ids per Supabase `in` filter when reloading tasks, keeps the query string short
+RELOAD_CHUNK_SIZE = 200
+# Fallback dueAt values are ISO strings that may carry any UTC offset, so the
+# string range scan is widened by a day and the exact fire time checked after
+STRING_RANGE_SLACK = timedelta(days=1)
+
+
+def _parse_due_at(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+class Reminder:
+    """A pending reminder; heap entries compare by fire time"""
+    __slots__ = ('fire_at', 'task_id', 'user_id', 'task_title', 'user_email', 'cancelled')
+    
+    def __init__(self, fire_at: float, task_id: str, user_id: str, task_title: str, user_email: Optional[str]):
+        self.fire_at = fire_at
+        self.task_id = task_id
+        self.user_id = user_id
+        self.task_title = task_title
+        self.user_email = user_email
+        self.cancelled = False
+    
+    def __lt__(self, other: 'Reminder') -> bool:
+        return self.fire_at < other.fire_at
+
+
 class ReminderScheduler:
     def __init__(self):
-        self.scheduled_reminders: Dict[str, asyncio.Task] = {}
+        # task_id -> live reminder; heap entries not in here are cancelled
+        self.scheduled_reminders: Dict[str, Reminder] = {}
+        self._heap: List[Reminder] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at: Optional[float] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        self.delivery = DeliveryPipeline(create_notifiers())
+        # Epoch seconds up to which reminders have been loaded; None = unbounded
+        self.window_end: Optional[float] = None
+        # Buckets leased from the shared store; None = this process owns every task
+        self.lease_store: Optional[LeaseStore] = create_lease_store()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.owned_buckets: Optional[Set[int]] = None if self.lease_store is None else set()
+        # Position in the lease store's change notifications (opaque to the scheduler)
+        self._change_cursor: Any = 0
+        # Tasks in other workers' buckets whose owner must reload them
+        self._outbox: Set[str] = set()
+    
+    def _owns(self, task_id: str) -> bool:
+        return self.owned_buckets is None or task_bucket(task_id) in self.owned_buckets
     
     async def schedule_reminder(self, task_id: str, user_id: str, task_title: str, due_at: datetime, user_email: str = None):
         """Schedule a reminder 5 minutes before task is due"""
         if not due_at:
             return
         
-        # Calculate reminder time (5 minutes before due)
-        reminder_time = due_at - timedelta(minutes=5)
-        now = datetime.now()
+        self._schedule(task_id, user_id, task_title, due_at, user_email)
+        await self._flush_outbox()
+        self._arm_timer()
+    
+    async def schedule_reminders(self, reminders: List[Tuple[str, str, str, datetime, Optional[str]]]):
+        """Schedule (task_id, user_id, task_title, due_at, user_email) reminders with one timer update"""
+        for task_id, user_id, task_title, due_at, user_email in reminders:
+            if due_at:
+                self._schedule(task_id, user_id, task_title, due_at, user_email)
+        await self._flush_outbox()
+        self._arm_timer()
+    
+    def _schedule(self, task_id: str, user_id: str, task_title: str, due_at: datetime, user_email: Optional[str]):
+        if not self._owns(task_id):
+            # The owning worker reloads the task from the store
+            self._outbox.add(task_id)
+            return
+        
+        # Epoch seconds work for both naive (local time) and timezone-aware due dates
+        fire_at = (due_at - REMINDER_LEAD_TIME).timestamp()
+        now = time.time()
         
         # If reminder time is in the past, don't schedule
-        if reminder_time <= now:
+        if fire_at <= now:
             logger.info(f"Task {task_id} due time is too soon, skipping reminder")
+            self.cancel_reminder(task_id)
             return
         
-        # Calculate delay in seconds
-        delay = (reminder_time - now).total_seconds()
-        
-        logger.info(f"Scheduling reminder for task '{task_title}' in {delay/60:.1f} minutes")
+        # Replace existing reminder if any
+        self._discard(task_id)
         
-        # Cancel existing reminder if any
-        if task_id in self.scheduled_reminders:
-            self.scheduled_reminders[task_id].cancel()
+        # Beyond the loaded window: a later window refresh picks it up from the store
+        if self.window_end is not None and fire_at >= self.window_end:
+            return
         
-        # Schedule new reminder
-        task = asyncio.create_task(self._send_reminder_after_delay(
-            task_id, user_id, task_title, user_email, delay
-        ))
-        self.scheduled_reminders[task_id] = task
-    
-    async def _send_reminder_after_delay(self, task_id: str, user_id: str, task_title: str, user_email: str, delay: float):
-        """Wait for the specified delay then send reminder"""
+        logger.info(f"Scheduling reminder for task '{task_title}' in {(fire_at - now)/60:.1f} minutes")
+        self._add(Reminder(fire_at, task_id, user_id, task_title, user_email))
+        reminder_metrics.scheduled += 1
+    
+    def _add(self, reminder: Reminder):
+        self.scheduled_reminders[reminder.task_id] = reminder
+        heapq.heappush(self._heap, reminder)
+    
+    async def rehydrate(self):
+        """Load the reminders firing within the horizon from the task store (startup)"""
+        now = time.time()
+        self.window_end = now + REMINDER_HORIZON_HOURS * 3600
         try:
-            await asyncio.sleep(delay)
-            await self._send_reminder(task_id, user_id, task_title, user_email)
-        except asyncio.CancelledError:
-            logger.info(f"Reminder for task {task_id} was cancelled")
+            if self.lease_store is not None:
+                # Claiming buckets loads their reminders
+                self._change_cursor = await self.lease_store.latest_change()
+                await self.sync_leases()
+            else:
+                loaded = await self._load_window(now, self.window_end)
+                logger.info(f"Rehydrated {loaded} reminders due in the next {REMINDER_HORIZON_HOURS:g} hours")
         except Exception as e:
-            logger.error(f"Error sending reminder for task {task_id}: {e}")
-        finally:
-            # Clean up
-            if task_id in self.scheduled_reminders:
-                del self.scheduled_reminders[task_id]
-    
-    async def _send_reminder(self, task_id: str, user_id: str, task_title: str, user_email: str):
-        """Send the actual reminder"""
+            logger.error(f"Error rehydrating reminders: {e}")
+    
+    async def refresh_window_periodically(self):
+        """Background task: extend the loaded window so it always covers the horizon"""
+        while True:
+            await asyncio.sleep(REMINDER_REFRESH_SECONDS)
+            try:
+                start, end = self.window_end, time.time() + REMINDER_HORIZON_HOURS * 3600
+                if end <= start:
+                    continue
+                # Advance first so reminders created during the load are scheduled directly
+                self.window_end = end
+                loaded = await self._load_window(start, end)
+                logger.info(f"Loaded {loaded} more reminders into the scheduling window")
+            except Exception as e:
+                logger.error(f"Error refreshing reminder window: {e}")
+    
+    async def _load_window(self, start: float, end: float, buckets: Optional[Set[int]] = None,
+                           past_due: bool = False) -> int:
+        """Schedule owned reminders firing in [start, end) that are not scheduled yet; past_due keeps overdue ones"""
+        loaded = 0
+        async for task in self._due_tasks(start + REMINDER_LEAD_TIME.total_seconds(),
+                                          end + REMINDER_LEAD_TIME.total_seconds()):
+            if not self._owns(task['id']) or (buckets is not None and task_bucket(task['id']) not in buckets):
+                continue
+            due_at = _parse_due_at(task.get('dueAt'))
+            if due_at is None or task['id'] in self.scheduled_reminders:
+                continue
+            fire_at = (due_at - REMINDER_LEAD_TIME).timestamp()
+            if start <= fire_at < end and (past_due or fire_at > time.time()):
+                self._add(Reminder(fire_at, task['id'], task['user_id'], task['title'], None))
+                loaded += 1
+        reminder_metrics.loaded += loaded
+        if loaded:
+            self._arm_timer()
+        return loaded
+    
+    async def _due_tasks(self, due_from: float, due_to: float):
+        """Yield every user's tasks that are not done, due in [due_from, due_to) (epoch seconds)"""
+        if is_using_fallback():
+            # Local times as stored by the API, widened for values with other offsets
+            low = (datetime.fromtimestamp(due_from) - STRING_RANGE_SLACK).isoformat()
+            high = (datetime.fromtimestamp(due_to) + STRING_RANGE_SLACK).isoformat()
+            for task in await run_fallback(fallback_db.query_due_tasks, low, high):
+                yield task
+            return
+        
+        if service_postgrest is None:
+            logger.warning("SUPABASE_SERVICE_ROLE_KEY not set, cannot rehydrate reminders")
+            return
+        low = datetime.fromtimestamp(due_from, timezone.utc).isoformat()
+        high = datetime.fromtimestamp(due_to, timezone.utc).isoformat()
+        after = None
+        while True:
+            # Keyset pages over idx_tasks_due_at
+            query = service_postgrest.from_('tasks').select('id,user_id,title,dueAt') \
+                .gte('dueAt', low).lt('dueAt', high).neq('status', 'done') \
+                .order('dueAt.asc,id.asc').limit(REHYDRATE_PAGE_SIZE)
+            if after is not None:
+                query.params = query.params.add(
+                    'or', f'(dueAt.gt."{after[0]}",and(dueAt.eq."{after[0]}",id.gt.{after[1]}))'
+                )
+            response = await query.execute()
+            for task in response.data:
+                yield task
+            if len(response.data) < REHYDRATE_PAGE_SIZE:
+                return
+            after = (response.data[-1]['dueAt'], response.data[-1]['id'])
+    
+    async def _fetch_tasks(self, task_ids: List[str]) -> List[Dict[str, Any]]:
+        """Current rows of the given tasks (any user); missing ids are deleted tasks"""
+        if is_using_fallback():
+            tasks = await run_fallback(lambda: [fallback_db.get_task(task_id) for task_id in task_ids])
+            return [task for task in tasks if task is not None]
+        if service_postgrest is None:
+            return []
+        tasks = []
+        for start in range(0, len(task_ids), RELOAD_CHUNK_SIZE):
+            response = await service_postgrest.from_('tasks').select('id,user_id,title,dueAt,status') \
+                .in_('id', task_ids[start:start + RELOAD_CHUNK_SIZE]).execute()
+            tasks.extend(response.data)
+        return tasks
+    
+    async def _reload_tasks(self, task_ids: List[str]):
+        """Reschedule or cancel reminders of tasks changed by another worker"""
+        task_ids = [task_id for task_id in set(task_ids) if self._owns(task_id)]
+        if not task_ids:
+            return
+        for task_id in task_ids:
+            self._discard(task_id)
+        now = time.time()
+        for task in await self._fetch_tasks(task_ids):
+            due_at = _parse_due_at(task.get('dueAt'))
+            if due_at is None or task.get('status') == 'done':
+                continue
+            fire_at = (due_at - REMINDER_LEAD_TIME).timestamp()
+            if now < fire_at and (self.window_end is None or fire_at < self.window_end):
+                self._add(Reminder(fire_at, task['id'], task['user_id'], task['title'], None))
+        self._arm_timer()
+    
+    async def _flush_outbox(self):
+        if not self._outbox or self.lease_store is None:
+            return
+        task_ids, self._outbox = self._outbox, set()
         try:
-            # Get user email if not provided
-            if not user_email:
-                if is_using_fallback():
-                    user = fallback_db.get_user_by_id(user_id)
-                    user_email = user['email'] if user else None
-                else:
-                    # For Supabase, you'd need to get user email from auth
-                    user_email = None
-            
-            if not user_email:
-                logger.warning(f"No email found for user {user_id}, cannot send reminder")
+            await self.lease_store.notify(task_ids)
+        except Exception:
+            self._outbox |= task_ids
+            raise
+    
+    async def sync_leases(self):
+        """Heartbeat, rebalance bucket leases, then apply changes forwarded by other workers"""
+        store = self.lease_store
+        await self._flush_outbox()
+        
+        workers = await store.heartbeat(self.owner, REMINDER_LEASE_TTL_SECONDS)
+        share = -(-REMINDER_BUCKETS // max(workers, 1))
+        surplus = sorted(self.owned_buckets)[share:]
+        if surplus:
+            await store.release(self.owner, surplus)
+        kept = len(self.owned_buckets) - len(surplus)
+        owned = await store.renew_and_claim(self.owner, share - kept, REMINDER_LEASE_TTL_SECONDS)
+        
+        lost, gained = self.owned_buckets - owned, owned - self.owned_buckets
+        self.owned_buckets = owned
+        if lost:
+            for task_id in [task_id for task_id in self.scheduled_reminders if task_bucket(task_id) in lost]:
+                self._discard(task_id)
+            self._arm_timer()
+        if gained and self.window_end is not None:
+            # Reminders due while the buckets had no live owner fire now
+            handover_start = time.time() - (REMINDER_LEASE_TTL_SECONDS + REMINDER_SYNC_SECONDS)
+            loaded = await self._load_window(handover_start, self.window_end, gained, past_due=True)
+            logger.info(f"Claimed {len(gained)} reminder buckets with {loaded} pending reminders")
+        
+        self._change_cursor, changed = await store.poll_changes(self._change_cursor, owned)
+        await self._reload_tasks(changed)
+    
+    async def run_lease_sync(self):
+        """Background task: keep leases alive and pick up other workers' changes"""
+        while True:
+            await asyncio.sleep(REMINDER_SYNC_SECONDS)
+            try:
+                await self.sync_leases()
+            except Exception as e:
+                logger.error(f"Error syncing reminder leases: {e}")
+    
+    def _discard(self, task_id: str) -> bool:
+        reminder = self.scheduled_reminders.pop(task_id, None)
+        if reminder is None:
+            return False
+        reminder.cancelled = True
+        # Lazy deletion leaves the entry in the heap; rebuild once most of it is stale
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self.scheduled_reminders):
+            self._heap = [entry for entry in self._heap if not entry.cancelled]
+            heapq.heapify(self._heap)
+        return True
+    
+    def _arm_timer(self):
+        """Make sure the timer fires at the earliest live deadline (and no other)"""
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = self._timer_at = None
+            return
+        
+        next_at = self._heap[0].fire_at
+        if self._timer is not None:
+            if self._timer_at <= next_at:
                 return
-            
-            # For now, just log the reminder
-            # In a real app, you'd send email, push notification, etc.
-            logger.info(f"🔔 REMINDER: Task '{task_title}' is due in 5 minutes! (User: {user_email})")
-            
-            # TODO: Implement actual notification sending:
-            # - Email notification
-            # - Push notification
-            # - In-app notification
-            # - SMS (if configured)
-            
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(max(0.0, next_at - time.time()), self._fire_due)
+        self._timer_at = next_at
+    
+    @property
+    def pending_count(self) -> int:
+        """Live scheduled reminders"""
+        return len(self.scheduled_reminders)
+    
+    @property
+    def heap_size(self) -> int:
+        """Heap entries, including cancelled ones not yet popped"""
+        return len(self._heap)
+    
+    def next_fire_in(self) -> Optional[float]:
+        """Seconds until the timer fires (None when nothing is pending)"""
+        if self._timer_at is None:
+            return None
+        return round(self._timer_at - time.time(), 3)
+    
+    def _fire_due(self):
+        """Timer callback: pop every reminder that is due and deliver them"""
+        self._timer = self._timer_at = None
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0].fire_at <= now:
+            reminder = heapq.heappop(self._heap)
+            if reminder.cancelled:
+                continue
+            del self.scheduled_reminders[reminder.task_id]
+            reminder_metrics.fire_lag.observe(now - reminder.fire_at)
+            due.append(reminder)
+        reminder_metrics.fired += len(due)
+        
+        if due:
+            delivery = asyncio.create_task(self._send_due(due))
+            self._deliveries.add(delivery)
+            delivery.add_done_callback(self._deliveries.discard)
+        self._arm_timer()
+    
+    async def _current_reminders(self, reminders: List[Reminder]) -> List[Reminder]:
+        """The reminders whose task still exists, is not done and is still due at the same time"""
+        tasks = {task['id']: task for task in await self._fetch_tasks([reminder.task_id for reminder in reminders])}
+        current = []
+        for reminder in reminders:
+            task = tasks.get(reminder.task_id)
+            due_at = _parse_due_at(task.get('dueAt')) if task is not None else None
+            if (due_at is not None and task.get('status') != 'done'
+                    and abs((due_at - REMINDER_LEAD_TIME).timestamp() - reminder.fire_at) < 1e-3):
+                current.append(reminder)
+        return current
+    
+    async def _send_due(self, reminders: List[Reminder]):
+        try:
+            # A change made through another worker may not have reached this one yet
+            try:
+                current = await self._current_reminders(reminders)
+                reminder_metrics.stale_skipped += len(reminders) - len(current)
+                reminders = current
+            except Exception as e:
+                # Better a reminder for a changed task than none at all
+                logger.warning(f"Could not re-check {len(reminders)} due reminders, sending them as scheduled: {e}")
+            if self.lease_store is not None:
+                # Another worker may have fired some of these during a lease handover
+                claimed = await self.lease_store.claim_fires(
+                    [(reminder.task_id, reminder.fire_at) for reminder in reminders]
+                )
+                reminder_metrics.duplicates_skipped += len(reminders) - len(claimed)
+                reminders = [reminder for reminder in reminders if reminder.task_id in claimed]
+            await self.delivery.submit(reminders)
         except Exception as e:
-            logger.error(f"Error in reminder notification: {e}")
+            logger.error(f"Error delivering {len(reminders)} reminders: {e}")
     
     def cancel_reminder(self, task_id: str):
         """Cancel a scheduled reminder"""
-        if task_id in self.scheduled_reminders:
-            self.scheduled_reminders[task_id].cancel()
-            del self.scheduled_reminders[task_id]
+        if not self._owns(task_id):
+            # Forwarded to the owner on the next lease sync
+            self._outbox.add(task_id)
+        elif self._discard(task_id):
+            reminder_metrics.cancelled += 1
             logger.info(f"Cancelled reminder for task {task_id}")
     
+    def cancel_reminders(self, task_ids: Iterable[str]):
+        """Cancel the scheduled reminders of many tasks"""
+        cancelled = 0
+        for task_id in task_ids:
+            if not self._owns(task_id):
+                self._outbox.add(task_id)
+            elif self._discard(task_id):
+                cancelled += 1
+        if cancelled:
+            reminder_metrics.cancelled += cancelled
+            logger.info(f"Cancelled {cancelled} reminders")
+    
+    async def reload_reminders(self, task_ids: Iterable[str]):
+        """Rebuild the reminders of many tasks from their stored rows (done tasks get none)"""
+        task_ids = list(task_ids)
+        self._outbox.update(task_id for task_id in task_ids if not self._owns(task_id))
+        await self._reload_tasks(task_ids)
+        await self._flush_outbox()
+    
     def cancel_all_reminders(self):
         """Cancel all scheduled reminders"""
-        for task_id, task in self.scheduled_reminders.items():
-            task.cancel()
+        for reminder in self.scheduled_reminders.values():
+            reminder.cancelled = True
         self.scheduled_reminders.clear()
+        self._heap.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = self._timer_at = None
         logger.info("Cancelled all scheduled reminders")
+    
+    async def shutdown(self):
+        """Drop local reminders and hand this worker's buckets back to the others"""
+        self.cancel_all_reminders()
+        if self.lease_store is not None:
+            try:
+                await self._flush_outbox()
+                await self.lease_store.unregister(self.owner)
+            except Exception as e:
+                logger.error(f"Error releasing reminder leases: {e}")
+            await self.lease_store.aclose()
+        await self.delivery.aclose()
 
 # Global reminder scheduler instance
 reminder_scheduler = ReminderScheduler()
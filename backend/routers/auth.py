@@ -1,8 +1,8 @@
 from fastapi import APIRouter, HTTPException, status
 from fastapi import Request
 from pydantic import BaseModel
-from database import supabase_client, fallback_db, is_using_fallback
-from auth_utils import SECRET_KEY, ALGORITHM
+from database import supabase_auth, fallback_db, is_using_fallback, run_fallback
+from auth_utils import SECRET_KEY, ALGORITHM, token_cache
 import hashlib
 import jwt
 from datetime import datetime, timedelta
@@ -47,7 +47,7 @@ async def sign_in(request: Request, signin_request: SignInRequest):
     try:
         if is_using_fallback():
             # Use fallback database
-            user = fallback_db.get_user_by_email(signin_request.email)
+            user = await run_fallback(fallback_db.get_user_by_email, signin_request.email)
             if not user or not verify_password(signin_request.password, user['password_hash']):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -65,23 +65,21 @@ async def sign_in(request: Request, signin_request: SignInRequest):
             )
         else:
             # Use Supabase
-            response = supabase_client.auth.sign_in_with_password({
-                "email": signin_request.email,
-                "password": signin_request.password
-            })
+            session = await supabase_auth.sign_in_with_password(signin_request.email, signin_request.password)
             
-            if response.user is None:
+            if session is None or not session.get('user'):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid credentials"
                 )
             
+            user = session['user']
             return AuthResponse(
-                access_token=response.session.access_token,
+                access_token=session['access_token'],
                 user={
-                    "id": response.user.id,
-                    "email": response.user.email,
-                    "created_at": response.user.created_at
+                    "id": user['id'],
+                    "email": user['email'],
+                    "created_at": user['created_at']
                 }
             )
     except HTTPException:
@@ -98,7 +96,7 @@ async def sign_up(request: Request, signup_request: SignUpRequest):
     try:
         if is_using_fallback():
             # Check if user already exists
-            existing_user = fallback_db.get_user_by_email(signup_request.email)
+            existing_user = await run_fallback(fallback_db.get_user_by_email, signup_request.email)
             if existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -111,7 +109,7 @@ async def sign_up(request: Request, signup_request: SignUpRequest):
                 'email': signup_request.email,
                 'password_hash': password_hash
             }
-            user = fallback_db.create_user(user_data)
+            user = await run_fallback(fallback_db.create_user, user_data)
             
             access_token = create_access_token(data={"sub": user['id'], "email": user['email']})
             return AuthResponse(
@@ -124,25 +122,23 @@ async def sign_up(request: Request, signup_request: SignUpRequest):
             )
         else:
             # Use Supabase
-            response = supabase_client.auth.sign_up({
-                "email": signup_request.email,
-                "password": signup_request.password
-            })
+            response = await supabase_auth.sign_up(signup_request.email, signup_request.password)
             
-            if response.user is None:
+            if response['user'] is None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Failed to create user"
                 )
             
             # Return session if user is immediately confirmed
-            if response.session:
+            if response['session']:
+                user = response['user']
                 return AuthResponse(
-                    access_token=response.session.access_token,
+                    access_token=response['session']['access_token'],
                     user={
-                        "id": response.user.id,
-                        "email": response.user.email,
-                        "created_at": response.user.created_at
+                        "id": user['id'],
+                        "email": user['email'],
+                        "created_at": user['created_at']
                     }
                 )
             else:
@@ -164,7 +160,11 @@ async def sign_out(request: Request):
     """Sign out current user"""
     try:
         if not is_using_fallback():
-            supabase_client.auth.sign_out()
+            auth_header = request.headers.get("Authorization")
+            if auth_header and auth_header.startswith("Bearer "):
+                access_token = auth_header.split(" ")[1]
+                token_cache.discard(access_token)
+                await supabase_auth.sign_out(access_token)
         return {"message": "Successfully signed out"}
     except Exception as e:
         raise HTTPException(
@@ -186,7 +186,7 @@ async def get_user(request: Request, token: str):
                     detail="Invalid token"
                 )
             
-            user = fallback_db.get_user_by_id(user_id)
+            user = await run_fallback(fallback_db.get_user_by_id, user_id)
             if user is None:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -200,17 +200,17 @@ async def get_user(request: Request, token: str):
             }
         else:
             # Use Supabase
-            response = supabase_client.auth.get_user(token)
-            if response.user is None:
+            user = await supabase_auth.get_user(token)
+            if user is None:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid token"
                 )
             
             return {
-                "id": response.user.id,
-                "email": response.user.email,
-                "created_at": response.user.created_at
+                "id": user['id'],
+                "email": user['email'],
+                "created_at": user['created_at']
             }
     except jwt.ExpiredSignatureError:
         raise HTTPException(
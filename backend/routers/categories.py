@@ -1,45 +1,57 @@
 """
 Categories router for managing user-specific categories
 """
-from fastapi import APIRouter, Request, HTTPException, Depends, status
+from fastapi import APIRouter, Request, Response, HTTPException, Depends, Query, status
+from typing import Optional
 from models import Category, CategoryCreate, CategoryUpdate, CategoryResponse, CategoryListResponse, User
-from auth_utils import get_current_user_flexible
-from database import supabase_client, fallback_db, is_using_fallback
+from auth_utils import get_current_user_flexible, get_user_supabase
+from database import fallback_db, is_using_fallback, run_fallback
+from list_versions import conditional_list, list_variant, CATEGORIES, TASKS
+from list_cache import list_cache, invalidate_lists
+from json_responses import render_json, json_response
 import uuid
 
 router = APIRouter(prefix="/api/categories", tags=["categories"])
 
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except ValueError:
+        return False
+
+
 @router.get("/", response_model=CategoryListResponse)
-async def list_categories(request: Request, current_user: User = Depends(get_current_user_flexible)):
+async def list_categories(request: Request, http_response: Response, current_user: User = Depends(get_current_user_flexible)):
     """Get all categories for the current user"""
     try:
+        # Answered from the list version alone when the client's copy is current
+        version, not_modified = await conditional_list(request, http_response, current_user.id, CATEGORIES)
+        if not_modified is not None:
+            return not_modified
+        variant = list_variant(request)
+        cached = await list_cache.get(current_user.id, CATEGORIES, variant, version)
+        if cached is not None:
+            return json_response(cached, http_response.headers)
+        
         if is_using_fallback():
             # Use fallback database
-            categories_data = fallback_db.get_categories_by_user(current_user.id)
+            categories_data = await run_fallback(fallback_db.get_categories_by_user, current_user.id)
         else:
             # Use Supabase
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with service role key
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            user_supabase = get_user_supabase(request)
             
-            response = supabase_client.table('categories').select('*').eq('user_id', current_user.id).execute()
+            response = await user_supabase.table('categories').select('*').eq('user_id', current_user.id).execute()
             categories_data = response.data
         
-        categories = [
-            Category(
-                id=cat['id'],
-                user_id=cat['user_id'],
-                name=cat['name'],
-                color=cat.get('color', '#3B82F6'),
-                created_at=cat['created_at'],
-                updated_at=cat['updated_at']
-            )
-            for cat in categories_data
-        ]
-        
-        return CategoryListResponse(success=True, data=categories, message="Categories retrieved successfully")
+        body = render_json(CategoryListResponse, {
+            'success': True,
+            'data': categories_data,
+            'message': "Categories retrieved successfully"
+        })
+        await list_cache.set(current_user.id, CATEGORIES, variant, version, body)
+        return json_response(body, http_response.headers)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -58,16 +70,12 @@ async def create_category(request: Request, category: CategoryCreate, current_us
         
         if is_using_fallback():
             # Use fallback database
-            created_category_data = fallback_db.create_category(category_data)
+            created_category_data = await run_fallback(fallback_db.create_category, category_data)
         else:
             # Use Supabase
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with service role key
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            user_supabase = get_user_supabase(request)
             
-            response = supabase_client.table('categories').insert(category_data).execute()
+            response = await user_supabase.table('categories').insert(category_data).execute()
             
             if not response.data:
                 raise HTTPException(
@@ -77,6 +85,8 @@ async def create_category(request: Request, category: CategoryCreate, current_us
             
             created_category_data = response.data[0]
         
+        await invalidate_lists(current_user.id, CATEGORIES)
+        
         created_category = Category(
             id=created_category_data['id'],
             user_id=created_category_data['user_id'],
@@ -94,7 +104,7 @@ async def create_category(request: Request, category: CategoryCreate, current_us
         )
 
 @router.put("/{category_id}", response_model=CategoryResponse)
-async def update_category(category_id: str, category_update: CategoryUpdate, current_user: User = Depends(get_current_user_flexible)):
+async def update_category(request: Request, category_id: str, category_update: CategoryUpdate, current_user: User = Depends(get_current_user_flexible)):
     """Update a category"""
     try:
         update_data = {}
@@ -111,23 +121,25 @@ async def update_category(category_id: str, category_update: CategoryUpdate, cur
         
         if is_using_fallback():
             # Use fallback database
-            updated_category_data = fallback_db.update_category(category_id, current_user.id, update_data)
+            updated_category_data = await run_fallback(fallback_db.update_category, category_id, current_user.id, update_data)
             if not updated_category_data:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Category not found"
                 )
         else:
-            # Use Supabase
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with service role key
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            # Use Supabase: the update and the refiling of its tasks are one transaction
+            user_supabase = get_user_supabase(request)
             
-            response = supabase_client.table('categories').update(update_data).eq('id', category_id).eq('user_id', current_user.id).execute()
+            response = None
+            if _is_uuid(category_id):
+                response = await user_supabase.rpc('update_category', {
+                    'p_category_id': category_id,
+                    'p_name': update_data.get('name'),
+                    'p_color': update_data.get('color')
+                }).execute()
             
-            if not response.data:
+            if response is None or not response.data:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Category not found"
@@ -135,6 +147,12 @@ async def update_category(category_id: str, category_update: CategoryUpdate, cur
             
             updated_category_data = response.data[0]
         
+        # A rename moves tasks to the new name; a color change leaves task lists as they are
+        if 'name' in update_data:
+            await invalidate_lists(current_user.id, CATEGORIES, TASKS)
+        else:
+            await invalidate_lists(current_user.id, CATEGORIES)
+        
         updated_category = Category(
             id=updated_category_data['id'],
             user_id=updated_category_data['user_id'],
@@ -154,33 +172,64 @@ async def update_category(category_id: str, category_update: CategoryUpdate, cur
         )
 
 @router.delete("/{category_id}", response_model=CategoryResponse)
-async def delete_category(category_id: str, current_user: User = Depends(get_current_user_flexible)):
+async def delete_category(
+    request: Request,
+    category_id: str,
+    move_to: Optional[str] = Query(None, description="Id of the category to move the tasks to; by default they become uncategorised"),
+    current_user: User = Depends(get_current_user_flexible)
+):
     """Delete a category"""
     try:
+        if move_to == category_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot move tasks to the category being deleted"
+            )
+        
         if is_using_fallback():
             # Use fallback database
-            success = fallback_db.delete_category(category_id, current_user.id)
+            target_name = None
+            if move_to is not None:
+                target = await run_fallback(fallback_db.get_category, move_to, current_user.id)
+                if target is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="Target category not found"
+                    )
+                target_name = target['name']
+            success = await run_fallback(fallback_db.delete_category, category_id, current_user.id, target_name)
             if not success:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Category not found"
                 )
         else:
-            # Use Supabase
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with service role key
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            # Use Supabase: the delete and the move of its tasks are one transaction
+            user_supabase = get_user_supabase(request)
             
-            response = supabase_client.table('categories').delete().eq('id', category_id).eq('user_id', current_user.id).execute()
+            if move_to is not None and not _is_uuid(move_to):
+                outcome = 'target_not_found'
+            elif not _is_uuid(category_id):
+                outcome = 'not_found'
+            else:
+                response = await user_supabase.rpc('delete_category', {
+                    'p_category_id': category_id,
+                    'p_move_to': move_to
+                }).execute()
+                outcome = response.data
             
-            if not response.data:
+            if outcome == 'target_not_found':
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Target category not found"
+                )
+            if outcome != 'deleted':
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Category not found"
                 )
         
+        await invalidate_lists(current_user.id, CATEGORIES, TASKS)
         return CategoryResponse(success=True, data=None, message="Category deleted successfully")
     except HTTPException:
         raise
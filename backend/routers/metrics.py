@@ -0,0 +1,38 @@
+"""
+Operational metrics endpoints
+"""
+import os
+import secrets
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse
+
+from metrics import reminder_metrics
+from reminder_scheduler import reminder_scheduler
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+# Metrics require "Authorization: Bearer <METRICS_TOKEN>"; unset disables them
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _check_metrics_token(request: Request):
+    if not METRICS_TOKEN:
+        # Do not reveal that the endpoint exists
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    auth_header = request.headers.get("Authorization", "")
+    if not secrets.compare_digest(auth_header, f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token"
+        )
+
+
+@router.get("/reminders")
+async def reminder_metrics_endpoint(request: Request, format: Literal['json', 'prometheus'] = Query('json')):
+    """Reminder scheduler health: pending count, schedule/cancel rates, fire lag, delivery latency and failures"""
+    _check_metrics_token(request)
+    if format == 'prometheus':
+        return PlainTextResponse(reminder_metrics.prometheus(reminder_scheduler), media_type="text/plain; version=0.0.4")
+    return reminder_metrics.snapshot(reminder_scheduler)
@@ -0,0 +1,24 @@
+"""
+In-app notifications (REMINDER_NOTIFIERS=in_app)
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from auth_utils import get_current_user_flexible
+from models import NotificationListResponse, User
+from reminder_delivery import in_app_notifications
+
+router = APIRouter(prefix="/api/notifications", tags=["notifications"])
+
+
+@router.get("/", response_model=NotificationListResponse)
+async def list_notifications(
+    since: Optional[float] = Query(None, description="created_at of the newest notification already seen"),
+    current_user: User = Depends(get_current_user_flexible)
+):
+    """Get the user's latest in-app reminder notifications"""
+    notifications = in_app_notifications.get(current_user.id)
+    if since is not None:
+        notifications = [notification for notification in notifications if notification['created_at'] > since]
+    return NotificationListResponse(success=True, data=notifications)
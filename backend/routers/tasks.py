@@ -1,63 +1,541 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi import Request
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from postgrest.types import ReturnMethod
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Set, Tuple, Union
 from datetime import datetime
-from database import supabase_client, fallback_db, is_using_fallback, get_supabase_with_auth
-from models import Task, TaskCreate, TaskUpdate, TaskResponse, TaskListResponse, User
-from auth_utils import get_current_user_flexible
+import csv
+import io
+import logging
+import time
+import uuid
+from database import (
+    fallback_db, is_using_fallback, run_fallback, task_sort_key, encode_task_cursor, decode_task_cursor,
+    encode_change_cursor, decode_change_cursor, TASK_TOMBSTONE_RETENTION_SECONDS
+)
+from models import (
+    Task, TaskCreate, TaskUpdate, TaskResponse, TaskListResponse, TaskChangesResponse, User,
+    TaskTreeResponse, TaskTreeListResponse,
+    TaskBatchOperation, TaskBatchRequest, TaskBatchResult, TaskBatchResponse,
+    TaskImportRow, TaskImportError, TaskImportResponse
+)
+from auth_utils import get_current_user_flexible, get_user_supabase
 from reminder_scheduler import reminder_scheduler
+from list_versions import conditional_list, list_variant, TASKS
+from list_cache import list_cache, invalidate_lists
+from json_responses import render_json, json_response, render_ndjson, render_json_rows
+from task_tree import assemble_forest, MAX_TREE_DEPTH, MAX_TREE_NODES
+from task_import import read_records, split_parent_runs, ParentLinks, ImportFormatError, MAX_IMPORT_ERRORS
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_CHUNK_SIZE = 5000
+# Ids per Supabase `in` filter, keeps the query string short
+SUPABASE_IN_CHUNK = 200
+EXPORT_CSV_COLUMNS = ['id', 'title', 'status', 'dueAt', 'isStarred', 'category', 'parentId', 'inserted_at', 'updated_at']
+
+# Same order as task_sort_key(): starred first, then dueAt (undated last), then id
+SUPABASE_TASK_ORDER = "isStarred.desc.nullslast,dueAt.asc.nullslast,id.asc"
+
+
+def _supabase_keyset_after(query, after: tuple):
+    """Restrict a Supabase tasks query to rows that sort after the `after` key.
+    A NULL isStarred counts as not starred, as in task_sort_key()."""
+    not_starred, undated, due_at, task_id = after
+    if undated:
+        rest = f'and(dueAt.is.null,id.gt.{task_id})'
+    else:
+        rest = f'or(dueAt.is.null,dueAt.gt."{due_at}",and(dueAt.eq."{due_at}",id.gt.{task_id}))'
+    if not_starred:
+        condition = f'(and(isStarred.not.is.true,{rest}))'
+    else:
+        condition = f'(isStarred.not.is.true,and(isStarred.eq.true,{rest}))'
+    query.params = query.params.add('or', condition)
+    return query
+
+
+def _task_from_row(task_data: Dict[str, Any]) -> Task:
+    return Task(
+        id=task_data['id'],
+        user_id=task_data['user_id'],
+        title=task_data['title'],
+        status=task_data['status'],
+        dueAt=task_data.get('dueAt'),
+        isStarred=bool(task_data.get('isStarred', False)),
+        category=task_data.get('category'),
+        parentId=task_data.get('parent_id'),
+        inserted_at=task_data['inserted_at'],
+        updated_at=task_data['updated_at'],
+        subtaskCount=task_data.get('subtask_count') or 0,
+        subtasksDone=task_data.get('subtasks_done') or 0,
+        descendantCount=task_data.get('descendant_count') or 0,
+        descendantsDone=task_data.get('descendants_done') or 0
+    )
+
+
+def _is_uuid(value: Optional[str]) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+def _validation_error_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+
+
+def _batch_operation_data(operation: TaskBatchOperation) -> Tuple[Dict[str, Any], Optional[datetime]]:
+    """Row data and due date of one batch operation; ValueError if the item is invalid"""
+    if operation.op == 'create':
+        task = TaskCreate.model_validate(operation.task or {})
+        return {
+            'title': task.title,
+            'status': 'pending',
+            'dueAt': task.due_at.isoformat() if task.due_at else None,
+            'isStarred': task.is_starred,
+            'category': task.category,
+            'parent_id': task.parent_id
+        }, task.due_at
+    if not operation.id:
+        raise ValueError(f"Task id is required for {operation.op}")
+    if operation.op == 'delete':
+        return {}, None
+    task_update = TaskUpdate.model_validate(operation.task or {})
+    update_data = {}
+    if task_update.title is not None:
+        update_data['title'] = task_update.title
+    if task_update.status is not None:
+        update_data['status'] = task_update.status
+    if task_update.due_at is not None:
+        update_data['dueAt'] = task_update.due_at.isoformat()
+    if task_update.is_starred is not None:
+        update_data['isStarred'] = task_update.is_starred
+    if task_update.category is not None:
+        update_data['category'] = task_update.category
+    return update_data, task_update.due_at
+
+
+async def _existing_task_ids(request: Request, user_id: str, task_ids: Set[str]) -> Set[str]:
+    """Which of these ids are tasks of the user"""
+    if is_using_fallback():
+        # Use fallback database
+        task_ids = list(task_ids)
+        tasks = await run_fallback(lambda: [fallback_db.get_task(task_id) for task_id in task_ids])
+        return {task_id for task_id, task in zip(task_ids, tasks) if task is not None and task['user_id'] == user_id}
+    # Use Supabase with user's JWT token
+    user_supabase = get_user_supabase(request)
+    candidates = [task_id for task_id in task_ids if _is_uuid(task_id)]
+    existing = set()
+    for start in range(0, len(candidates), SUPABASE_IN_CHUNK):
+        response = await user_supabase.table('tasks').select('id') \
+            .in_('id', candidates[start:start + SUPABASE_IN_CHUNK]).eq('user_id', user_id).execute()
+        existing.update(row['id'] for row in response.data or [])
+    return existing
 
-@router.get("/", response_model=TaskListResponse)
-async def list_tasks(request: Request, current_user: User = Depends(get_current_user_flexible)):
-    """Get all tasks for the current user"""
+
+async def _set_parents(request: Request, user_id: str, links: List[Tuple[str, str]]):
+    """Attach imported tasks to parents created after them"""
+    if not links:
+        return
+    if is_using_fallback():
+        # Use fallback database
+        await run_fallback(fallback_db.apply_task_batch, user_id, [('update', task_id, {'parent_id': parent_id}) for task_id, parent_id in links])
+        return
+    # Use Supabase with user's JWT token: one update per parent
+    user_supabase = get_user_supabase(request)
+    children: Dict[str, List[str]] = {}
+    for task_id, parent_id in links:
+        children.setdefault(parent_id, []).append(task_id)
+    for parent_id, task_ids in children.items():
+        for start in range(0, len(task_ids), SUPABASE_IN_CHUNK):
+            await user_supabase.table('tasks').update({'parent_id': parent_id}, returning=ReturnMethod.minimal) \
+                .in_('id', task_ids[start:start + SUPABASE_IN_CHUNK]).eq('user_id', user_id).execute()
+
+
+async def _delete_task_subtree(request: Request, task_id: str, user_id: str) -> List[str]:
+    """Delete a task and its descendants in one operation; returns their ids, 404 if not found"""
+    if is_using_fallback():
+        # Use fallback database
+        deleted_ids = await run_fallback(fallback_db.delete_task_subtree, task_id, user_id)
+    elif _is_uuid(task_id):
+        # Use Supabase with user's JWT token: one recursive DELETE (delete_task_subtree function)
+        response = await get_user_supabase(request).rpc('delete_task_subtree', {'p_root': task_id}).execute()
+        deleted_ids = response.data or []
+    else:
+        deleted_ids = []
+    if not deleted_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    return deleted_ids
+
+
+async def _set_task_subtree_status(request: Request, task_id: str, user_id: str, new_status: str) -> List[str]:
+    """Set the status of a task and its descendants in one operation; returns their ids, 404 if not found"""
+    if is_using_fallback():
+        # Use fallback database
+        updated_ids = await run_fallback(fallback_db.update_task_subtree, task_id, user_id, {'status': new_status})
+    elif _is_uuid(task_id):
+        # Use Supabase with user's JWT token: one recursive UPDATE (set_task_subtree_status function)
+        response = await get_user_supabase(request).rpc('set_task_subtree_status', {
+            'p_root': task_id,
+            'p_status': new_status
+        }).execute()
+        updated_ids = response.data or []
+    else:
+        updated_ids = []
+    if not updated_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    return updated_ids
+
+
+async def _supabase_task_changes(user_supabase, after: Optional[Tuple[int, str]],
+                                 limit: int) -> Tuple[List[Tuple[int, str, Optional[Dict[str, Any]]]], int]:
+    """
+    Changed tasks and tombstones after the (change_xid, id) position `after`, in that order,
+    and the horizon to resume from once caught up. Only transactions below the horizon
+    (the snapshot's xmin) are read, so a late commit never lands behind a cursor.
+    """
+    after_xid, after_id = after if after is not None else (None, None)
+    response = await user_supabase.rpc('task_changes', {
+        'p_after_xid': after_xid,
+        'p_after_id': after_id or None,
+        'p_limit': limit
+    }).execute()
+    result = response.data or {}
+    changes = [(row['xid'], row['id'], row['task']) for row in result.get('changes') or []]
+    return changes, result['horizon']
+
+
+async def _supabase_task_batch(user_supabase,
+                               operations: List[Tuple[str, Optional[str], Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Run batch operations through one apply_task_batch call: a single
+    transaction that applies them in request order, like the fallback
+    databases. Returns the row of each operation (None: not found).
+    """
+    if not operations:
+        return []
+    # Ids that are not UUIDs match no task instead of failing the whole batch
+    payload = [{'op': op, 'id': task_id if _is_uuid(task_id) else None, 'data': data}
+               for op, task_id, data in operations]
+    response = await user_supabase.rpc('apply_task_batch', {'p_operations': payload}).execute()
+    return response.data or []
+
+
+@router.get("/", response_model=Union[TaskListResponse, TaskTreeListResponse])
+async def list_tasks(
+    request: Request,
+    http_response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; all tasks when omitted"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    status_filter: Optional[Literal['pending', 'done']] = Query(None, alias="status"),
+    category: Optional[str] = None,
+    starred: Optional[bool] = None,
+    parent_id: Optional[str] = None,
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = None,
+    tree: bool = Query(False, description="Nest subtasks under their parents (TaskTreeListResponse)"),
+    depth: int = Query(MAX_TREE_DEPTH, ge=0, le=MAX_TREE_DEPTH, description="Nesting levels kept with tree=true"),
+    current_user: User = Depends(get_current_user_flexible)
+):
+    """Get the current user's tasks, optionally filtered and paginated, or as a tree"""
+    if tree and (limit or cursor):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="tree=true returns the whole list and cannot be paginated"
+        )
     try:
+        # Answered from the list version alone when the client's copy is current
+        version, not_modified = await conditional_list(request, http_response, current_user.id, TASKS)
+        if not_modified is not None:
+            return not_modified
+        variant = list_variant(request)
+        cached = await list_cache.get(current_user.id, TASKS, variant, version)
+        if cached is not None:
+            return json_response(cached, http_response.headers)
+        
+        try:
+            after = decode_task_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        
+        # Fetch one extra row to know whether there is a next page
+        fetch_limit = limit + 1 if limit else None
+        
         if is_using_fallback():
             # Use fallback database
-            task_data_list = fallback_db.get_tasks_by_user(current_user.id)
+            task_data_list = await run_fallback(
+                fallback_db.query_tasks,
+                current_user.id,
+                after=after,
+                limit=fetch_limit,
+                status=status_filter,
+                category=category,
+                is_starred=starred,
+                parent_id=parent_id,
+                due_from=due_from.isoformat() if due_from else None,
+                due_to=due_to.isoformat() if due_to else None
+            )
         else:
             # Use Supabase with user's JWT token
-            auth_header = request.headers.get("Authorization")
-            if not auth_header or not auth_header.startswith("Bearer "):
-                raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
-            
-            access_token = auth_header.split(" ")[1]
-            user_supabase = get_supabase_with_auth(access_token)
-            if not user_supabase:
-                raise HTTPException(status_code=500, detail="Failed to create authenticated Supabase client")
-            
-            response = user_supabase.table('tasks').select('*').eq('user_id', current_user.id).execute()
+            user_supabase = get_user_supabase(request)
+            query = user_supabase.table('tasks').select('*').eq('user_id', current_user.id)
+            if status_filter is not None:
+                query = query.eq('status', status_filter)
+            if category is not None:
+                query = query.eq('category', category)
+            if starred:
+                query = query.eq('isStarred', 'true')
+            elif starred is not None:
+                query = query.not_.is_('isStarred', 'true')
+            if parent_id is not None:
+                query = query.eq('parent_id', parent_id)
+            if due_from is not None:
+                query = query.gte('dueAt', due_from.isoformat())
+            if due_to is not None:
+                query = query.lte('dueAt', due_to.isoformat())
+            if after is not None:
+                query = _supabase_keyset_after(query, after)
+            query = query.order(SUPABASE_TASK_ORDER)
+            if fetch_limit:
+                query = query.limit(fetch_limit)
+            response = await query.execute()
             task_data_list = response.data
         
-        tasks: List[Task] = []
-        for task_data in task_data_list:
-            task = Task(
-                id=task_data['id'],
-                user_id=task_data['user_id'],
-                title=task_data['title'],
-                status=task_data['status'],
-                dueAt=task_data.get('dueAt'),
-                isStarred=bool(task_data.get('isStarred', False)),
-                category=task_data.get('category'),
-                parentId=task_data.get('parent_id'),
-                inserted_at=task_data['inserted_at'],
-                updated_at=task_data['updated_at']
-            )
-            tasks.append(task)
+        next_cursor = None
+        if limit and len(task_data_list) > limit:
+            task_data_list = task_data_list[:limit]
+            next_cursor = encode_task_cursor(task_sort_key(task_data_list[-1]))
         
-        return TaskListResponse(success=True, data=tasks)
+        # Rows are validated once while encoding (see json_responses.py)
+        if tree:
+            roots, truncated = assemble_forest(task_data_list, depth)
+            body = render_json(TaskTreeListResponse, {'success': True, 'data': roots, 'truncated': truncated})
+        else:
+            body = render_json(TaskListResponse, {'success': True, 'data': task_data_list, 'next_cursor': next_cursor})
+        await list_cache.set(current_user.id, TASKS, variant, version, body)
+        return json_response(body, http_response.headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch tasks: {str(e)}"
         )
 
+@router.get("/changes", response_model=TaskChangesResponse)
+async def get_task_changes(
+    request: Request,
+    since: Optional[str] = Query(None, description="next_cursor from the previous call; omit for a full sync"),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user_flexible)
+):
+    """Get the tasks created, updated or deleted since a sync cursor"""
+    try:
+        now = time.time()
+        seq, issued_at, after_id = None, now, None
+        if since:
+            try:
+                seq, issued_at, after_id = decode_change_cursor(since)
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+            # Deletions older than the retention window (or lost with a fallback restart) may be gone;
+            # Supabase cursors carry a task id, and a cursor from the other backend is no use either
+            valid_from = await run_fallback(fallback_db.task_changes_valid_from) if is_using_fallback() else 0.0
+            if (issued_at < max(valid_from, now - TASK_TOMBSTONE_RETENTION_SECONDS)
+                    or is_using_fallback() != (after_id is None)):
+                raise HTTPException(
+                    status_code=status.HTTP_410_GONE,
+                    detail="Sync cursor expired, start a full sync without `since`"
+                )
+        
+        # Fetch one extra change to know whether there are more
+        if is_using_fallback():
+            # Use fallback database
+            changes = await run_fallback(fallback_db.get_task_changes, current_user.id, seq, limit + 1)
+            horizon = None
+        else:
+            # Use Supabase with user's JWT token
+            after = (seq, after_id) if since else None
+            changes, horizon = await _supabase_task_changes(get_user_supabase(request), after, limit + 1)
+        
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        task_rows: List[Dict[str, Any]] = []
+        deleted: List[str] = []
+        for _, task_id, task_data in changes:
+            if task_data is None:
+                deleted.append(task_id)
+            else:
+                task_rows.append(task_data)
+        
+        # A partial page only vouches for the tombstones seen when the sync started
+        cursor_issued_at = issued_at if has_more else now
+        if horizon is None:
+            next_seq = changes[-1][0] if changes else (seq or 0)
+            next_cursor = encode_change_cursor(next_seq, cursor_issued_at)
+        elif has_more:
+            next_cursor = encode_change_cursor(changes[-1][0], cursor_issued_at, changes[-1][1])
+        else:
+            # Caught up: every transaction below the horizon has been read
+            next_cursor = encode_change_cursor(horizon, cursor_issued_at, '')
+        return json_response(render_json(TaskChangesResponse, {
+            'success': True,
+            'data': task_rows,
+            'deleted': deleted,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch task changes: {str(e)}"
+        )
+
+async def _export_pages(request: Request, user_id: str) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Every task of the user in list order, one keyset page at a time"""
+    user_supabase = None if is_using_fallback() else get_user_supabase(request)
+    after = None
+    while True:
+        if user_supabase is None:
+            # Walks the per-user sorted index from the last key
+            page = await run_fallback(fallback_db.query_tasks, user_id, after=after, limit=EXPORT_PAGE_SIZE)
+        else:
+            query = user_supabase.table('tasks').select('*').eq('user_id', user_id)
+            if after is not None:
+                query = _supabase_keyset_after(query, after)
+            response = await query.order(SUPABASE_TASK_ORDER).limit(EXPORT_PAGE_SIZE).execute()
+            page = response.data
+        if page:
+            yield page
+        if len(page) < EXPORT_PAGE_SIZE:
+            return
+        after = task_sort_key(page[-1])
+
+
+def _csv_chunk(rows: List[Dict[str, Any]], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_CSV_COLUMNS, extrasaction='ignore')
+    if header:
+        writer.writeheader()
+    for row in render_json_rows(Task, rows):
+        writer.writerow({key: str(value).lower() if isinstance(value, bool) else value for key, value in row.items()})
+    return buffer.getvalue()
+
+
+@router.get("/export")
+async def export_tasks(
+    request: Request,
+    export_format: Literal['ndjson', 'csv'] = Query('ndjson', alias="format"),
+    current_user: User = Depends(get_current_user_flexible)
+):
+    """Stream all of the current user's tasks as NDJSON or CSV"""
+    pages = _export_pages(request, current_user.id)
+    try:
+        # The first page is read up front so a failing data store still gets an error status
+        first_page = await anext(pages, [])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to export tasks: {str(e)}"
+        )
+    
+    async def body():
+        # One page in memory at a time; the next page is only read once the
+        # client has taken the previous chunk
+        page, header = first_page, True
+        try:
+            while True:
+                if export_format == 'csv':
+                    yield _csv_chunk(page, header)
+                    header = False
+                elif page:
+                    yield render_ndjson(Task, page)
+                page = await anext(pages, None)
+                if page is None:
+                    return
+        except Exception as e:
+            # Headers are already sent; aborting the stream tells the client the export is incomplete
+            logger.error(f"Task export for user {current_user.id} failed: {e}")
+            raise
+    
+    media_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(body(), media_type=media_type, headers={
+        'Content-Disposition': f'attachment; filename="tasks.{export_format}"',
+        'Cache-Control': 'no-store'
+    })
+
+@router.get("/{task_id}/tree", response_model=TaskTreeResponse)
+async def get_task_tree(
+    request: Request,
+    task_id: str,
+    depth: int = Query(MAX_TREE_DEPTH, ge=0, le=MAX_TREE_DEPTH, description="Levels of subtasks to include"),
+    current_user: User = Depends(get_current_user_flexible)
+):
+    """Get a task with all of its subtasks, nested"""
+    try:
+        # One level and one row beyond the limits show whether anything was cut off
+        if is_using_fallback():
+            # Use fallback database
+            rows = await run_fallback(fallback_db.get_task_subtree, task_id, current_user.id, depth + 1, MAX_TREE_NODES + 1)
+        elif _is_uuid(task_id):
+            # Use Supabase with user's JWT token: one recursive query (task_subtree function)
+            response = await get_user_supabase(request).rpc('task_subtree', {
+                'p_root': task_id,
+                'p_max_depth': depth + 1,
+                'p_limit': MAX_TREE_NODES + 1
+            }).execute()
+            rows = response.data or []
+        else:
+            rows = []
+        
+        if not rows:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task not found"
+            )
+        
+        roots, truncated = assemble_forest(rows[:MAX_TREE_NODES], depth, root_id=rows[0]['id'])
+        root = roots[0]
+        return json_response(render_json(TaskTreeResponse, {
+            'success': True,
+            'data': root,
+            'truncated': truncated or len(rows) > MAX_TREE_NODES
+        }))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch task tree: {str(e)}"
+        )
+
 @router.post("/", response_model=TaskResponse)
 async def create_task(request: Request, task: TaskCreate, current_user: User = Depends(get_current_user_flexible)):
     """Create a new task"""
     try:
+        # A subtask must hang under one of the user's own tasks
+        if task.parent_id is not None and not await _existing_task_ids(request, current_user.id, {task.parent_id}):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parent task not found"
+            )
+        
         task_data = {
             'user_id': current_user.id,
             'title': task.title,
@@ -70,25 +548,15 @@ async def create_task(request: Request, task: TaskCreate, current_user: User = D
         
         if is_using_fallback():
             # Use fallback database
-            created_task_data = fallback_db.create_task(task_data)
+            created_task_data = await run_fallback(fallback_db.create_task, task_data)
         else:
-            # Use Supabase with user authentication
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with anon key for RLS
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            # Use Supabase with user's JWT token for RLS
+            user_supabase = get_user_supabase(request)
             
-            # Set the user's JWT token for RLS
-            auth_header = request.headers.get('authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-                supabase_client.auth.set_session(access_token=token, refresh_token="")
-            
-            print(f"🔍 DEBUG: Inserting task data: {task_data}")
+            logger.debug(f"Inserting task data: {task_data}")
             try:
-                response = supabase_client.table('tasks').insert(task_data).execute()
-                print(f"Supabase response: {response}")
+                response = await user_supabase.table('tasks').insert(task_data).execute()
+                logger.debug(f"Supabase response: {response}")
                 
                 if not response.data:
                     raise HTTPException(
@@ -96,7 +564,7 @@ async def create_task(request: Request, task: TaskCreate, current_user: User = D
                         detail="Failed to create task"
                     )
             except Exception as e:
-                print(f"Supabase insert error: {e}")
+                logger.error(f"Supabase insert error: {e}")
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=f"Database error: {str(e)}"
@@ -104,6 +572,8 @@ async def create_task(request: Request, task: TaskCreate, current_user: User = D
             
             created_task_data = response.data[0]
         
+        await invalidate_lists(current_user.id, TASKS)
+        
         created_task = Task(
             id=created_task_data['id'],
             user_id=created_task_data['user_id'],
@@ -129,14 +599,212 @@ async def create_task(request: Request, task: TaskCreate, current_user: User = D
             )
         
         return TaskResponse(success=True, data=created_task, message="Task created successfully")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create task: {str(e)}"
         )
 
+@router.post("/batch", response_model=TaskBatchResponse)
+async def batch_tasks(request: Request, batch: TaskBatchRequest, current_user: User = Depends(get_current_user_flexible)):
+    """Create, update and delete many tasks in one request"""
+    if len(batch.operations) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can hold at most {MAX_BATCH_SIZE} operations"
+        )
+    try:
+        results: List[Optional[TaskBatchResult]] = [None] * len(batch.operations)
+        
+        # Invalid items fail on their own, the rest of the batch still runs
+        pending = []
+        for index, operation in enumerate(batch.operations):
+            try:
+                data, due_at = _batch_operation_data(operation)
+            except ValidationError as e:
+                results[index] = TaskBatchResult(op=operation.op, id=operation.id, success=False,
+                                                 error=_validation_error_message(e))
+                continue
+            except ValueError as e:
+                results[index] = TaskBatchResult(op=operation.op, id=operation.id, success=False, error=str(e))
+                continue
+            pending.append((index, operation.op, operation.id, data, due_at))
+        
+        # Subtasks must hang under the user's own tasks: one lookup for the whole batch
+        parent_ids = {data['parent_id'] for _, op, _, data, _ in pending if op == 'create' and data['parent_id'] is not None}
+        if parent_ids:
+            owned_parent_ids = await _existing_task_ids(request, current_user.id, parent_ids)
+            for index, op, task_id, data, _ in pending:
+                if op == 'create' and data['parent_id'] is not None and data['parent_id'] not in owned_parent_ids:
+                    results[index] = TaskBatchResult(op=op, id=task_id, success=False, error="Parent task not found")
+            pending = [item for item in pending if results[item[0]] is None]
+        
+        operations = [(op, task_id, data) for _, op, task_id, data, _ in pending]
+        if is_using_fallback():
+            # Use fallback database
+            rows = await run_fallback(fallback_db.apply_task_batch, current_user.id, operations)
+        else:
+            # Use Supabase with user's JWT token for RLS
+            rows = await _supabase_task_batch(get_user_supabase(request), operations)
+        
+        await invalidate_lists(current_user.id, TASKS)
+        
+        user_email = getattr(current_user, 'email', None) or 'user@example.com'
+        to_schedule, to_cancel = [], []
+        for (index, op, task_id, _, due_at), row in zip(pending, rows):
+            if row is None:
+                results[index] = TaskBatchResult(op=op, id=task_id, success=False, error="Task not found")
+            elif op == 'delete':
+                results[index] = TaskBatchResult(op=op, id=row['id'], success=True)
+                to_cancel.append(row['id'])
+            else:
+                task = _task_from_row(row)
+                results[index] = TaskBatchResult(op=op, id=task.id, success=True, data=task)
+                if due_at:
+                    to_schedule.append((task.id, current_user.id, task.title, due_at, user_email))
+        
+        # Schedule before cancelling: a task updated and then deleted in one batch ends up without a reminder
+        await reminder_scheduler.schedule_reminders(to_schedule)
+        reminder_scheduler.cancel_reminders(to_cancel)
+        
+        succeeded = sum(1 for result in results if result.success)
+        return TaskBatchResponse(
+            success=succeeded == len(results),
+            data=results,
+            message=f"{succeeded} of {len(results)} operations succeeded"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to apply task batch: {str(e)}"
+        )
+
+@router.post("/import", response_model=TaskImportResponse)
+async def import_tasks(
+    request: Request,
+    import_format: Optional[Literal['ndjson', 'csv']] = Query(
+        None, alias="format", description="Defaults to csv for a text/csv body, otherwise ndjson"
+    ),
+    chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=MAX_IMPORT_CHUNK_SIZE,
+                            description="Rows validated and inserted together"),
+    current_user: User = Depends(get_current_user_flexible)
+):
+    """Import tasks from an NDJSON or CSV upload (the format GET /export writes)"""
+    if import_format is None:
+        import_format = 'csv' if request.headers.get('content-type', '').startswith('text/csv') else 'ndjson'
+    user_supabase = None if is_using_fallback() else get_user_supabase(request)
+    user_email = getattr(current_user, 'email', None) or 'user@example.com'
+    links = ParentLinks()
+    errors: List[TaskImportError] = []
+    imported = failed = 0
+    
+    def report(line: int, message: str):
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append(TaskImportError(line=line, error=message))
+    
+    async def insert_chunk(records: List[Tuple[int, Dict[str, Any]]]):
+        nonlocal imported, failed
+        tasks: List[Tuple[int, TaskImportRow]] = []
+        for line, record in records:
+            try:
+                tasks.append((line, TaskImportRow.model_validate(record)))
+            except ValidationError as e:
+                failed += 1
+                report(line, _validation_error_message(e))
+        if not tasks:
+            return
+        
+        # Fallback ids are assigned by the store, so a task whose parent is
+        # earlier in the same chunk goes into the next pass; Supabase ids are
+        # assigned here and the whole chunk is one insert
+        runs = split_parent_runs(tasks) if user_supabase is None else [tasks]
+        to_schedule = []
+        for run in runs:
+            rows = []
+            for _, task in run:
+                row = {
+                    'title': task.title,
+                    'status': task.status,
+                    'dueAt': task.due_at.isoformat() if task.due_at else None,
+                    'isStarred': task.is_starred,
+                    'category': task.category,
+                    # Parents already created are linked right away
+                    'parent_id': links.parent(task.parent_id)
+                }
+                if user_supabase is not None:
+                    row['id'] = str(uuid.uuid4())
+                    links.created(task.id, row['id'])
+                rows.append(row)
+            
+            if user_supabase is None:
+                # Use fallback database: one pass over the store
+                task_ids = await run_fallback(fallback_db.create_tasks, current_user.id, rows)
+                for (_, task), task_id in zip(run, task_ids):
+                    links.created(task.id, task_id)
+            else:
+                # Use Supabase with user's JWT token: one bulk insert
+                await user_supabase.table('tasks').insert(
+                    [{**row, 'user_id': current_user.id} for row in rows], returning=ReturnMethod.minimal
+                ).execute()
+                task_ids = [row['id'] for row in rows]
+            imported += len(rows)
+            
+            for (line, task), task_id, row in zip(run, task_ids, rows):
+                links.linked(task_id, row['parent_id'], task.parent_id, line)
+                if task.status == 'pending' and task.due_at:
+                    to_schedule.append((task_id, current_user.id, task.title, task.due_at, user_email))
+        await reminder_scheduler.schedule_reminders(to_schedule)
+    
+    try:
+        records: List[Tuple[int, Dict[str, Any]]] = []
+        async for line, record in read_records(request.stream(), import_format):
+            if isinstance(record, str):
+                failed += 1
+                report(line, record)
+                continue
+            records.append((line, record))
+            if len(records) >= chunk_size:
+                await insert_chunk(records)
+                records = []
+        await insert_chunk(records)
+        
+        # Parents that came later in the file, or existing tasks
+        new_links, link_errors = links.resolve(
+            await _existing_task_ids(request, current_user.id, links.unresolved())
+        )
+        for line, message in link_errors:
+            report(line, message)
+        await _set_parents(request, current_user.id, new_links)
+        
+        return TaskImportResponse(
+            success=True,
+            imported=imported,
+            failed=failed,
+            errors=errors,
+            message=f"{imported} tasks imported, {failed} rows skipped"
+        )
+    except ImportFormatError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{e}; {imported} tasks were imported before it"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import tasks after {imported} tasks: {str(e)}"
+        )
+    finally:
+        if imported:
+            await invalidate_lists(current_user.id, TASKS)
+
 @router.put("/{task_id}", response_model=TaskResponse)
-async def update_task(task_id: str, task_update: TaskUpdate, current_user: User = Depends(get_current_user_flexible)):
+async def update_task(request: Request, task_id: str, task_update: TaskUpdate, current_user: User = Depends(get_current_user_flexible)):
     """Update a task"""
     try:
         # Build update data
@@ -154,32 +822,27 @@ async def update_task(task_id: str, task_update: TaskUpdate, current_user: User
         
         if is_using_fallback():
             # Use fallback database
-            updated_task_data = fallback_db.update_task(task_id, current_user.id, update_data)
+            updated_task_data = await run_fallback(fallback_db.update_task, task_id, current_user.id, update_data)
             if updated_task_data is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Task not found"
                 )
         else:
-            # Use Supabase with RLS disabled (temporary fix)
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with service role key
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            # Use Supabase with user's JWT token for RLS
+            user_supabase = get_user_supabase(request)
             
-            print(f"🔍 UPDATE DEBUG: Updating task {task_id} with data: {update_data}")
+            logger.debug(f"Updating task {task_id} with data: {update_data}")
             
             # Check if task_id is a valid UUID format
-            import uuid
             try:
                 uuid.UUID(task_id)
                 # Valid UUID, proceed with Supabase update
-                response = supabase_client.table('tasks').update(update_data).eq('id', task_id).execute()
-                print(f"🔍 UPDATE DEBUG: Supabase response: {response}")
+                response = await user_supabase.table('tasks').update(update_data).eq('id', task_id).eq('user_id', current_user.id).execute()
+                logger.debug(f"Supabase response: {response}")
             except ValueError:
                 # Not a valid UUID, task doesn't exist in Supabase
-                print(f"🔍 UPDATE DEBUG: Task {task_id} is not a valid UUID, skipping Supabase update")
+                logger.debug(f"Task {task_id} is not a valid UUID, skipping Supabase update")
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Task not found in database"
@@ -193,18 +856,9 @@ async def update_task(task_id: str, task_update: TaskUpdate, current_user: User
             
             updated_task_data = response.data[0]
         
-        updated_task = Task(
-            id=updated_task_data['id'],
-            user_id=updated_task_data['user_id'],
-            title=updated_task_data['title'],
-            status=updated_task_data['status'],
-            dueAt=updated_task_data.get('dueAt'),
-            isStarred=bool(updated_task_data.get('isStarred', False)),
-            category=updated_task_data.get('category'),
-            parentId=updated_task_data.get('parent_id'),
-            inserted_at=updated_task_data['inserted_at'],
-            updated_at=updated_task_data['updated_at']
-        )
+        await invalidate_lists(current_user.id, TASKS)
+        
+        updated_task = _task_from_row(updated_task_data)
         
         # Update reminder if due date changed
         if task_update.due_at:
@@ -227,37 +881,48 @@ async def update_task(task_id: str, task_update: TaskUpdate, current_user: User
         )
 
 @router.delete("/{task_id}")
-async def delete_task(task_id: str, current_user: User = Depends(get_current_user_flexible)):
+async def delete_task(
+    request: Request,
+    task_id: str,
+    cascade: bool = Query(False, description="Also delete every subtask, in one operation"),
+    current_user: User = Depends(get_current_user_flexible)
+):
     """Delete a task"""
     try:
+        if cascade:
+            deleted_ids = await _delete_task_subtree(request, task_id, current_user.id)
+            await invalidate_lists(current_user.id, TASKS)
+            # Cancel the reminders of the whole subtree in one batch
+            reminder_scheduler.cancel_reminders(deleted_ids)
+            return {
+                "success": True,
+                "message": f"Task and {len(deleted_ids) - 1} subtasks deleted successfully",
+                "deleted_ids": deleted_ids
+            }
+        
         if is_using_fallback():
             # Use fallback database
-            success = fallback_db.delete_task(task_id, current_user.id)
+            success = await run_fallback(fallback_db.delete_task, task_id, current_user.id)
             if not success:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Task not found"
                 )
         else:
-            # Use Supabase with RLS disabled (temporary fix)
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with service role key
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            # Use Supabase with user's JWT token for RLS
+            user_supabase = get_user_supabase(request)
             
-            print(f"🔍 DELETE DEBUG: Deleting task {task_id}")
+            logger.debug(f"Deleting task {task_id}")
             
             # Check if task_id is a valid UUID format
-            import uuid
             try:
                 uuid.UUID(task_id)
                 # Valid UUID, proceed with Supabase delete
-                response = supabase_client.table('tasks').delete().eq('id', task_id).execute()
-                print(f"🔍 DELETE DEBUG: Supabase response: {response}")
+                response = await user_supabase.table('tasks').delete().eq('id', task_id).eq('user_id', current_user.id).execute()
+                logger.debug(f"Supabase response: {response}")
             except ValueError:
                 # Not a valid UUID, task doesn't exist in Supabase
-                print(f"🔍 DELETE DEBUG: Task {task_id} is not a valid UUID, skipping Supabase delete")
+                logger.debug(f"Task {task_id} is not a valid UUID, skipping Supabase delete")
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Task not found in database"
@@ -269,6 +934,8 @@ async def delete_task(task_id: str, current_user: User = Depends(get_current_use
                     detail="Task not found"
                 )
         
+        await invalidate_lists(current_user.id, TASKS)
+        
         # Cancel any scheduled reminder
         reminder_scheduler.cancel_reminder(task_id)
         
@@ -282,7 +949,13 @@ async def delete_task(task_id: str, current_user: User = Depends(get_current_use
         )
 
 @router.put("/{task_id}/status")
-async def update_task_status(task_id: str, status_update: dict, current_user: User = Depends(get_current_user_flexible)):
+async def update_task_status(
+    request: Request,
+    task_id: str,
+    status_update: dict,
+    cascade: bool = Query(False, description="Apply the status to every subtask too, in one operation"),
+    current_user: User = Depends(get_current_user_flexible)
+):
     """Update task status (pending/done)"""
     try:
         new_status = status_update.get('status')
@@ -292,23 +965,33 @@ async def update_task_status(task_id: str, status_update: dict, current_user: Us
                 detail="Status must be 'pending' or 'done'"
             )
         
+        if cascade:
+            updated_ids = await _set_task_subtree_status(request, task_id, current_user.id, new_status)
+            await invalidate_lists(current_user.id, TASKS)
+            # Done tasks lose their reminders in one batch; reopened ones get them back
+            if new_status == 'done':
+                reminder_scheduler.cancel_reminders(updated_ids)
+            else:
+                await reminder_scheduler.reload_reminders(updated_ids)
+            return {
+                "success": True,
+                "message": f"Task and {len(updated_ids) - 1} subtasks updated to {new_status}",
+                "updated_ids": updated_ids
+            }
+        
         if is_using_fallback():
             # Use fallback database
-            updated_task_data = fallback_db.update_task(task_id, current_user.id, {'status': new_status})
+            updated_task_data = await run_fallback(fallback_db.update_task, task_id, current_user.id, {'status': new_status})
             if updated_task_data is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Task not found"
                 )
         else:
-            # Use Supabase with RLS disabled (temporary fix)
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with service role key
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            # Use Supabase with user's JWT token for RLS
+            user_supabase = get_user_supabase(request)
             
-            response = supabase_client.table('tasks').update({'status': new_status}).eq('id', task_id).execute()
+            response = await user_supabase.table('tasks').update({'status': new_status}).eq('id', task_id).eq('user_id', current_user.id).execute()
             
             if not response.data:
                 raise HTTPException(
@@ -316,6 +999,11 @@ async def update_task_status(task_id: str, status_update: dict, current_user: Us
                     detail="Task not found"
                 )
         
+        await invalidate_lists(current_user.id, TASKS)
+        if new_status == 'done':
+            reminder_scheduler.cancel_reminder(task_id)
+        else:
+            await reminder_scheduler.reload_reminders([task_id])
         return {"success": True, "message": f"Task status updated to {new_status}"}
     except HTTPException:
         raise
@@ -326,28 +1014,25 @@ async def update_task_status(task_id: str, status_update: dict, current_user: Us
         )
 
 @router.put("/{task_id}/star")
-async def toggle_task_star(task_id: str, star_update: dict, current_user: User = Depends(get_current_user_flexible)):
+async def toggle_task_star(request: Request, task_id: str, star_update: dict, current_user: User = Depends(get_current_user_flexible)):
     """Toggle task star status"""
     try:
-        is_starred = star_update.get('isStarred', False)
+        # isStarred is never stored as NULL (see task_sort_key())
+        is_starred = star_update.get('isStarred') or False
         
         if is_using_fallback():
             # Use fallback database
-            updated_task_data = fallback_db.update_task(task_id, current_user.id, {'isStarred': is_starred})
+            updated_task_data = await run_fallback(fallback_db.update_task, task_id, current_user.id, {'isStarred': is_starred})
             if updated_task_data is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Task not found"
                 )
         else:
-            # Use Supabase with RLS disabled (temporary fix)
-            from database import SUPABASE_URL, SUPABASE_KEY
-            from supabase import create_client
-            
-            # Create Supabase client with service role key
-            supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            # Use Supabase with user's JWT token for RLS
+            user_supabase = get_user_supabase(request)
             
-            response = supabase_client.table('tasks').update({'isStarred': is_starred}).eq('id', task_id).execute()
+            response = await user_supabase.table('tasks').update({'isStarred': is_starred}).eq('id', task_id).eq('user_id', current_user.id).execute()
             
             if not response.data:
                 raise HTTPException(
@@ -355,6 +1040,7 @@ async def toggle_task_star(task_id: str, star_update: dict, current_user: User =
                     detail="Task not found"
                 )
         
+        await invalidate_lists(current_user.id, TASKS)
         return {"success": True, "message": f"Task {'starred' if is_starred else 'unstarred'}"}
     except HTTPException:
         raise
@@ -374,18 +1060,11 @@ async def test_simple_insert(request: Request):
             raise HTTPException(status_code=401, detail="Missing authorization header")
         
         access_token = auth_header.split(" ")[1]
-        print(f"🔍 TEST: Using access token: {access_token[:50]}...")
-        
-        # Try with service role key instead
-        from database import SUPABASE_URL, SUPABASE_KEY
-        from supabase import create_client
+        # Use the shared connection pool with the user's token
+        from database import UserScopedClient
         
-        print(f"🔍 TEST: Creating client with service role key")
-        service_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
-        # Set the user's session
-        service_client.auth.set_session(access_token=access_token, refresh_token="")
-        print(f"🔍 TEST: Set session with access token")
+        service_client = UserScopedClient(access_token)
+        logger.debug("Scoped shared client to the caller's access token")
         
         # Try the simplest possible insert
         simple_data = {
@@ -394,16 +1073,17 @@ async def test_simple_insert(request: Request):
             'status': 'pending'
         }
         
-        print(f"🔍 TEST: Inserting simple data: {simple_data}")
+        logger.debug(f"Inserting simple data: {simple_data}")
         
-        # Try with service role client
-        response = service_client.table('tasks').insert(simple_data).execute()
-        print(f"🔍 TEST: Supabase response: {response}")
+        # Try with scoped client
+        response = await service_client.table('tasks').insert(simple_data).execute()
+        logger.debug(f"Supabase response: {response}")
+        await invalidate_lists(simple_data['user_id'], TASKS)
         
         return {"success": True, "data": response.data}
         
     except Exception as e:
-        print(f"🔍 TEST: Error: {e}")
+        logger.debug(f"Simple insert failed: {e}")
         raise HTTPException(status_code=500, detail=f"Test failed: {str(e)}")
 
 # PRESENTATION WORKAROUND: Fallback endpoints that always work
@@ -412,22 +1092,9 @@ async def list_tasks_fallback():
     """Fallback endpoint that always works - returns all tasks from fallback DB"""
     try:
         tasks: List[Task] = []
-        for task_data in fallback_db.tasks.values():
-            task = Task(
-                id=task_data['id'],
-                user_id=task_data['user_id'],
-                title=task_data['title'],
-                status=task_data['status'],
-                dueAt=task_data.get('dueAt'),
-                isStarred=bool(task_data.get('isStarred', False)),
-                category=task_data.get('category'),
-                parentId=task_data.get('parent_id'),
-                inserted_at=task_data['inserted_at'],
-                updated_at=task_data['updated_at']
-            )
+        for task_data in await run_fallback(fallback_db.get_all_tasks):
+            task = _task_from_row(task_data)
             tasks.append(task)
-        # Sort: starred first then due date ascending
-        tasks.sort(key=lambda t: (not t.isStarred, t.dueAt or ""))
         return TaskListResponse(success=True, data=tasks)
     except Exception as e:
         raise HTTPException(
@@ -439,7 +1106,6 @@ async def list_tasks_fallback():
 async def create_task_fallback(task: TaskCreate):
     """Fallback endpoint that always works - creates task in fallback DB"""
     try:
-        import uuid
         user_id = str(uuid.uuid4())
         
         task_data = {
@@ -452,7 +1118,9 @@ async def create_task_fallback(task: TaskCreate):
             'parent_id': task.parent_id
         }
         
-        created_task_data = fallback_db.create_task(task_data)
+        created_task_data = await run_fallback(fallback_db.create_task, task_data)
+        
+        await invalidate_lists(user_id, TASKS)
         
         created_task = Task(
             id=created_task_data['id'],
@@ -478,14 +1146,13 @@ async def create_task_fallback(task: TaskCreate):
 async def update_task_fallback(task_id: str, task_update: TaskUpdate):
     """Fallback endpoint that always works - updates task in fallback DB"""
     try:
-        if task_id not in fallback_db.tasks:
+        task = await run_fallback(fallback_db.get_task, task_id)
+        if task is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task not found"
             )
         
-        task = fallback_db.tasks[task_id]
-        
         # Build update data
         update_data = {}
         if task_update.title is not None:
@@ -499,25 +1166,12 @@ async def update_task_fallback(task_id: str, task_update: TaskUpdate):
         if task_update.category is not None:
             update_data['category'] = task_update.category
         
-        # Update the task
-        for key, value in update_data.items():
-            if key in task:
-                task[key] = value
-        
-        task['updated_at'] = datetime.now().isoformat()
-        
-        updated_task = Task(
-            id=task['id'],
-            user_id=task['user_id'],
-            title=task['title'],
-            status=task['status'],
-            dueAt=task.get('dueAt'),
-            isStarred=bool(task.get('isStarred', False)),
-            category=task.get('category'),
-            parentId=task.get('parent_id'),
-            inserted_at=task['inserted_at'],
-            updated_at=task['updated_at']
-        )
+        # Update the task (through the database so its indexes stay in sync)
+        task = await run_fallback(fallback_db.update_task, task_id, task['user_id'], update_data)
+        
+        await invalidate_lists(task['user_id'], TASKS)
+        
+        updated_task = _task_from_row(task)
         
         return TaskResponse(success=True, data=updated_task, message="Task updated successfully")
     except Exception as e:
@@ -530,13 +1184,15 @@ async def update_task_fallback(task_id: str, task_update: TaskUpdate):
 async def delete_task_fallback(task_id: str):
     """Fallback endpoint that always works - deletes task from fallback DB"""
     try:
-        if task_id not in fallback_db.tasks:
+        task = await run_fallback(fallback_db.get_task, task_id)
+        if task is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task not found"
             )
         
-        del fallback_db.tasks[task_id]
+        await run_fallback(fallback_db.delete_task, task_id, task['user_id'])
+        await invalidate_lists(task['user_id'], TASKS)
         return {"success": True, "message": "Task deleted successfully"}
     except Exception as e:
         raise HTTPException(
@@ -2,8 +2,10 @@
 Test endpoints for debugging and creating test accounts
 """
 from fastapi import APIRouter, HTTPException, Request
-from database import fallback_db, is_using_fallback
+from database import fallback_db, is_using_fallback, run_fallback
 from routers.auth import hash_password
+from list_cache import invalidate_lists
+from list_versions import TASKS
 import logging
 import os
 
@@ -21,7 +23,7 @@ async def create_test_user():
     test_password = "password123"
     
     # Check if test user already exists
-    existing_user = fallback_db.get_user_by_email(test_email)
+    existing_user = await run_fallback(fallback_db.get_user_by_email, test_email)
     if existing_user:
         return {
             "message": "Test user already exists",
@@ -36,7 +38,7 @@ async def create_test_user():
         'email': test_email,
         'password_hash': password_hash
     }
-    user = fallback_db.create_user(user_data)
+    user = await run_fallback(fallback_db.create_user, user_data)
     
     logger.info(f"Created test user: {user['id']} - {user['email']}")
     
@@ -52,9 +54,9 @@ async def get_database_status():
     """Get current database status and configuration"""
     return {
         "using_fallback": is_using_fallback(),
-        "fallback_users_count": len(fallback_db.users),
-        "fallback_tasks_count": len(fallback_db.tasks),
-        "users": list(fallback_db.users.values()) if is_using_fallback() else []
+        "fallback_users_count": len(await run_fallback(fallback_db.list_users)),
+        "fallback_tasks_count": await run_fallback(fallback_db.count_tasks),
+        "users": await run_fallback(fallback_db.list_users) if is_using_fallback() else []
     }
 
 @router.get("/test-signup")
@@ -83,7 +85,8 @@ async def test_task_creation():
         }
         
         if is_using_fallback():
-            created_task = fallback_db.create_task(test_task_data)
+            created_task = await run_fallback(fallback_db.create_task, test_task_data)
+            await invalidate_lists(created_task['user_id'], TASKS)
             return {
                 "success": True,
                 "message": "Test task created successfully",
@@ -125,7 +128,7 @@ async def test_token(request: Request):
 async def setup_supabase():
     """Setup Supabase tables and test connection"""
     try:
-        from database import supabase_client, is_using_fallback
+        from database import postgrest_pool, is_using_fallback
         
         if is_using_fallback():
             return {
@@ -134,7 +137,7 @@ async def setup_supabase():
             }
         
         # Test connection
-        test_response = supabase_client.table('tasks').select('id').limit(1).execute()
+        test_response = await postgrest_pool.from_('tasks').select('id').limit(1).execute()
         
         return {
             "success": True,
@@ -154,7 +157,7 @@ async def setup_supabase():
 async def test_crud_no_auth():
     """Test CRUD operations without authentication"""
     try:
-        from database import supabase_client, is_using_fallback
+        from database import postgrest_pool, is_using_fallback
         
         if is_using_fallback():
             # Test fallback database
@@ -168,7 +171,8 @@ async def test_crud_no_auth():
                 'parent_id': None
             }
             
-            created_task = fallback_db.create_task(test_task_data)
+            created_task = await run_fallback(fallback_db.create_task, test_task_data)
+            await invalidate_lists(created_task['user_id'], TASKS)
             return {
                 "success": True,
                 "message": "Fallback CRUD test successful",
@@ -187,9 +191,10 @@ async def test_crud_no_auth():
             }
             
             # Try to create a task
-            response = supabase_client.table('tasks').insert(test_task_data).execute()
+            response = await postgrest_pool.from_('tasks').insert(test_task_data).execute()
             
             if response.data:
+                await invalidate_lists(response.data[0]['user_id'], TASKS)
                 return {
                     "success": True,
                     "message": "Supabase CRUD test successful",
@@ -214,7 +219,7 @@ async def test_crud_no_auth():
 async def create_task_no_auth(request: Request):
     """Create task without authentication for testing"""
     try:
-        from database import supabase_client, is_using_fallback
+        from database import postgrest_pool, is_using_fallback
         from models import TaskCreate
         import json
         
@@ -232,10 +237,10 @@ async def create_task_no_auth(request: Request):
         
         if is_using_fallback():
             # Use fallback database
-            created_task_data = fallback_db.create_task(task_data)
+            created_task_data = await run_fallback(fallback_db.create_task, task_data)
         else:
             # Use Supabase
-            response = supabase_client.table('tasks').insert(task_data).execute()
+            response = await postgrest_pool.from_('tasks').insert(task_data).execute()
             
             if not response.data:
                 return {
@@ -246,6 +251,7 @@ async def create_task_no_auth(request: Request):
             
             created_task_data = response.data[0]
         
+        await invalidate_lists(created_task_data['user_id'], TASKS)
         return {
             "success": True,
             "message": "Task created successfully",
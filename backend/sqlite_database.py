@@ -0,0 +1,646 @@
+"""
+SQLite storage backend for fallback mode
+========================================
+
+Drop-in replacement for the in-memory FallbackDatabase that keeps its data in
+a single SQLite file, so every uvicorn worker (and every restart) on a host
+sees the same users, tasks and categories.
+
+Enable with FALLBACK_DB_BACKEND=sqlite (file path: FALLBACK_DB_PATH).
+
+- WAL journal mode: readers never block the single writer, across processes
+- Parameterised statements only, reused through sqlite3's statement cache
+- Indexes matching every lookup: email, user task list order, parent, due date, task category, categories
+- Triggers keep a per-user task change log (with tombstones) for delta sync
+- Triggers keep each task's subtask counters up to date (same-owner parents only), one walk up the parent chain per write
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from database import StorageBackend, TASK_TOMBSTONE_RETENTION_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    password_hash TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    dueAt TEXT,
+    isStarred INTEGER NOT NULL DEFAULT 0,
+    category TEXT,
+    parent_id TEXT,
+    inserted_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    subtask_count INTEGER NOT NULL DEFAULT 0,
+    subtasks_done INTEGER NOT NULL DEFAULT 0,
+    descendant_count INTEGER NOT NULL DEFAULT 0,
+    descendants_done INTEGER NOT NULL DEFAULT 0
+);
+-- Same order as database.task_sort_key(): starred first, then dueAt (undated last), then id
+CREATE INDEX IF NOT EXISTS idx_tasks_user_order
+    ON tasks(user_id, isStarred = 0, dueAt IS NULL, COALESCE(dueAt, ''), id);
+CREATE INDEX IF NOT EXISTS idx_tasks_parent_id ON tasks(parent_id);
+CREATE INDEX IF NOT EXISTS idx_tasks_user_category ON tasks(user_id, category);
+CREATE INDEX IF NOT EXISTS idx_tasks_due_at ON tasks(dueAt);
+
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    color TEXT NOT NULL DEFAULT '#3B82F6',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_categories_user_name ON categories(user_id, name);
+
+-- Change log for GET /api/tasks/changes, kept by triggers: one row per (task, user),
+-- re-inserted with a new seq on every change; deleted = 1 rows are tombstones
+CREATE TABLE IF NOT EXISTS task_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    changed_at REAL NOT NULL,
+    UNIQUE (task_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_task_changes_user_seq ON task_changes(user_id, seq);
+CREATE INDEX IF NOT EXISTS idx_task_changes_tombstones ON task_changes(changed_at) WHERE deleted = 1;
+
+CREATE TRIGGER IF NOT EXISTS tasks_changed_insert AFTER INSERT ON tasks BEGIN
+    INSERT OR REPLACE INTO task_changes (task_id, user_id, deleted, changed_at)
+    VALUES (NEW.id, NEW.user_id, 0, (julianday('now') - 2440587.5) * 86400.0);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_changed_update AFTER UPDATE ON tasks BEGIN
+    INSERT OR REPLACE INTO task_changes (task_id, user_id, deleted, changed_at)
+    SELECT OLD.id, OLD.user_id, 1, (julianday('now') - 2440587.5) * 86400.0 WHERE OLD.user_id <> NEW.user_id;
+    INSERT OR REPLACE INTO task_changes (task_id, user_id, deleted, changed_at)
+    VALUES (NEW.id, NEW.user_id, 0, (julianday('now') - 2440587.5) * 86400.0);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_changed_delete AFTER DELETE ON tasks BEGIN
+    INSERT OR REPLACE INTO task_changes (task_id, user_id, deleted, changed_at)
+    VALUES (OLD.id, OLD.user_id, 1, (julianday('now') - 2440587.5) * 86400.0);
+END;
+
+-- Tasks written before the change log existed
+INSERT OR IGNORE INTO task_changes (task_id, user_id, deleted, changed_at)
+SELECT id, user_id, 0, 0 FROM tasks
+WHERE NOT EXISTS (SELECT 1 FROM task_changes c WHERE c.task_id = tasks.id AND c.user_id = tasks.user_id);
+"""
+
+TASK_ORDER_KEY = "(isStarred = 0, dueAt IS NULL, COALESCE(dueAt, ''), id)"
+TASK_ORDER_BY = "isStarred = 0, dueAt IS NULL, COALESCE(dueAt, ''), id"
+
+SUBTASK_COUNTER_COLUMNS = ('subtask_count', 'subtasks_done', 'descendant_count', 'descendants_done')
+
+# Subtask counters: a task counts in its parent's subtask_count/subtasks_done and,
+# with its whole subtree, in descendant_count/descendants_done of every ancestor,
+# as long as the parent chain stays with the task's owner. Each write walks up
+# the parent chain once; UNION stops at a parent cycle.
+ROLLUP_SQL = """
+    UPDATE tasks SET subtask_count = subtask_count {sign} 1,
+        subtasks_done = subtasks_done {sign} ({row}.status = 'done')
+    WHERE id = {row}.parent_id AND user_id = {row}.user_id;
+    UPDATE tasks SET descendant_count = descendant_count {sign} (1 + {descendant_count}),
+        descendants_done = descendants_done {sign} (({row}.status = 'done') + {descendants_done})
+    WHERE id IN (
+        WITH RECURSIVE ancestors(id) AS (
+            SELECT id FROM tasks WHERE id = {row}.parent_id AND user_id = {row}.user_id
+            UNION
+            SELECT parent.id FROM ancestors
+            JOIN tasks child ON child.id = ancestors.id
+            JOIN tasks parent ON parent.id = child.parent_id
+            WHERE parent.user_id = {row}.user_id
+        )
+        SELECT id FROM ancestors
+    );"""
+
+
+def _rollup_sql(row: str, sign: str, counters: Optional[Dict[str, str]] = None) -> str:
+    counters = counters or {column: f"{row}.{column}" for column in ('descendant_count', 'descendants_done')}
+    return ROLLUP_SQL.format(row=row, sign=sign, **counters)
+
+
+# A task moved to another user stops counting its old owner's subtasks: recount from its direct subtasks
+RECOUNT_SUBTASKS_SQL = """
+    UPDATE tasks SET
+        subtask_count = (SELECT COUNT(*) FROM tasks c
+            WHERE c.parent_id = CAST(NEW.id AS TEXT) AND c.user_id = NEW.user_id AND c.id <> NEW.id),
+        subtasks_done = (SELECT COUNT(*) FROM tasks c
+            WHERE c.parent_id = CAST(NEW.id AS TEXT) AND c.user_id = NEW.user_id AND c.id <> NEW.id AND c.status = 'done'),
+        descendant_count = (SELECT COALESCE(SUM(1 + c.descendant_count), 0) FROM tasks c
+            WHERE c.parent_id = CAST(NEW.id AS TEXT) AND c.user_id = NEW.user_id AND c.id <> NEW.id),
+        descendants_done = (SELECT COALESCE(SUM((c.status = 'done') + c.descendants_done), 0) FROM tasks c
+            WHERE c.parent_id = CAST(NEW.id AS TEXT) AND c.user_id = NEW.user_id AND c.id <> NEW.id)
+    WHERE id = NEW.id AND OLD.user_id IS NOT NEW.user_id;"""
+
+ROLLUP_TRIGGERS = {
+    'tasks_rollup_insert': (
+        "CREATE TRIGGER tasks_rollup_insert AFTER INSERT ON tasks WHEN NEW.parent_id IS NOT NULL BEGIN"
+        + _rollup_sql('NEW', '+') + "\nEND"
+    ),
+    'tasks_rollup_update': (
+        "CREATE TRIGGER tasks_rollup_update AFTER UPDATE OF parent_id, status, user_id ON tasks\n"
+        "WHEN OLD.parent_id IS NOT NEW.parent_id OR OLD.status IS NOT NEW.status OR OLD.user_id IS NOT NEW.user_id BEGIN"
+        + _rollup_sql('OLD', '-') + RECOUNT_SUBTASKS_SQL
+        + _rollup_sql('NEW', '+', {
+            column: f"(CASE WHEN OLD.user_id IS NOT NEW.user_id THEN (SELECT {column} FROM tasks WHERE id = NEW.id) "
+                    f"ELSE NEW.{column} END)"
+            for column in ('descendant_count', 'descendants_done')
+        }) + "\nEND"
+    ),
+    'tasks_rollup_delete': (
+        "CREATE TRIGGER tasks_rollup_delete AFTER DELETE ON tasks WHEN OLD.parent_id IS NOT NULL BEGIN"
+        + _rollup_sql('OLD', '-') + "\nEND"
+    ),
+}
+# PRAGMA user_version once the counter columns and the triggers above are in place
+SUBTASK_COUNTERS_VERSION = 1
+
+TASK_UPDATABLE_COLUMNS = {'title', 'status', 'dueAt', 'isStarred', 'category', 'parent_id', 'user_id'}
+CATEGORY_UPDATABLE_COLUMNS = {'name', 'color', 'user_id'}
+
+# How often deletes also drop expired tombstones
+TOMBSTONE_PRUNE_INTERVAL_SECONDS = 60
+
+TASK_INSERT_SQL = (
+    "INSERT INTO tasks (user_id, title, status, dueAt, isStarred, category, parent_id, inserted_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _row_id(value: str) -> Optional[int]:
+    """Convert an API id to the integer primary key, None if it cannot exist"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _user_row(row: sqlite3.Row) -> Dict[str, Any]:
+    user = dict(row)
+    user['id'] = str(user['id'])
+    return user
+
+
+def _task_row(row: sqlite3.Row) -> Dict[str, Any]:
+    task = dict(row)
+    task['id'] = str(task['id'])
+    task['isStarred'] = bool(task['isStarred'])
+    return task
+
+
+def _task_params(task_data: Dict[str, Any], now: str) -> tuple:
+    return (
+        task_data['user_id'],
+        task_data['title'],
+        task_data.get('status', 'pending'),
+        task_data.get('dueAt'),
+        bool(task_data.get('isStarred', False)),
+        task_data.get('category'),
+        task_data.get('parent_id'),
+        now,
+        now
+    )
+
+
+def _category_row(row: sqlite3.Row) -> Dict[str, Any]:
+    category = dict(row)
+    category['id'] = str(category['id'])
+    return category
+
+
+class SQLiteDatabase(StorageBackend):
+    blocking = True
+    
+    def __init__(self, path: str):
+        self.path = path
+        # One connection per process; calls are serialised by the lock and
+        # SQLite's WAL locking coordinates between worker processes
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._tombstones_pruned_at = 0.0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+            self._migrate_subtask_counters()
+
+    def _migrate_subtask_counters(self):
+        """Install the subtask counter columns and triggers in a file that predates them, and recount"""
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= SUBTASK_COUNTERS_VERSION:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have migrated while this one waited for the lock
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] >= SUBTASK_COUNTERS_VERSION:
+                self._conn.execute("COMMIT")
+                return
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+            for column in SUBTASK_COUNTER_COLUMNS:
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+            for name, sql in ROLLUP_TRIGGERS.items():
+                self._conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+                self._conn.execute(sql)
+            self._recount_subtasks()
+            self._conn.execute(f"PRAGMA user_version = {SUBTASK_COUNTERS_VERSION}")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _recount_subtasks(self):
+        """Recompute every task's subtask counters, writing only the rows that differ"""
+        tasks = {row['id']: row for row in self._conn.execute(
+            f"SELECT id, user_id, status, parent_id, {', '.join(SUBTASK_COUNTER_COLUMNS)} FROM tasks"
+        )}
+
+        def parent_of(task):
+            parent = tasks.get(_row_id(task['parent_id']))
+            return parent if parent is not None and parent['user_id'] == task['user_id'] else None
+
+        counters = {task_id: [0, 0, 0, 0] for task_id in tasks}
+        for task in tasks.values():
+            done = int(task['status'] == 'done')
+            parent, seen = parent_of(task), {task['id']}
+            if parent is not None:
+                counters[parent['id']][0] += 1
+                counters[parent['id']][1] += done
+            while parent is not None and parent['id'] not in seen:
+                seen.add(parent['id'])
+                counters[parent['id']][2] += 1
+                counters[parent['id']][3] += done
+                parent = parent_of(parent)
+        self._conn.executemany(
+            "UPDATE tasks SET subtask_count = ?, subtasks_done = ?, descendant_count = ?, descendants_done = ? "
+            "WHERE id = ?",
+            [(*values, task_id) for task_id, values in counters.items()
+             if values != [tasks[task_id][column] for column in SUBTASK_COUNTER_COLUMNS]]
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _fetch_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetch_all(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _insert(self, sql: str, params: tuple, table: str) -> sqlite3.Row:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            return self._conn.execute(f"SELECT * FROM {table} WHERE id = ?", (cursor.lastrowid,)).fetchone()
+
+    def _update(self, table: str, row_id: int, user_id: str, columns: Dict[str, Any]) -> Optional[sqlite3.Row]:
+        assignments = ", ".join([f"{column} = ?" for column in columns] + ["updated_at = ?"])
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE id = ? AND user_id = ?",
+                (*columns.values(), datetime.now().isoformat(), row_id, user_id)
+            )
+            if cursor.rowcount == 0:
+                return None
+            return self._conn.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone()
+
+    def _delete(self, table: str, row_id: Optional[int], user_id: str) -> bool:
+        if row_id is None:
+            return False
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM {table} WHERE id = ? AND user_id = ?", (row_id, user_id))
+            return cursor.rowcount > 0
+
+    # Users
+
+    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new user"""
+        now = datetime.now().isoformat()
+        row = self._insert(
+            "INSERT INTO users (email, name, password_hash, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (user_data['email'], user_data.get('name', ''), user_data.get('password_hash', ''), now, now),
+            'users'
+        )
+        return _user_row(row)
+
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+        row = self._fetch_one("SELECT * FROM users WHERE email = ?", (email,))
+        return _user_row(row) if row else None
+
+    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        row = self._fetch_one("SELECT * FROM users WHERE id = ?", (_row_id(user_id),))
+        return _user_row(row) if row else None
+
+    def list_users(self) -> List[Dict[str, Any]]:
+        """Get all users"""
+        return [_user_row(row) for row in self._fetch_all("SELECT * FROM users ORDER BY id")]
+
+    # Tasks
+
+    def create_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new task"""
+        now = datetime.now().isoformat()
+        row = self._insert(TASK_INSERT_SQL, _task_params(task_data, now), 'tasks')
+        return _task_row(row)
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task by ID, regardless of owner"""
+        row = self._fetch_one("SELECT * FROM tasks WHERE id = ?", (_row_id(task_id),))
+        return _task_row(row) if row else None
+
+    def count_tasks(self) -> int:
+        """Count all tasks"""
+        return self._fetch_one("SELECT COUNT(*) FROM tasks")[0]
+
+    def get_tasks_by_user(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get all tasks for a user, starred first, then by due date"""
+        return self.query_tasks(user_id)
+
+    def get_all_tasks(self) -> List[Dict[str, Any]]:
+        """Get every user's tasks, starred first, then by due date"""
+        return [_task_row(row) for row in self._fetch_all(f"SELECT * FROM tasks ORDER BY {TASK_ORDER_BY}")]
+
+    def query_tasks(self, user_id: str, after: Optional[tuple] = None, limit: Optional[int] = None,
+                    status: Optional[str] = None, category: Optional[str] = None,
+                    is_starred: Optional[bool] = None, parent_id: Optional[str] = None,
+                    due_from: Optional[str] = None, due_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get up to `limit` of a user's tasks in list order, starting after the `after` sort key"""
+        conditions, params = ["user_id = ?"], [user_id]
+        for column, value in (('status', status), ('category', category), ('parent_id', parent_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if is_starred is not None:
+            conditions.append("isStarred = ?")
+            params.append(bool(is_starred))
+        if due_from is not None:
+            conditions.append("dueAt >= ?")
+            params.append(due_from)
+        if due_to is not None:
+            conditions.append("dueAt <= ?")
+            params.append(due_to)
+        if after is not None:
+            after_id = _row_id(after[3])
+            if after_id is None:
+                return []
+            conditions.append(f"{TASK_ORDER_KEY} > (?, ?, ?, ?)")
+            params.extend([after[0], after[1], after[2], after_id])
+
+        sql = f"SELECT * FROM tasks WHERE {' AND '.join(conditions)} ORDER BY {TASK_ORDER_BY}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_task_row(row) for row in self._fetch_all(sql, tuple(params))]
+
+    def get_child_tasks(self, parent_id: str, user_id: str) -> List[Dict[str, Any]]:
+        """Get the direct subtasks of a task"""
+        rows = self._fetch_all("SELECT * FROM tasks WHERE parent_id = ? AND user_id = ?", (parent_id, user_id))
+        return [_task_row(row) for row in rows]
+
+    def get_task_subtree(self, task_id: str, user_id: str, max_depth: int, limit: int) -> List[Dict[str, Any]]:
+        """One recursive query over the parent_id index"""
+        rows = self._fetch_all(
+            "WITH RECURSIVE subtree(task_id, depth) AS ("
+            "SELECT id, 0 FROM tasks WHERE id = ? AND user_id = ? "
+            "UNION ALL "
+            "SELECT tasks.id, subtree.depth + 1 FROM subtree "
+            "JOIN tasks ON tasks.parent_id = CAST(subtree.task_id AS TEXT) "
+            "WHERE subtree.depth < ? AND tasks.user_id = ? "
+            "LIMIT ?) "
+            f"SELECT tasks.* FROM subtree JOIN tasks ON tasks.id = subtree.task_id ORDER BY subtree.depth, {TASK_ORDER_BY}",
+            (_row_id(task_id), user_id, max_depth, user_id, limit)
+        )
+        return [_task_row(row) for row in rows]
+
+    def query_due_tasks(self, due_from: str, due_to: str) -> List[Dict[str, Any]]:
+        """Get every user's tasks that are not done with due_from <= dueAt < due_to, by due date"""
+        rows = self._fetch_all(
+            "SELECT * FROM tasks WHERE dueAt >= ? AND dueAt < ? AND status != 'done' ORDER BY dueAt, id",
+            (due_from, due_to)
+        )
+        return [_task_row(row) for row in rows]
+
+    def update_task(self, task_id: str, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a task"""
+        row_id = _row_id(task_id)
+        if row_id is None:
+            return None
+        columns = {key: value for key, value in update_data.items() if key in TASK_UPDATABLE_COLUMNS}
+        row = self._update('tasks', row_id, user_id, columns)
+        return _task_row(row) if row else None
+
+    def delete_task(self, task_id: str, user_id: str) -> bool:
+        """Delete a task"""
+        deleted = self._delete('tasks', _row_id(task_id), user_id)
+        if deleted:
+            self._prune_tombstones()
+        return deleted
+
+    def _write_subtree(self, statement: str, params: tuple, task_id: str, user_id: str) -> List[str]:
+        """Run an UPDATE/DELETE over the task and its descendants (one statement); returns their ids"""
+        rows = self._fetch_all(
+            "WITH RECURSIVE subtree(task_id) AS ("
+            "SELECT id FROM tasks WHERE id = ? AND user_id = ? "
+            "UNION "
+            "SELECT tasks.id FROM subtree "
+            "JOIN tasks ON tasks.parent_id = CAST(subtree.task_id AS TEXT) "
+            "WHERE tasks.user_id = ?) "
+            f"{statement} WHERE id IN (SELECT task_id FROM subtree) RETURNING id",
+            (_row_id(task_id), user_id, user_id, *params)
+        )
+        return [str(row['id']) for row in rows]
+
+    def update_task_subtree(self, task_id: str, user_id: str, update_data: Dict[str, Any]) -> List[str]:
+        """One recursive UPDATE over the parent_id index"""
+        columns = {key: value for key, value in update_data.items() if key in TASK_UPDATABLE_COLUMNS}
+        assignments = ", ".join([f"{column} = ?" for column in columns] + ["updated_at = ?"])
+        return self._write_subtree(
+            f"UPDATE tasks SET {assignments}", (*columns.values(), datetime.now().isoformat()), task_id, user_id
+        )
+
+    def delete_task_subtree(self, task_id: str, user_id: str) -> List[str]:
+        """One recursive DELETE over the parent_id index"""
+        deleted = self._write_subtree("DELETE FROM tasks", (), task_id, user_id)
+        if deleted:
+            self._prune_tombstones()
+        return deleted
+
+    def _prune_tombstones(self):
+        now = time.time()
+        if now - self._tombstones_pruned_at < TOMBSTONE_PRUNE_INTERVAL_SECONDS:
+            return
+        self._tombstones_pruned_at = now
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM task_changes WHERE deleted = 1 AND changed_at < ?",
+                (now - TASK_TOMBSTONE_RETENTION_SECONDS,)
+            )
+
+    def get_task_changes(self, user_id: str, since: Optional[int], limit: int) -> List[Tuple[int, str, Optional[Dict[str, Any]]]]:
+        """Read the trigger-maintained change log after seq `since`"""
+        sql = ("SELECT c.seq AS change_seq, c.task_id AS change_task_id, c.deleted AS change_deleted, t.* "
+               "FROM task_changes c LEFT JOIN tasks t ON t.id = c.task_id AND c.deleted = 0 "
+               "WHERE c.user_id = ? AND c.seq > ?")
+        if since is None:
+            sql += " AND c.deleted = 0"
+        rows = self._fetch_all(sql + " ORDER BY c.seq LIMIT ?", (user_id, since or 0, limit))
+        changes = []
+        for row in rows:
+            task = None
+            if not row['change_deleted']:
+                task = _task_row(row)
+                for key in ('change_seq', 'change_task_id', 'change_deleted'):
+                    del task[key]
+            changes.append((row['change_seq'], str(row['change_task_id']), task))
+        return changes
+
+    def task_changes_valid_from(self) -> float:
+        """The change log is persistent"""
+        return 0.0
+
+    def create_tasks(self, user_id: str, tasks_data: List[Dict[str, Any]]) -> List[str]:
+        """Create many tasks in one transaction"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [
+                    str(self._conn.execute(TASK_INSERT_SQL, _task_params({**task_data, 'user_id': user_id}, now)).lastrowid)
+                    for task_data in tasks_data
+                ]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def apply_task_batch(self, user_id: str, operations: List[Tuple[str, Optional[str], Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        """Apply create/update/delete operations in one transaction"""
+        now = datetime.now().isoformat()
+        results = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for op, task_id, data in operations:
+                    if op == 'create':
+                        cursor = self._conn.execute(TASK_INSERT_SQL, _task_params({**data, 'user_id': user_id}, now))
+                        row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (cursor.lastrowid,)).fetchone()
+                    else:
+                        row_id = _row_id(task_id)
+                        row = self._conn.execute(
+                            "SELECT * FROM tasks WHERE id = ? AND user_id = ?", (row_id, user_id)
+                        ).fetchone()
+                        if row is not None and op == 'update':
+                            columns = {key: value for key, value in data.items() if key in TASK_UPDATABLE_COLUMNS}
+                            assignments = ", ".join([f"{column} = ?" for column in columns] + ["updated_at = ?"])
+                            self._conn.execute(
+                                f"UPDATE tasks SET {assignments} WHERE id = ?", (*columns.values(), now, row_id)
+                            )
+                            row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (row_id,)).fetchone()
+                        elif row is not None:
+                            self._conn.execute("DELETE FROM tasks WHERE id = ?", (row_id,))
+                    results.append(_task_row(row) if row else None)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if any(op == 'delete' for op, _, _ in operations):
+            self._prune_tombstones()
+        return results
+
+    # Categories
+
+    def create_category(self, category_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new category"""
+        now = datetime.now().isoformat()
+        row = self._insert(
+            "INSERT INTO categories (user_id, name, color, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (category_data['user_id'], category_data['name'], category_data.get('color', '#3B82F6'), now, now),
+            'categories'
+        )
+        return _category_row(row)
+
+    def get_categories_by_user(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get all categories for a user"""
+        rows = self._fetch_all("SELECT * FROM categories WHERE user_id = ? ORDER BY name", (user_id,))
+        return [_category_row(row) for row in rows]
+
+    def get_category(self, category_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get one of the user's categories by ID"""
+        row = self._fetch_one("SELECT * FROM categories WHERE id = ? AND user_id = ?", (_row_id(category_id), user_id))
+        return _category_row(row) if row else None
+
+    def update_category(self, category_id: str, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a category and, on a rename, its tasks in the same transaction"""
+        row_id = _row_id(category_id)
+        if row_id is None:
+            return None
+        columns = {key: value for key, value in update_data.items() if key in CATEGORY_UPDATABLE_COLUMNS}
+        assignments = ", ".join([f"{column} = ?" for column in columns] + ["updated_at = ?"])
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM categories WHERE id = ? AND user_id = ?", (row_id, user_id)
+                ).fetchone()
+                if row is not None:
+                    old_name = row['name']
+                    self._conn.execute(
+                        f"UPDATE categories SET {assignments} WHERE id = ?", (*columns.values(), now, row_id)
+                    )
+                    row = self._conn.execute("SELECT * FROM categories WHERE id = ?", (row_id,)).fetchone()
+                    if row['name'] != old_name:
+                        self._refile_tasks(user_id, old_name, row['name'], now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return _category_row(row) if row else None
+
+    def delete_category(self, category_id: str, user_id: str, move_to: Optional[str] = None) -> bool:
+        """Delete a category and move its tasks in the same transaction"""
+        row_id = _row_id(category_id)
+        if row_id is None:
+            return False
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT name FROM categories WHERE id = ? AND user_id = ?", (row_id, user_id)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM categories WHERE id = ?", (row_id,))
+                    if move_to != row['name']:
+                        self._refile_tasks(user_id, row['name'], move_to, datetime.now().isoformat())
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row is not None
+
+    def _refile_tasks(self, user_id: str, category: str, new_category: Optional[str], now: str):
+        """One UPDATE over idx_tasks_user_category (caller holds the lock, in a transaction)"""
+        self._conn.execute(
+            "UPDATE tasks SET category = ?, updated_at = ? WHERE user_id = ? AND category = ?",
+            (new_category, now, user_id, category)
+        )
@@ -84,6 +84,8 @@ CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user_id);
 CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
 CREATE INDEX IF NOT EXISTS idx_categories_user_id ON categories(user_id);
 CREATE INDEX IF NOT EXISTS idx_tasks_due_at ON tasks("dueAt");
+CREATE INDEX IF NOT EXISTS idx_tasks_user_list_order ON tasks(user_id, "isStarred" DESC NULLS LAST, "dueAt" ASC NULLS LAST, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_user_category ON tasks(user_id, category);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 
 -- Create function to update updated_at timestamp
@@ -0,0 +1,188 @@
+"""
+Task import parsing
+===================
+
+POST /api/tasks/import reads the upload as it arrives: the body is decoded
+incrementally and split into records (NDJSON lines, or CSV records that may
+span lines inside quotes), so only the current chunk of tasks is held in
+memory. Columns and keys are the ones GET /api/tasks/export writes.
+
+`id` and `parentId` in the file only link tasks to each other; every task gets
+a new id. ParentLinks maps file ids to the new ids. A parent that has not been
+created yet (it comes later in the file) is linked once the whole file is in,
+after checking that the link would not form a cycle. A parentId that is not
+in the file may name one of the user's existing tasks.
+"""
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+MAX_IMPORT_LINE_CHARS = 64 * 1024
+MAX_IMPORT_ERRORS = 100
+
+# (line number, raw task fields), or an error message instead of the fields
+ImportRecord = Tuple[int, Union[Dict[str, Any], str]]
+
+
+class ImportFormatError(ValueError):
+    """The upload cannot be read any further (encoding, oversized line, CSV header)"""
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Decoded lines of the upload as they arrive, numbered from 1"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer, number = "", 0
+    async for chunk in chunks:
+        try:
+            buffer += decoder.decode(chunk)
+            invalid = False
+        except UnicodeDecodeError as e:
+            # The lines before the bad byte still count, so the error names its line
+            buffer += e.object[:e.start].decode('utf-8')
+            invalid = True
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            number += 1
+            yield number, line.rstrip("\r")
+        if invalid:
+            raise ImportFormatError(f"The upload is not valid UTF-8 after line {number}")
+        if len(buffer) > MAX_IMPORT_LINE_CHARS:
+            raise ImportFormatError(f"Line {number + 1} is longer than {MAX_IMPORT_LINE_CHARS} characters")
+    try:
+        buffer += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ImportFormatError(f"The upload is not valid UTF-8 after line {number}")
+    if buffer.strip():
+        yield number + 1, buffer.rstrip("\r")
+
+
+async def _ndjson_records(lines: AsyncIterator[Tuple[int, str]]) -> AsyncIterator[ImportRecord]:
+    async for number, line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, f"Invalid JSON: {e}"
+            continue
+        yield number, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+async def _csv_records(lines: AsyncIterator[Tuple[int, str]]) -> AsyncIterator[ImportRecord]:
+    header: Optional[List[str]] = None
+    record, start = "", 0
+    async for number, line in lines:
+        if not record:
+            start = number
+        record = f"{record}\n{line}" if record else line
+        # An odd number of quotes so far: a quoted field continues on the next line
+        if record.count('"') % 2:
+            if len(record) > MAX_IMPORT_LINE_CHARS:
+                raise ImportFormatError(f"Record at line {start} is longer than {MAX_IMPORT_LINE_CHARS} characters")
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        fields = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in fields]
+            if 'title' not in header:
+                raise ImportFormatError("The CSV header has no title column")
+            continue
+        if len(fields) > len(header):
+            yield start, f"Expected {len(header)} columns, found {len(fields)}"
+            continue
+        # Empty cells fall back to the field defaults
+        yield start, {name: value for name, value in zip(header, fields) if value != ""}
+    if record:
+        yield start, "Unterminated quoted field"
+
+
+def read_records(chunks: AsyncIterator[bytes], import_format: str) -> AsyncIterator[ImportRecord]:
+    """Records of an NDJSON or CSV upload, read incrementally from the body chunks"""
+    lines = _lines(chunks)
+    return _csv_records(lines) if import_format == 'csv' else _ndjson_records(lines)
+
+
+def split_parent_runs(tasks: List[Tuple[int, Any]]) -> Iterator[List[Tuple[int, Any]]]:
+    """
+    Split (line, TaskImportRow) items into consecutive runs in which no task's
+    parent is in its own run, so each run can be created in one pass once the
+    previous runs have ids
+    """
+    run: List[Tuple[int, Any]] = []
+    run_ids: Set[str] = set()
+    for item in tasks:
+        task = item[1]
+        if task.parent_id is not None and task.parent_id in run_ids:
+            yield run
+            run, run_ids = [], set()
+        run.append(item)
+        if task.id is not None:
+            run_ids.add(task.id)
+    if run:
+        yield run
+
+
+class ParentLinks:
+    """Resolves the parentId references of an import file to the created task ids"""
+
+    def __init__(self):
+        # file id -> created id
+        self.ids: Dict[str, str] = {}
+        # created id -> created parent id, for tasks of this file (cycle checks)
+        self._parent_of: Dict[str, str] = {}
+        # (created child id, file parent id, line) waiting for the end of the file
+        self._deferred: List[Tuple[str, str, int]] = []
+
+    def created(self, file_id: Optional[str], task_id: str):
+        if file_id is not None:
+            self.ids[file_id] = task_id
+
+    def parent(self, file_parent_id: Optional[str]) -> Optional[str]:
+        """Created id of a parent already in the store, None if it has to wait"""
+        if file_parent_id is None:
+            return None
+        return self.ids.get(file_parent_id)
+
+    def linked(self, task_id: str, parent_id: Optional[str], file_parent_id: Optional[str], line: int):
+        """Record where a created task was attached, or defer it when its parent was not known"""
+        if parent_id is not None:
+            self._parent_of[task_id] = parent_id
+        elif file_parent_id is not None:
+            self._deferred.append((task_id, file_parent_id, line))
+
+    def unresolved(self) -> Set[str]:
+        """Deferred parent ids that are not in the file: candidates for existing tasks"""
+        return {parent for _, parent, _ in self._deferred if parent not in self.ids}
+
+    def _is_ancestor(self, task_id: str, of_id: str) -> bool:
+        node, seen = of_id, set()
+        while node is not None and node not in seen:
+            if node == task_id:
+                return True
+            seen.add(node)
+            node = self._parent_of.get(node)
+        return False
+
+    def resolve(self, existing: Iterable[str]) -> Tuple[List[Tuple[str, str]], List[Tuple[int, str]]]:
+        """
+        (child id, parent id) links to apply now that the whole file is in,
+        and (line, error) for references that cannot be linked
+        """
+        existing = set(existing)
+        links, errors = [], []
+        for task_id, file_parent_id, line in self._deferred:
+            parent_id = self.ids.get(file_parent_id)
+            if parent_id is None and file_parent_id in existing:
+                parent_id = file_parent_id
+            if parent_id is None:
+                errors.append((line, f"parentId '{file_parent_id}' not found, imported without parent"))
+            elif self._is_ancestor(task_id, parent_id):
+                errors.append((line, f"parentId '{file_parent_id}' would make a cycle, imported without parent"))
+            else:
+                self._parent_of[task_id] = parent_id
+                links.append((task_id, parent_id))
+        self._deferred = []
+        return links, errors
@@ -0,0 +1,45 @@
+"""
+Subtask trees
+=============
+
+GET /api/tasks/{id}/tree and GET /api/tasks/?tree=true return tasks nested
+under their parents (`children`). The rows come from one query (a recursive
+walk of the parent index for a subtree, the normal list query for the list)
+and are nested here in a single pass, keeping the order they came in.
+
+Nesting is capped at a depth (MAX_TREE_DEPTH) and a subtree at a number of
+tasks (MAX_TREE_NODES); whatever is cut off is reported as `truncated`.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_TREE_DEPTH = 32
+MAX_TREE_NODES = 5000
+
+
+def assemble_forest(rows: List[Dict[str, Any]], max_depth: int,
+                    root_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Nest task rows under their parents. Rows whose parent is not among them
+    (and the `root_id` row) are roots. Returns the roots and whether any row
+    was left out: deeper than `max_depth` below its root, or in a parent cycle.
+    """
+    nodes = {row['id']: {**row, 'children': []} for row in rows}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node.get('parent_id'))
+        if parent is not None and parent is not node and node['id'] != root_id:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+
+    placed, level = 0, roots
+    for depth in range(max_depth + 1):
+        if not level:
+            break
+        placed += len(level)
+        if depth == max_depth:
+            for node in level:
+                node['children'] = []
+            break
+        level = [child for node in level for child in node['children']]
+    return roots, placed < len(nodes)
@@ -0,0 +1,55 @@
+"""
+Shared fixtures. The tests run against the fallback storage backends (no
+Supabase): the environment is cleared before the backend modules are imported.
+"""
+import os
+import sys
+import uuid
+
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_ANON_KEY"] = ""
+os.environ["SUPABASE_SERVICE_ROLE_KEY"] = ""
+os.environ["FALLBACK_DB_BACKEND"] = "memory"
+os.environ.pop("FALLBACK_DB_JOURNAL_DIR", None)
+os.environ.pop("METRICS_TOKEN", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from database import FallbackDatabase
+from sqlite_database import SQLiteDatabase
+from journal import JournaledDatabase
+
+
+@pytest.fixture(params=["memory", "sqlite", "journal"])
+def store(request, tmp_path):
+    """Each fallback storage backend, empty"""
+    if request.param == "memory":
+        db = FallbackDatabase()
+    elif request.param == "sqlite":
+        db = SQLiteDatabase(str(tmp_path / "fallback.db"))
+    else:
+        db = JournaledDatabase(str(tmp_path / "journal"), fsync_interval=60)
+    yield db
+    if request.param == "journal":
+        db.close(compact=False)
+    elif request.param == "sqlite":
+        db.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Sign up a new user; returns a function giving each call its own user's headers"""
+    def sign_up():
+        response = client.post("/api/auth/signup", json={"email": f"{uuid.uuid4().hex}@example.com", "password": "pw"})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return sign_up
@@ -0,0 +1,64 @@
+"""Local verification and caching of Supabase access tokens"""
+import asyncio
+import time
+
+import jwt
+import pytest
+
+import auth_utils
+import routers.auth
+from auth_utils import TokenCache, token_cache, verify_supabase_token
+
+SECRET = 'test-jwt-secret'
+
+
+def access_token(user_id='u1', expires_in=3600):
+    return jwt.encode({'sub': user_id, 'email': f'{user_id}@example.com', 'aud': 'authenticated',
+                       'exp': int(time.time()) + expires_in}, SECRET, algorithm='HS256')
+
+
+@pytest.fixture
+def supabase_tokens(monkeypatch):
+    monkeypatch.setattr(auth_utils, 'SUPABASE_JWT_SECRET', SECRET)
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+
+def test_verified_tokens_are_cached(supabase_tokens):
+    token = access_token()
+    user = asyncio.run(verify_supabase_token(token))
+    assert user.id == 'u1' and token_cache.get(token) == user
+    with pytest.raises(jwt.InvalidSignatureError):
+        asyncio.run(verify_supabase_token(token[:-2] + 'xx'))
+    assert len(token_cache) == 1
+
+
+def test_cache_entries_expire_and_are_bounded():
+    cache = TokenCache(max_size=2)
+    user = auth_utils.User(id='u1', email='u1@example.com')
+    cache.put('expired', user, time.time() - 1)
+    assert cache.get('expired') is None and len(cache) == 0
+    for token in ('a', 'b', 'c'):
+        cache.put(token, user, time.time() + 60)
+    assert cache.get('a') is None and cache.get('c') == user
+
+
+def test_sign_out_drops_the_cached_token(client, supabase_tokens, monkeypatch):
+    signed_out = []
+
+    class FakeAuth:
+        async def sign_out(self, token):
+            signed_out.append(token)
+    monkeypatch.setattr(routers.auth, 'is_using_fallback', lambda: False)
+    monkeypatch.setattr(routers.auth, 'supabase_auth', FakeAuth())
+
+    token, other = access_token('u1'), access_token('u2')
+    asyncio.run(verify_supabase_token(token))
+    asyncio.run(verify_supabase_token(other))
+
+    response = client.post("/api/auth/signout", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert signed_out == [token]
+    assert token_cache.get(token) is None
+    assert token_cache.get(other) is not None
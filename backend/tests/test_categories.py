@@ -0,0 +1,85 @@
+"""Category renames and deletes carried over to tasks"""
+import pytest
+
+import main
+import routers.categories as categories_router
+from auth_utils import get_current_user_flexible
+from models import User
+
+
+def test_get_category_is_scoped_to_the_user(store):
+    category = store.create_category({'user_id': 'u1', 'name': 'Work', 'color': '#000000'})
+    assert store.get_category(category['id'], 'u1')['name'] == 'Work'
+    assert store.get_category(category['id'], 'u2') is None
+    assert store.get_category('999', 'u1') is None
+
+
+def test_rename_color_and_delete(client, auth_headers):
+    headers = auth_headers()
+    work = client.post("/api/categories/", json={"name": "Work", "color": "#000000"}, headers=headers).json()["data"]
+    home = client.post("/api/categories/", json={"name": "Home", "color": "#ffffff"}, headers=headers).json()["data"]
+    client.post("/api/tasks/", json={"title": "a", "category": "Work"}, headers=headers).json()["data"]
+    etag = client.get("/api/tasks/", headers=headers).headers["etag"]
+
+    # A color change leaves the task list (and its ETag) alone
+    client.put(f"/api/categories/{work['id']}", json={"color": "#ff0000"}, headers=headers)
+    assert client.get("/api/tasks/", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    client.put(f"/api/categories/{work['id']}", json={"name": "Job"}, headers=headers)
+    tasks = client.get("/api/tasks/", headers={**headers, "If-None-Match": etag})
+    assert tasks.status_code == 200
+    assert tasks.json()["data"][0]["category"] == "Job"
+
+    other_headers = auth_headers()
+    foreign = client.post("/api/categories/", json={"name": "X", "color": "#000000"}, headers=other_headers).json()["data"]
+    response = client.delete(f"/api/categories/{work['id']}", params={"move_to": foreign["id"]}, headers=headers)
+    assert (response.status_code, response.json()["detail"]) == (404, "Target category not found")
+
+    assert client.delete(f"/api/categories/{work['id']}", params={"move_to": home["id"]}, headers=headers).status_code == 200
+    assert client.get("/api/tasks/", headers=headers).json()["data"][0]["category"] == "Home"
+    assert [category["name"] for category in client.get("/api/categories/", headers=headers).json()["data"]] == ["Home"]
+
+
+class FakeCategoryRpc:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def rpc(self, function, params):
+        self.calls.append((function, params))
+        return self
+
+    async def execute(self):
+        return type("Response", (), {"data": self.result})
+
+
+@pytest.fixture
+def supabase_categories(client, monkeypatch):
+    def install(result):
+        fake = FakeCategoryRpc(result)
+        monkeypatch.setattr(categories_router, 'is_using_fallback', lambda: False)
+        monkeypatch.setattr(categories_router, 'get_user_supabase', lambda request: fake)
+        return fake
+    main.app.dependency_overrides[get_current_user_flexible] = lambda: User(id='u1', email='u1@example.com')
+    yield install
+    main.app.dependency_overrides.pop(get_current_user_flexible)
+
+
+def test_supabase_rename_and_delete_are_one_call_each(client, supabase_categories):
+    category_id, target_id = "7f1c2a52-3d7e-4a8e-9b1e-0c6f1d2a9b10", "2b8d5e61-9c4f-4f0a-8e7d-6a1b3c5d7e90"
+    row = {"id": category_id, "user_id": "u1", "name": "Job", "color": "#000000",
+           "created_at": "2024-01-01T09:00:00", "updated_at": "2024-01-01T09:00:00"}
+    fake = supabase_categories([row])
+    response = client.put(f"/api/categories/{category_id}", json={"name": "Job"})
+    assert response.status_code == 200 and response.json()["data"]["name"] == "Job"
+    assert fake.calls == [("update_category", {"p_category_id": category_id, "p_name": "Job", "p_color": None})]
+
+    fake = supabase_categories("target_not_found")
+    response = client.delete(f"/api/categories/{category_id}", params={"move_to": target_id})
+    assert (response.status_code, response.json()["detail"]) == (404, "Target category not found")
+    assert fake.calls == [("delete_category", {"p_category_id": category_id, "p_move_to": target_id})]
+
+    fake = supabase_categories("deleted")
+    assert client.delete(f"/api/categories/{category_id}").status_code == 200
+    assert client.delete("/api/categories/not-a-uuid").status_code == 404
+    assert len(fake.calls) == 1
@@ -0,0 +1,65 @@
+"""Secondary indexes and per-user task order of the fallback stores, kept in step with writes"""
+import random
+
+from database import task_sort_key
+
+DATES = [None, '2024-01-01T09:00:00', '2024-01-02T09:00:00', '2024-01-03T09:00:00']
+
+
+def brute_force(db, user_id):
+    tasks = [task for task in db.get_all_tasks() if task['user_id'] == user_id]
+    return sorted(tasks, key=lambda task: task_sort_key(task)[:3])
+
+
+def test_indexes_follow_updates_and_deletes(store):
+    rnd = random.Random(5)
+    ids = [store.create_task({'user_id': 'u1', 'title': f't{i}', 'dueAt': rnd.choice(DATES),
+                              'category': rnd.choice([None, 'work', 'home'])})['id'] for i in range(40)]
+    for task_id in rnd.sample(ids, 25):
+        store.update_task(task_id, 'u1', {'isStarred': rnd.random() < 0.5, 'dueAt': rnd.choice(DATES),
+                                          'category': rnd.choice([None, 'work', 'home']),
+                                          'parent_id': rnd.choice([None, ids[0]])})
+    moved = ids[1:4]
+    for task_id in moved:
+        store.update_task(task_id, 'u1', {'user_id': 'u2'})
+    for task_id in ids[4:8]:
+        assert store.delete_task(task_id, 'u1')
+
+    tasks = store.get_tasks_by_user('u1')
+    assert [task_sort_key(task)[:3] for task in tasks] == [task_sort_key(task)[:3] for task in brute_force(store, 'u1')]
+    assert len(tasks) == 40 - len(moved) - 4
+    assert sorted(task['id'] for task in store.get_tasks_by_user('u2')) == sorted(moved)
+
+    children = {task['id'] for task in tasks if task['parent_id'] == ids[0]}
+    assert {task['id'] for task in store.get_child_tasks(ids[0], 'u1')} == children
+    for category in ('work', 'home'):
+        assert ({task['id'] for task in store.query_tasks('u1', category=category)}
+                == {task['id'] for task in tasks if task['category'] == category})
+
+    due = store.query_due_tasks('2024-01-02T00:00:00', '2024-01-03T00:00:00')
+    assert {task['id'] for task in due} == {
+        task['id'] for task in store.get_all_tasks() if task['dueAt'] == '2024-01-02T09:00:00'
+    }
+
+
+def test_user_lookup_by_email(store):
+    user = store.create_user({'email': 'a@example.com', 'password_hash': 'x'})
+    assert store.get_user_by_email('a@example.com')['id'] == user['id']
+    assert store.get_user_by_id(user['id'])['email'] == 'a@example.com'
+    assert store.get_user_by_email('b@example.com') is None
+
+
+def test_task_rows_keep_the_api_shape(store):
+    task = store.create_task({'user_id': 'u1', 'title': 'a', 'isStarred': 1, 'dueAt': DATES[1]})
+    stored = store.get_task(task['id'])
+    assert stored['isStarred'] is True and stored['status'] == 'pending'
+    assert stored['dueAt'] == DATES[1] and stored['category'] is None
+    assert isinstance(stored['inserted_at'], str) and isinstance(stored['updated_at'], str)
+
+
+def test_due_tasks_leave_out_done_tasks(store):
+    for title, status in (('open', 'pending'), ('finished', 'done'), ('reopened', 'done')):
+        task = store.create_task({'user_id': 'u1', 'title': title, 'dueAt': DATES[1], 'status': status})
+    store.update_task(task['id'], 'u1', {'status': 'pending'})
+    due = store.query_due_tasks('2024-01-01T00:00:00', '2024-01-02T00:00:00')
+    assert sorted(task['title'] for task in due) == ['open', 'reopened']
@@ -0,0 +1,151 @@
+"""Crash recovery of the journaled fallback database (journal.py)"""
+import os
+import pickle
+
+import pytest
+
+from database import task_sort_key
+from journal import JournaledDatabase, SNAPSHOT_FILE
+
+
+def open_db(directory):
+    return JournaledDatabase(str(directory), fsync_interval=60)
+
+
+def crash(db):
+    """Stop like a killed process: no compaction, no final flush, the lock goes with the process"""
+    db._journal._stopped.set()
+    os.close(db._lock_fd)
+    db._lock_fd = None
+
+
+def journal_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("journal."))
+
+
+def titles(db):
+    return sorted(task['title'] for task in db.get_all_tasks())
+
+
+def test_appends_survive_a_process_crash(tmp_path):
+    db = open_db(tmp_path)
+    user = db.create_user({'email': 'a@example.com', 'password_hash': 'x'})
+    task = db.create_task({'user_id': user['id'], 'title': 'first'})
+    db.update_task(task['id'], user['id'], {'status': 'done'})
+    db.create_task({'user_id': user['id'], 'title': 'second'})
+    crash(db)
+
+    recovered = open_db(tmp_path)
+    assert titles(recovered) == ['first', 'second']
+    assert recovered.get_task(task['id'])['status'] == 'done'
+    assert recovered.get_user_by_email('a@example.com')['id'] == user['id']
+    recovered.close(compact=False)
+
+
+def test_torn_tail_is_dropped_and_never_appended_to(tmp_path):
+    db = open_db(tmp_path)
+    for title in ('a', 'b', 'c'):
+        db.create_task({'user_id': 'u1', 'title': title})
+    db.close(compact=False)
+    [journal] = journal_files(tmp_path)
+    path = tmp_path / journal
+    # Crash in the middle of writing the last record
+    os.truncate(path, os.path.getsize(path) - 5)
+
+    recovered = open_db(tmp_path)
+    assert titles(recovered) == ['a', 'b']
+    # Appends go to a new generation, after the torn file
+    assert journal_files(tmp_path) == [journal, f"journal.{recovered._generation:08d}.bin"]
+    recovered.create_task({'user_id': 'u1', 'title': 'd'})
+    recovered.close(compact=False)
+
+    reopened = open_db(tmp_path)
+    assert titles(reopened) == ['a', 'b', 'd']
+    reopened.close()
+    assert journal_files(tmp_path) == [f"journal.{reopened._generation:08d}.bin"]
+
+
+def test_corrupt_record_stops_the_replay_of_its_file(tmp_path):
+    db = open_db(tmp_path)
+    for title in ('a', 'b', 'c'):
+        db.create_task({'user_id': 'u1', 'title': title})
+    db.close(compact=False)
+    path = tmp_path / journal_files(tmp_path)[0]
+    data = bytearray(path.read_bytes())
+    data[-3] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    recovered = open_db(tmp_path)
+    assert titles(recovered) == ['a', 'b']
+    recovered.close(compact=False)
+
+
+def test_snapshot_plus_newer_journal(tmp_path):
+    db = open_db(tmp_path)
+    keep = db.create_task({'user_id': 'u1', 'title': 'keep'})
+    gone = db.create_task({'user_id': 'u1', 'title': 'gone'})
+    db.create_category({'user_id': 'u1', 'name': 'Work', 'color': '#000000'})
+    db.snapshot()
+    db.update_task(keep['id'], 'u1', {'title': 'kept', 'category': 'Work'})
+    db.delete_task(gone['id'], 'u1')
+    # Crash while writing the next snapshot: the temporary file is ignored
+    (tmp_path / (SNAPSHOT_FILE + ".tmp")).write_bytes(b"partial")
+    crash(db)
+
+    recovered = open_db(tmp_path)
+    assert titles(recovered) == ['kept']
+    assert [task['id'] for task in recovered.query_tasks('u1', category='Work')] == [keep['id']]
+    assert [category['name'] for category in recovered.get_categories_by_user('u1')] == ['Work']
+    # The deleted task's id is not handed out again
+    assert recovered.create_task({'user_id': 'u1', 'title': 'new'})['id'] not in (keep['id'], gone['id'])
+    recovered.close(compact=False)
+
+
+def test_reads_format_2_snapshots(tmp_path):
+    db = open_db(tmp_path)
+    parent = db.create_task({'user_id': 'u1', 'title': 'parent'})
+    db.create_task({'user_id': 'u1', 'title': 'child', 'parent_id': parent['id'], 'status': 'done'})
+    state = db._capture()
+    db.close(compact=False)
+    columns = state.pop('task_columns')
+    state.update(format=2, tasks=list(zip(*columns)))
+    with open(tmp_path / SNAPSHOT_FILE, 'wb') as f:
+        pickle.dump(state, f)
+
+    recovered = open_db(tmp_path)
+    assert titles(recovered) == ['child', 'parent']
+    assert recovered.get_task(parent['id'])['subtasks_done'] == 1
+    recovered.close(compact=False)
+
+
+def test_directory_is_locked_while_open(tmp_path):
+    db = open_db(tmp_path)
+    with pytest.raises(RuntimeError, match="in use by another process"):
+        open_db(tmp_path)
+    db.close(compact=False)
+    open_db(tmp_path).close(compact=False)
+
+
+def test_list_order_is_kept_through_changes_after_a_reload(tmp_path):
+    db = open_db(tmp_path)
+    tasks = [db.create_task({'user_id': f"u{i % 3}", 'title': f"t{i}", 'isStarred': i % 4 == 0,
+                             'dueAt': f"2030-01-{i % 9 + 1:02d}T09:00:00" if i % 2 else None})
+             for i in range(30)]
+    db.snapshot()
+    db.close(compact=False)
+
+    recovered = open_db(tmp_path)
+    # The per-user order is sorted lazily after the load; change it before and after first use
+    recovered.update_task(tasks[0]['id'], 'u0', {'isStarred': False, 'dueAt': '2029-12-31T09:00:00'})
+    recovered.delete_task(tasks[1]['id'], 'u1')
+    recovered.query_tasks('u2')
+    recovered.update_task(tasks[2]['id'], 'u2', {'user_id': 'u0'})
+    recovered.create_task({'user_id': 'u1', 'title': 'new', 'isStarred': True})
+    for user_id in ('u0', 'u1', 'u2'):
+        expected = sorted((task for task in recovered.get_all_tasks() if task['user_id'] == user_id),
+                          key=lambda task: task_sort_key(task)[:3])
+        assert [task_sort_key(task)[:3] for task in recovered.query_tasks(user_id)] == \
+            [task_sort_key(task)[:3] for task in expected]
+        assert len(recovered.query_tasks(user_id)) == len(expected)
+    assert len(recovered.get_all_tasks()) == 30
+    recovered.close(compact=False)
@@ -0,0 +1,89 @@
+"""Cached list responses are invalidated by every write path"""
+import asyncio
+import json
+
+import pytest
+
+import list_cache as list_cache_module
+from list_cache import LRUListCache
+from list_versions import SQLiteVersionStore, TASKS
+
+
+def task_mutations(client, headers, task, category):
+    task_id, user_id = task["id"], task["user_id"]
+    return {
+        "create": lambda: client.post("/api/tasks/", json={"title": "new"}, headers=headers),
+        "update": lambda: client.put(f"/api/tasks/{task_id}", json={"title": "renamed"}, headers=headers),
+        "status": lambda: client.put(f"/api/tasks/{task_id}/status", json={"status": "done"}, headers=headers),
+        "star": lambda: client.put(f"/api/tasks/{task_id}/star", json={"isStarred": True}, headers=headers),
+        "delete": lambda: client.delete(f"/api/tasks/{task_id}", headers=headers),
+        "batch": lambda: client.post("/api/tasks/batch", json={"operations": [
+            {"op": "update", "id": task_id, "task": {"title": "batched"}}]}, headers=headers),
+        "import": lambda: client.post("/api/tasks/import", content=json.dumps({"title": "imported"}),
+                                      headers={**headers, "Content-Type": "application/x-ndjson"}),
+        "fallback update": lambda: client.put(f"/api/tasks/fallback/update/{task_id}", json={"title": "patched"}),
+        "fallback delete": lambda: client.delete(f"/api/tasks/fallback/delete/{task_id}"),
+        "test router": lambda: client.post("/api/test/create-task-no-auth", json={"user_id": user_id, "title": "t"}),
+        "category rename": lambda: client.put(f"/api/categories/{category['id']}", json={"name": "office"},
+                                              headers=headers),
+        "category delete": lambda: client.delete(f"/api/categories/{category['id']}", headers=headers),
+    }
+
+
+def category_mutations(client, headers, task, category):
+    return {
+        "create": lambda: client.post("/api/categories/", json={"name": "home", "color": "#000000"}, headers=headers),
+        "update": lambda: client.put(f"/api/categories/{category['id']}", json={"color": "#123456"}, headers=headers),
+        "delete": lambda: client.delete(f"/api/categories/{category['id']}", headers=headers),
+    }
+
+
+def setup_lists(client, auth_headers):
+    headers = auth_headers()
+    category = client.post("/api/categories/", json={"name": "work", "color": "#ffffff"}, headers=headers).json()["data"]
+    task = client.post("/api/tasks/", json={"title": "old", "category": "work"}, headers=headers).json()["data"]
+    return headers, task, category
+
+
+def read_cached(client, path, headers):
+    """The list body, read twice so the second read is served from the cache"""
+    cache = list_cache_module.list_cache
+    body = client.get(path, headers=headers).json()
+    hits = cache.hits
+    assert client.get(path, headers=headers).json() == body
+    assert cache.hits == hits + 1
+    return body
+
+
+@pytest.mark.parametrize("path, mutations, name", [
+    *(("/api/tasks/", task_mutations, name) for name in task_mutations(None, None, {"id": "", "user_id": ""}, {"id": ""})),
+    *(("/api/categories/", category_mutations, name) for name in category_mutations(None, None, None, {"id": ""})),
+])
+def test_mutation_invalidates_the_cached_list(client, auth_headers, path, mutations, name):
+    headers, task, category = setup_lists(client, auth_headers)
+    before = read_cached(client, path, headers)
+    response = mutations(client, headers, task, category)[name]()
+    assert response.status_code == 200, response.text
+    assert client.get(path, headers=headers).json() != before
+
+
+def test_writes_on_another_worker_make_entries_stale(monkeypatch, tmp_path):
+    """Two workers, each with its own cache, sharing one version store"""
+    versions = SQLiteVersionStore(str(tmp_path / "versions.db"))
+    monkeypatch.setattr(list_cache_module, 'list_versions', versions)
+    first, second = LRUListCache(), LRUListCache()
+
+    async def scenario():
+        version = await versions.get("u1", TASKS)
+        await second.set("u1", TASKS, "", version, b"old")
+        # The write goes through the first worker: it evicts its own entries and bumps the shared version
+        monkeypatch.setattr(list_cache_module, 'list_cache', first)
+        await list_cache_module.invalidate_lists("u1", TASKS)
+        return await second.get("u1", TASKS, "", await versions.get("u1", TASKS))
+    assert asyncio.run(scenario()) is None
+    versions.close()
+
+
+def test_no_cache_without_a_version_store(monkeypatch):
+    monkeypatch.setattr(list_cache_module, 'list_versions', None)
+    assert isinstance(list_cache_module.create_list_cache(), list_cache_module.NullListCache)
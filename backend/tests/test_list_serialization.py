@@ -0,0 +1,17 @@
+"""GET /api/tasks/ bodies from json_responses.render_json match the pydantic model path"""
+import importlib.util
+import os
+
+
+def load_benchmark(name):
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_render_json_body_matches_model_body(capsys):
+    # The benchmark asserts that both paths produce the same response
+    load_benchmark("bench_list_serialization").run(task_count=50, requests=1)
+    assert "cheaper with render_json" in capsys.readouterr().out
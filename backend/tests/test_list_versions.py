@@ -0,0 +1,116 @@
+"""Conditional GETs of task and category lists (ETag / If-None-Match -> 304)"""
+import asyncio
+
+import pytest
+
+import list_versions
+from list_versions import MemoryVersionStore, SQLiteVersionStore, SupabaseVersionStore, create_version_store
+
+
+def get_list(client, path, headers, etag=None):
+    return client.get(path, headers={**headers, **({"If-None-Match": etag} if etag else {})})
+
+
+def test_unchanged_lists_get_304(client, auth_headers):
+    headers = auth_headers()
+    for path in ("/api/tasks/", "/api/categories/"):
+        first = get_list(client, path, headers)
+        assert first.status_code == 200 and first.headers["ETag"]
+        again = get_list(client, path, headers, first.headers["ETag"])
+        assert again.status_code == 304 and again.content == b""
+        # Another query string is another variant with its own ETag
+        assert get_list(client, path + "?limit=5", headers, first.headers["ETag"]).status_code == 200
+
+
+def test_mutations_change_the_etag(client, auth_headers):
+    headers = auth_headers()
+    etag = get_list(client, "/api/tasks/", headers).headers["ETag"]
+    task = client.post("/api/tasks/", json={"title": "a"}, headers=headers).json()["data"]
+    response = get_list(client, "/api/tasks/", headers, etag)
+    assert response.status_code == 200 and [row["id"] for row in response.json()["data"]] == [task["id"]]
+
+    # Tasks created through the test router bump the version as well
+    etag = response.headers["ETag"]
+    client.post("/api/test/create-task-no-auth", json={"user_id": task["user_id"], "title": "b"})
+    response = get_list(client, "/api/tasks/", headers, etag)
+    assert response.status_code == 200 and len(response.json()["data"]) == 2
+
+    # A category rename moves tasks, so both lists change
+    category = client.post("/api/categories/", json={"name": "work", "color": "#ffffff"}, headers=headers).json()["data"]
+    etags = {path: get_list(client, path, headers).headers["ETag"] for path in ("/api/tasks/", "/api/categories/")}
+    client.put(f"/api/categories/{category['id']}", json={"name": "office"}, headers=headers)
+    for path, etag in etags.items():
+        assert get_list(client, path, headers, etag).status_code == 200
+
+
+def test_sqlite_versions_are_shared_by_workers(tmp_path):
+    async def scenario():
+        first, second = SQLiteVersionStore(str(tmp_path / "versions.db")), SQLiteVersionStore(str(tmp_path / "versions.db"))
+        version = await second.get("u1", "tasks")
+        assert await first.get("u1", "tasks") == version
+        await first.bump("u1", "tasks")
+        assert await second.get("u1", "tasks") > version
+        first.close()
+        second.close()
+    asyncio.run(scenario())
+
+
+class FakeVersionTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = {}
+
+    def from_(self, table):
+        assert table == 'list_versions'
+        self.filters = {}
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    async def execute(self):
+        version = self.rows.get((self.filters['user_id'], self.filters['kind']))
+        self.data = [] if version is None else [{'version': version}]
+        return self
+
+
+def test_supabase_versions_are_read_from_the_table():
+    table = FakeVersionTable({("u1", "tasks"): 42})
+    store = SupabaseVersionStore(table)
+
+    async def scenario():
+        await store.bump("u1", "tasks")
+        return await store.get("u1", "tasks"), await store.get("u1", "categories")
+    assert asyncio.run(scenario()) == (42, 0)
+
+
+@pytest.mark.parametrize("backend, fallback, data_backend, service, expected", [
+    ("auto", True, "memory", None, MemoryVersionStore),
+    ("auto", True, "sqlite", None, SQLiteVersionStore),
+    ("auto", False, "memory", object(), SupabaseVersionStore),
+    # Per-process versions are refused when the data is shared
+    ("memory", True, "sqlite", None, type(None)),
+    ("memory", False, "memory", object(), type(None)),
+    ("auto", False, "memory", None, type(None)),
+    ("none", True, "memory", None, type(None)),
+])
+def test_version_store_follows_the_data_store(monkeypatch, tmp_path, backend, fallback, data_backend, service, expected):
+    monkeypatch.setattr(list_versions, 'LIST_VERSION_BACKEND', backend)
+    monkeypatch.setattr(list_versions, 'LIST_VERSION_PATH', str(tmp_path / "versions.db"))
+    monkeypatch.setattr(list_versions, 'is_using_fallback', lambda: fallback)
+    monkeypatch.setattr(list_versions, 'FALLBACK_DB_BACKEND', data_backend)
+    monkeypatch.setattr(list_versions, 'service_postgrest', service)
+    store = create_version_store()
+    assert type(store) is expected
+    if isinstance(store, SQLiteVersionStore):
+        store.close()
+
+
+def test_lists_without_versions_have_no_etag(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(list_versions, 'list_versions', None)
+    response = get_list(client, "/api/tasks/", auth_headers(), '"tasks-1-00000000"')
+    assert response.status_code == 200 and "ETag" not in response.headers
@@ -0,0 +1,16 @@
+"""Access to GET /api/metrics/reminders"""
+import routers.metrics
+
+
+def test_metrics_need_a_configured_token(client, monkeypatch):
+    assert client.get("/api/metrics/reminders").status_code == 404
+
+    monkeypatch.setattr(routers.metrics, 'METRICS_TOKEN', 'secret')
+    assert client.get("/api/metrics/reminders").status_code == 401
+    assert client.get("/api/metrics/reminders", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/api/metrics/reminders", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "pending" in response.json()
+    response = client.get("/api/metrics/reminders", params={"format": "prometheus"},
+                          headers={"Authorization": "Bearer secret"})
+    assert "reminders_pending" in response.text
@@ -0,0 +1,63 @@
+"""In-app reminder notifications and email lookup at delivery"""
+import asyncio
+import time
+
+from reminder_delivery import DeliveryPipeline, Notifier, in_app_notifications
+from reminder_scheduler import Reminder
+
+
+class Recorder(Notifier):
+    name = "recorder"
+    requires_email = True
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, notification):
+        self.sent.append((notification.user_email, [reminder['title'] for reminder in notification.reminders]))
+
+
+def test_delivery_looks_up_emails_and_fills_the_in_app_list(client, auth_headers):
+    headers = auth_headers()
+    me = client.get("/api/auth/user", params={"token": headers["Authorization"].split()[1]}).json()
+    recorder = Recorder()
+    pipeline = DeliveryPipeline([recorder, in_app_notifications], workers=2)
+    fire_at = time.time()
+
+    async def deliver():
+        await pipeline.submit([Reminder(fire_at, "t1", me["id"], "first", None),
+                               Reminder(fire_at + 1, "t2", me["id"], "second", None),
+                               Reminder(fire_at, "t3", "nobody", "orphan", None)])
+        await pipeline.drain()
+        await pipeline.aclose()
+    asyncio.run(deliver())
+
+    # The unknown user has no email, so only the in-app notifier gets their reminder
+    assert recorder.sent == [(me["email"], ["first", "second"])]
+
+    body = client.get("/api/notifications/", headers=headers).json()
+    [notification] = body["data"]
+    assert [reminder["title"] for reminder in notification["reminders"]] == ["first", "second"]
+    assert notification["subject"] == "Reminder: 2 tasks are due in 5 minutes"
+    since = notification["created_at"]
+    assert client.get("/api/notifications/", params={"since": since}, headers=headers).json()["data"] == []
+    assert client.get("/api/notifications/", headers=auth_headers()).json()["data"] == []
+
+
+def test_supabase_email_lookup_uses_the_service_role(monkeypatch):
+    import reminder_delivery
+    calls = []
+
+    class ServiceClient:
+        def rpc(self, function, params):
+            calls.append((function, params))
+            return self
+
+        async def execute(self):
+            return type("Response", (), {"data": [{"id": "u1", "email": "u1@example.com"}, {"id": "u2", "email": None}]})
+
+    monkeypatch.setattr(reminder_delivery, 'is_using_fallback', lambda: False)
+    monkeypatch.setattr(reminder_delivery, 'service_postgrest', ServiceClient())
+    emails = asyncio.run(reminder_delivery.lookup_user_emails(["u1", "u2"]))
+    assert emails == {"u1": "u1@example.com"}
+    assert calls == [("reminder_user_emails", {"p_user_ids": ["u1", "u2"]})]
@@ -0,0 +1,156 @@
+"""Reminder lease stores and delivery-time checks of the reminder scheduler"""
+import asyncio
+from datetime import datetime, timedelta
+
+import reminder_leases
+import reminder_scheduler
+from database import FallbackDatabase, fallback_db
+from reminder_leases import SQLiteLeaseStore, SupabaseLeaseStore, task_bucket
+from reminder_scheduler import Reminder, ReminderScheduler, REMINDER_LEAD_TIME
+
+
+def test_sqlite_lease_store(tmp_path):
+    async def scenario():
+        first = SQLiteLeaseStore(str(tmp_path / "leases.db"), buckets=4)
+        second = SQLiteLeaseStore(str(tmp_path / "leases.db"), buckets=4)
+        assert await first.heartbeat("a", 30) == 1
+        assert await second.heartbeat("b", 30) == 2
+        assert await first.renew_and_claim("a", 2, 30) == {0, 1}
+        assert await second.renew_and_claim("b", 4, 30) == {2, 3}
+
+        start = await first.latest_change()
+        await second.notify(["t1", "t2"])
+        position, changed = await first.poll_changes(start, {task_bucket("t1")})
+        assert changed == ["t1"] and position > start
+        assert await first.poll_changes(position, {0, 1, 2, 3}) == (position, [])
+
+        claims = await asyncio.gather(first.claim_fires([("t1", 1.0)]), second.claim_fires([("t1", 1.0)]))
+        assert sorted(map(sorted, claims)) == [[], ["t1"]]
+
+        await first.unregister("a")
+        assert await second.renew_and_claim("b", 4, 30) == {0, 1, 2, 3}
+        await first.aclose()
+        await second.aclose()
+    asyncio.run(scenario())
+
+
+class FakeLeaseRpc:
+    """poll_reminder_changes() over notifications whose transactions commit in any order"""
+
+    def __init__(self):
+        self.committed = []
+        self.running = {}
+        self.next_xid, self.next_seq = 100, 1
+
+    def insert(self, task_id):
+        xid, seq = self.next_xid, self.next_seq
+        self.next_xid += 1
+        self.next_seq += 1
+        self.running[xid] = {'xid': xid, 'seq': seq, 'bucket': task_bucket(task_id), 'task_id': task_id}
+        return xid
+
+    def commit(self, xid):
+        self.committed.append(self.running.pop(xid))
+
+    def rpc(self, function, params):
+        horizon = min(self.running, default=self.next_xid)
+        if function == 'reminder_changes_horizon':
+            return FakeResponse(horizon)
+        after = (params['p_after_xid'], params['p_after_seq'])
+        changes = sorted((row for row in self.committed
+                          if row['xid'] < horizon and (row['xid'], row['seq']) > after),
+                         key=lambda row: (row['xid'], row['seq']))
+        return FakeResponse({'horizon': horizon, 'changes': changes[:params['p_limit']]})
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    async def execute(self):
+        return self
+
+
+def test_supabase_poll_does_not_skip_late_commits(monkeypatch):
+    monkeypatch.setattr(reminder_leases, 'CHANGE_PAGE_SIZE', 2)
+    rpc = FakeLeaseRpc()
+    store = SupabaseLeaseStore(rpc)
+    everything = set(range(reminder_leases.REMINDER_BUCKETS))
+
+    async def scenario():
+        position = await store.latest_change()
+        slow, fast = rpc.insert("slow"), rpc.insert("fast")
+        rpc.commit(fast)
+        position, changed = await store.poll_changes(position, everything)
+        assert changed == []
+        rpc.commit(slow)
+        for task_id in ("c", "d", "e"):
+            rpc.commit(rpc.insert(task_id))
+        position, changed = await store.poll_changes(position, everything)
+        assert changed == ["slow", "fast", "c", "d", "e"]
+        assert (await store.poll_changes(position, everything))[1] == []
+    asyncio.run(scenario())
+
+
+def test_due_reminders_are_rechecked_before_sending(monkeypatch):
+    due_at = datetime.now() + timedelta(hours=1)
+    fire_at = (due_at - REMINDER_LEAD_TIME).timestamp()
+    tasks = {
+        title: fallback_db.create_task({'user_id': 'u1', 'title': title, 'dueAt': due_at.isoformat()})
+        for title in ('kept', 'done', 'moved', 'deleted')
+    }
+    fallback_db.update_task(tasks['done']['id'], 'u1', {'status': 'done'})
+    fallback_db.update_task(tasks['moved']['id'], 'u1', {'dueAt': (due_at + timedelta(days=1)).isoformat()})
+    fallback_db.delete_task(tasks['deleted']['id'], 'u1')
+
+    scheduler = ReminderScheduler()
+    sent = []
+
+    async def submit(reminders):
+        sent.extend(reminder.task_title for reminder in reminders)
+    monkeypatch.setattr(scheduler.delivery, 'submit', submit)
+
+    reminders = [Reminder(fire_at, task['id'], 'u1', title, None) for title, task in tasks.items()]
+    asyncio.run(scheduler._send_due(reminders))
+    assert sent == ['kept']
+
+
+def test_reminders_due_during_a_crash_handover_fire_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(reminder_scheduler, 'REMINDER_LEASE_TTL_SECONDS', 0.5)
+    monkeypatch.setattr(reminder_scheduler, 'fallback_db', FallbackDatabase())
+    db = reminder_scheduler.fallback_db
+
+    def worker():
+        scheduler = ReminderScheduler()
+        scheduler.lease_store = SQLiteLeaseStore(str(tmp_path / "leases.db"))
+        scheduler.owned_buckets = set()
+        scheduler.sent = []
+
+        async def submit(reminders):
+            scheduler.sent.extend(reminder.task_title for reminder in reminders)
+        monkeypatch.setattr(scheduler.delivery, 'submit', submit)
+        return scheduler
+
+    async def scenario():
+        a, b = worker(), worker()
+        due_at = datetime.now() + REMINDER_LEAD_TIME + timedelta(seconds=0.2)
+        for title in ('sent by a', 'missed'):
+            db.create_task({'user_id': 'u1', 'title': title, 'dueAt': due_at.isoformat()})
+        await a.rehydrate()
+        assert len(a.scheduled_reminders) == 2
+
+        # A sends one reminder, then dies before the other is due (no unregister)
+        sent_by_a = next(r for r in a.scheduled_reminders.values() if r.task_title == 'sent by a')
+        await a._send_due([sent_by_a])
+        a.cancel_all_reminders()
+
+        # Both are past due and A's leases have expired by the time B claims the buckets
+        await asyncio.sleep(0.7)
+        await b.rehydrate()
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*b._deliveries)
+        b.cancel_all_reminders()
+        await a.lease_store.aclose()
+        await b.lease_store.aclose()
+        return a.sent, b.sent
+    assert asyncio.run(scenario()) == (['sent by a'], ['missed'])
@@ -0,0 +1,111 @@
+"""Reminder scheduler core: one min-heap, lazy cancellation, a single timer"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import reminder_scheduler
+from database import FallbackDatabase
+from reminder_scheduler import ReminderScheduler, REMINDER_LEAD_TIME
+
+
+def due_in(seconds):
+    """dueAt whose reminder fires `seconds` from now"""
+    return datetime.now() + REMINDER_LEAD_TIME + timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = ReminderScheduler()
+    sent = []
+
+    async def current(reminders):
+        return reminders
+
+    async def submit(reminders):
+        sent.extend(reminder.task_title for reminder in reminders)
+    monkeypatch.setattr(scheduler, '_current_reminders', current)
+    monkeypatch.setattr(scheduler.delivery, 'submit', submit)
+    scheduler.sent = sent
+    return scheduler
+
+
+def test_cancel_then_reschedule_same_task(scheduler):
+    async def scenario():
+        await scheduler.schedule_reminder('t1', 'u1', 'first', due_in(100))
+        scheduler.cancel_reminder('t1')
+        # Lazy cancellation: the entry stays in the heap until it reaches the top
+        assert (scheduler.pending_count, scheduler.heap_size) == (0, 1)
+
+        await scheduler.schedule_reminder('t1', 'u1', 'second', due_in(0.05))
+        assert scheduler.scheduled_reminders['t1'].task_title == 'second'
+        await asyncio.sleep(0.2)
+        await asyncio.gather(*scheduler._deliveries)
+    asyncio.run(scenario())
+    assert scheduler.sent == ['second']
+    assert (scheduler.pending_count, scheduler.heap_size) == (0, 0)
+
+
+def test_reschedule_replaces_the_pending_reminder(scheduler):
+    async def scenario():
+        await scheduler.schedule_reminder('t1', 'u1', 'early', due_in(0.05))
+        await scheduler.schedule_reminder('t1', 'u1', 'late', due_in(0.15))
+        await asyncio.sleep(0.1)
+        assert scheduler.sent == []
+        await asyncio.sleep(0.2)
+        await asyncio.gather(*scheduler._deliveries)
+    asyncio.run(scenario())
+    assert scheduler.sent == ['late']
+
+
+def test_reminders_fire_in_deadline_order(scheduler):
+    async def scenario():
+        await scheduler.schedule_reminders([
+            (f't{offset}', 'u1', f'at {offset}', due_in(offset / 100), None)
+            for offset in (15, 5, 20, 10)
+        ])
+        scheduler.cancel_reminder('t20')
+        await asyncio.sleep(0.3)
+        await asyncio.gather(*scheduler._deliveries)
+    asyncio.run(scenario())
+    assert scheduler.sent == ['at 5', 'at 10', 'at 15']
+
+
+def test_timer_rearms_for_an_earlier_reminder(scheduler):
+    async def scenario():
+        await scheduler.schedule_reminder('late', 'u1', 'late', due_in(100))
+        assert 99 < scheduler.next_fire_in() <= 100
+        timer = scheduler._timer
+
+        await scheduler.schedule_reminder('soon', 'u1', 'soon', due_in(10))
+        assert 9 < scheduler.next_fire_in() <= 10
+        assert timer.cancelled()
+
+        # A later reminder leaves the timer alone
+        timer = scheduler._timer
+        await scheduler.schedule_reminder('later', 'u1', 'later', due_in(50))
+        assert scheduler._timer is timer
+
+        # Cancelling is lazy: the timer fires, finds nothing due and re-arms
+        scheduler.cancel_reminder('soon')
+        scheduler._fire_due()
+        assert 49 < scheduler.next_fire_in() <= 50
+        scheduler.cancel_all_reminders()
+    asyncio.run(scenario())
+
+
+def test_rehydrate_skips_done_tasks(monkeypatch):
+    monkeypatch.setattr(reminder_scheduler, 'fallback_db', FallbackDatabase())
+    due_at = due_in(3600).isoformat()
+    for title, status in (('open', 'pending'), ('finished', 'done')):
+        reminder_scheduler.fallback_db.create_task({'user_id': 'u1', 'title': title, 'dueAt': due_at, 'status': status})
+    assert [task['title'] for task in reminder_scheduler.fallback_db.query_due_tasks('', '9999')] == ['open']
+
+    scheduler = ReminderScheduler()
+
+    async def scenario():
+        await scheduler.rehydrate()
+        titles = [reminder.task_title for reminder in scheduler.scheduled_reminders.values()]
+        scheduler.cancel_all_reminders()
+        return titles
+    assert asyncio.run(scenario()) == ['open']
@@ -0,0 +1,30 @@
+"""run_fallback(): blocking fallback backends are called off the event loop"""
+import asyncio
+import threading
+
+import database
+from database import FallbackDatabase, run_fallback
+from sqlite_database import SQLiteDatabase
+
+
+def call_thread(monkeypatch, db):
+    monkeypatch.setattr(database, 'fallback_db', db)
+
+    async def call():
+        task = await run_fallback(db.create_task, {'user_id': 'u1', 'title': 'a'})
+        return task, await run_fallback(lambda: threading.current_thread())
+    return asyncio.run(call())
+
+
+def test_sqlite_calls_run_in_a_worker_thread(monkeypatch, tmp_path):
+    db = SQLiteDatabase(str(tmp_path / "fallback.db"))
+    task, thread = call_thread(monkeypatch, db)
+    assert thread is not threading.main_thread()
+    assert db.get_task(task['id'])['title'] == 'a'
+    db.close()
+
+
+def test_memory_calls_stay_inline(monkeypatch):
+    task, thread = call_thread(monkeypatch, FallbackDatabase())
+    assert thread is threading.main_thread()
+    assert task['title'] == 'a'
@@ -0,0 +1,156 @@
+"""Subtask progress counters (subtaskCount, subtasksDone, descendantCount, descendantsDone)"""
+import random
+
+from journal import JournaledDatabase
+
+COUNTERS = ('subtask_count', 'subtasks_done', 'descendant_count', 'descendants_done')
+
+
+def counters(db, task_id):
+    task = db.get_task(task_id)
+    return tuple(task[column] for column in COUNTERS)
+
+
+def expected_counters(rows):
+    """Brute force: every task counts once in each ancestor, up to the first one owned by another user"""
+    by_id = {row['id']: row for row in rows}
+
+    def parent_of(row):
+        parent = by_id.get(row['parent_id'])
+        return parent if parent is not None and parent['user_id'] == row['user_id'] else None
+
+    expected = {task_id: [0, 0, 0, 0] for task_id in by_id}
+    for row in rows:
+        done = int(row['status'] == 'done')
+        parent, seen = parent_of(row), {row['id']}
+        if parent is not None:
+            expected[parent['id']][0] += 1
+            expected[parent['id']][1] += done
+        while parent is not None and parent['id'] not in seen:
+            seen.add(parent['id'])
+            expected[parent['id']][2] += 1
+            expected[parent['id']][3] += done
+            parent = parent_of(parent)
+    return {task_id: tuple(values) for task_id, values in expected.items()}
+
+
+def assert_counters_consistent(db):
+    rows = db.get_all_tasks()
+    actual = {row['id']: tuple(row[column] for column in COUNTERS) for row in rows}
+    assert actual == expected_counters(rows)
+
+
+def test_counters_follow_create_status_and_delete(store):
+    root = store.create_task({'user_id': 'u1', 'title': 'root'})
+    child = store.create_task({'user_id': 'u1', 'title': 'child', 'parent_id': root['id']})
+    store.create_task({'user_id': 'u1', 'title': 'grandchild', 'parent_id': child['id'], 'status': 'done'})
+    assert counters(store, root['id']) == (1, 0, 2, 1)
+    assert counters(store, child['id']) == (1, 1, 1, 1)
+
+    store.update_task(child['id'], 'u1', {'status': 'done'})
+    assert counters(store, root['id']) == (1, 1, 2, 2)
+
+    store.delete_task_subtree(child['id'], 'u1')
+    assert counters(store, root['id']) == (0, 0, 0, 0)
+
+
+def test_parent_of_another_user_is_not_counted(store):
+    theirs = store.create_task({'user_id': 'alice', 'title': 'private'})
+    mine = store.create_task({'user_id': 'bob', 'title': 'intruder', 'parent_id': theirs['id'], 'status': 'done'})
+    store.create_task({'user_id': 'bob', 'title': 'below', 'parent_id': mine['id']})
+    changes = store.get_task_changes('alice', None, 100)
+
+    assert counters(store, theirs['id']) == (0, 0, 0, 0)
+    assert counters(store, mine['id']) == (1, 0, 1, 0)
+    # Nothing about alice's task changed
+    assert store.get_task_changes('alice', None, 100) == changes
+    assert store.get_task(theirs['id'])['updated_at'] == theirs['updated_at']
+
+
+def test_task_moved_to_another_user_takes_only_its_owners_subtasks(store):
+    root = store.create_task({'user_id': 'alice', 'title': 'root'})
+    task = store.create_task({'user_id': 'alice', 'title': 'moved', 'parent_id': root['id']})
+    store.create_task({'user_id': 'alice', 'title': 'alice child', 'parent_id': task['id']})
+    store.create_task({'user_id': 'bob', 'title': 'bob child', 'parent_id': task['id'], 'status': 'done'})
+    assert counters(store, task['id']) == (1, 0, 1, 0)
+    assert counters(store, root['id']) == (1, 0, 2, 0)
+
+    store.update_task(task['id'], 'alice', {'user_id': 'bob'})
+    assert counters(store, task['id']) == (1, 1, 1, 1)
+    assert counters(store, root['id']) == (0, 0, 0, 0)
+    assert_counters_consistent(store)
+
+
+def test_counters_match_brute_force_after_random_changes(store):
+    rnd = random.Random(7)
+    ids = []
+    for _ in range(400):
+        user = rnd.choice(['u1', 'u1', 'u2'])
+        action = rnd.random()
+        task = store.get_task(rnd.choice(ids)) if ids else None
+        if task is None or action < 0.4:
+            parent_id = rnd.choice(ids) if ids and rnd.random() < 0.8 else None
+            ids.append(store.create_task({'user_id': user, 'title': 't', 'parent_id': parent_id,
+                                          'status': rnd.choice(['pending', 'done'])})['id'])
+        elif action < 0.65:
+            store.update_task(task['id'], task['user_id'], {'status': rnd.choice(['pending', 'done'])})
+        elif action < 0.75:
+            store.update_task(task['id'], task['user_id'], {'user_id': 'u2' if task['user_id'] == 'u1' else 'u1'})
+        elif action < 0.85:
+            store.update_task_subtree(task['id'], task['user_id'], {'status': rnd.choice(['pending', 'done'])})
+        elif action < 0.95:
+            store.delete_task(task['id'], task['user_id'])
+        else:
+            store.delete_task_subtree(task['id'], task['user_id'])
+    assert_counters_consistent(store)
+
+
+def test_journal_replay_rebuilds_counters(tmp_path):
+    directory = str(tmp_path / "journal")
+    db = JournaledDatabase(directory, fsync_interval=60)
+    root = db.create_task({'user_id': 'alice', 'title': 'root'})
+    child = db.create_task({'user_id': 'alice', 'title': 'child', 'parent_id': root['id']})
+    db.create_task({'user_id': 'bob', 'title': 'foreign', 'parent_id': root['id']})
+    db.update_task(child['id'], 'alice', {'status': 'done'})
+    db.close(compact=False)
+
+    replayed = JournaledDatabase(directory, fsync_interval=60)
+    assert counters(replayed, root['id']) == (1, 1, 1, 1)
+    replayed.snapshot()
+    replayed.close(compact=False)
+
+    reloaded = JournaledDatabase(directory, fsync_interval=60)
+    assert counters(reloaded, root['id']) == (1, 1, 1, 1)
+    reloaded.close(compact=False)
+
+
+def test_api_rejects_parent_of_another_user(client, auth_headers):
+    alice, bob = auth_headers(), auth_headers()
+    theirs = client.post("/api/tasks/", json={"title": "private"}, headers=alice).json()["data"]
+    etag = client.get("/api/tasks/", headers=alice).headers["etag"]
+
+    response = client.post("/api/tasks/", json={"title": "intruder", "parentId": theirs["id"]}, headers=bob)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Parent task not found"
+
+    response = client.post("/api/tasks/batch", json={"operations": [
+        {"op": "create", "task": {"title": "intruder", "parentId": theirs["id"]}},
+        {"op": "create", "task": {"title": "fine"}}
+    ]}, headers=bob)
+    results = response.json()["data"]
+    assert [result["success"] for result in results] == [False, True]
+    assert results[0]["error"] == "Parent task not found"
+
+    # alice's list did not change
+    assert client.get("/api/tasks/", headers={**alice, "If-None-Match": etag}).status_code == 304
+    assert client.get("/api/tasks/", headers=alice).json()["data"][0]["subtaskCount"] == 0
+
+
+def test_api_counts_own_subtasks(client, auth_headers):
+    headers = auth_headers()
+    parent = client.post("/api/tasks/", json={"title": "parent"}, headers=headers).json()["data"]
+    response = client.post("/api/tasks/", json={"title": "child", "parentId": parent["id"]}, headers=headers)
+    assert response.status_code == 200
+    tasks = {task["id"]: task for task in client.get("/api/tasks/", headers=headers).json()["data"]}
+    assert tasks[parent["id"]]["subtaskCount"] == 1
+    assert tasks[parent["id"]]["descendantCount"] == 1
@@ -0,0 +1,110 @@
+"""POST /api/tasks/batch: operations apply in request order on every backend"""
+import uuid
+
+import pytest
+
+import main
+import routers.tasks as tasks_router
+from auth_utils import get_current_user_flexible
+from models import User
+
+
+def sequence(task_id):
+    """Create one task, then update, delete and again update and delete an existing one"""
+    return [
+        {"op": "create", "task": {"title": "new"}},
+        {"op": "update", "id": task_id, "task": {"title": "renamed"}},
+        {"op": "delete", "id": task_id},
+        {"op": "update", "id": task_id, "task": {"title": "again"}},
+        {"op": "delete", "id": task_id},
+    ]
+
+
+# Deletes report success without a row
+EXPECTED = [(True, "new"), (True, "renamed"), (True, None), (False, None), (False, None)]
+
+
+def run_batch(client, headers, task_id):
+    response = client.post("/api/tasks/batch", json={"operations": sequence(task_id)}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [(result["success"], (result["data"] or {}).get("title")) for result in response.json()["data"]]
+
+
+def test_store_batches_apply_in_order(store):
+    task = store.create_task({'user_id': 'u1', 'title': 'old'})
+    operations = [(item["op"], item.get("id"), item.get("task") or {}) for item in sequence(task['id'])]
+    rows = store.apply_task_batch('u1', operations)
+    assert [(row is not None, row and row['title']) for row in rows] == [
+        (True, "new"), (True, "renamed"), (True, "renamed"), (False, None), (False, None)
+    ]
+    assert store.get_task(task['id']) is None
+
+
+def test_fallback_batch(client, auth_headers):
+    headers = auth_headers()
+    task = client.post("/api/tasks/", json={"title": "old"}, headers=headers).json()["data"]
+    assert run_batch(client, headers, task["id"]) == EXPECTED
+
+
+class FakeBatchRpc:
+    """apply_task_batch() over an in-memory table, in order, as the SQL function does"""
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = []
+
+    def insert(self, title):
+        task_id = str(uuid.uuid4())
+        self.rows[task_id] = {'id': task_id, 'user_id': 'u1', 'title': title, 'status': 'pending',
+                              'inserted_at': '2024-01-01T09:00:00', 'updated_at': '2024-01-01T09:00:00'}
+        return task_id
+
+    def rpc(self, name, params):
+        assert name == 'apply_task_batch'
+        self.calls.append(params['p_operations'])
+        results = []
+        for operation in params['p_operations']:
+            if operation['op'] == 'create':
+                row = dict(self.rows[self.insert(operation['data']['title'])])
+            elif operation['op'] == 'update':
+                row = self.rows.get(operation['id'])
+                if row is not None:
+                    row.update(operation['data'])
+                    row = dict(row)
+            else:
+                row = self.rows.pop(operation['id'], None)
+            results.append(row)
+        return FakeResponse(results)
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    async def execute(self):
+        return self
+
+
+@pytest.fixture
+def supabase_batch(client, monkeypatch):
+    fake = FakeBatchRpc()
+    monkeypatch.setattr(tasks_router, 'is_using_fallback', lambda: False)
+    monkeypatch.setattr(tasks_router, 'get_user_supabase', lambda request: fake)
+    main.app.dependency_overrides[get_current_user_flexible] = lambda: User(id='u1', email='u1@example.com')
+    yield fake
+    main.app.dependency_overrides.pop(get_current_user_flexible)
+
+
+def test_supabase_batch_is_one_ordered_call(client, supabase_batch):
+    task_id = supabase_batch.insert("old")
+    assert run_batch(client, {}, task_id) == EXPECTED
+    [call] = supabase_batch.calls
+    assert [(item['op'], item['id']) for item in call] == [
+        ('create', None), ('update', task_id), ('delete', task_id), ('update', task_id), ('delete', task_id)
+    ]
+    assert call[1]['data'] == {'title': 'renamed'}
+
+    # Ids that are not UUIDs are sent as null and come back not found
+    response = client.post("/api/tasks/batch", json={"operations": [{"op": "delete", "id": "42"}]})
+    assert response.json()["data"][0]["error"] == "Task not found"
+    assert supabase_batch.calls[-1] == [{'op': 'delete', 'id': None, 'data': {}}]
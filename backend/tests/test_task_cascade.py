@@ -0,0 +1,72 @@
+"""Cascading status changes and deletes (?cascade=true) and their reminders"""
+from datetime import datetime, timedelta
+
+from reminder_scheduler import reminder_scheduler
+
+
+def create_tree(db, user_id):
+    root = db.create_task({'user_id': user_id, 'title': 'root'})
+    child = db.create_task({'user_id': user_id, 'title': 'child', 'parent_id': root['id']})
+    grandchild = db.create_task({'user_id': user_id, 'title': 'grandchild', 'parent_id': child['id']})
+    return root, child, grandchild
+
+
+def test_subtree_status_and_delete(store):
+    root, child, grandchild = create_tree(store, 'u1')
+    other = store.create_task({'user_id': 'u1', 'title': 'other'})
+    foreign = store.create_task({'user_id': 'u2', 'title': 'foreign', 'parent_id': child['id']})
+
+    assert sorted(store.update_task_subtree(child['id'], 'u1', {'status': 'done'})) == sorted([child['id'], grandchild['id']])
+    assert [store.get_task(task['id'])['status'] for task in (root, child, grandchild, other, foreign)] == \
+        ['pending', 'done', 'done', 'pending', 'pending']
+
+    # Another user's subtree is not found
+    assert store.update_task_subtree(root['id'], 'u2', {'status': 'done'}) == []
+    assert store.delete_task_subtree(root['id'], 'u2') == []
+
+    assert sorted(store.delete_task_subtree(root['id'], 'u1')) == sorted([root['id'], child['id'], grandchild['id']])
+    remaining = {task['id'] for task in store.get_all_tasks()}
+    assert remaining == {other['id'], foreign['id']}
+
+
+def test_api_cascade_status_cancels_and_restores_reminders(client, auth_headers):
+    headers = auth_headers()
+    due = (datetime.now() + timedelta(hours=2)).isoformat()
+    root = client.post("/api/tasks/", json={"title": "root", "dueAt": due}, headers=headers).json()["data"]
+    child = client.post("/api/tasks/", json={"title": "child", "dueAt": due, "parentId": root["id"]},
+                        headers=headers).json()["data"]
+    ids = {root["id"], child["id"]}
+    assert ids <= set(reminder_scheduler.scheduled_reminders)
+
+    response = client.put(f"/api/tasks/{root['id']}/status", params={"cascade": "true"},
+                          json={"status": "done"}, headers=headers)
+    assert response.status_code == 200
+    assert set(response.json()["updated_ids"]) == ids
+    assert not ids & set(reminder_scheduler.scheduled_reminders)
+
+    client.put(f"/api/tasks/{root['id']}/status", params={"cascade": "true"}, json={"status": "pending"}, headers=headers)
+    assert ids <= set(reminder_scheduler.scheduled_reminders)
+    assert reminder_scheduler.scheduled_reminders[child["id"]].task_title == "child"
+
+    # Single task: done cancels, pending reschedules
+    client.put(f"/api/tasks/{child['id']}/status", json={"status": "done"}, headers=headers)
+    assert child["id"] not in reminder_scheduler.scheduled_reminders
+    client.put(f"/api/tasks/{child['id']}/status", json={"status": "pending"}, headers=headers)
+    assert child["id"] in reminder_scheduler.scheduled_reminders
+
+
+def test_api_cascade_delete(client, auth_headers):
+    headers, other_headers = auth_headers(), auth_headers()
+    due = (datetime.now() + timedelta(hours=2)).isoformat()
+    root = client.post("/api/tasks/", json={"title": "root"}, headers=headers).json()["data"]
+    child = client.post("/api/tasks/", json={"title": "child", "dueAt": due, "parentId": root["id"]},
+                        headers=headers).json()["data"]
+    assert child["id"] in reminder_scheduler.scheduled_reminders
+
+    assert client.delete(f"/api/tasks/{root['id']}", params={"cascade": "true"}, headers=other_headers).status_code == 404
+
+    response = client.delete(f"/api/tasks/{root['id']}", params={"cascade": "true"}, headers=headers)
+    assert response.status_code == 200
+    assert set(response.json()["deleted_ids"]) == {root["id"], child["id"]}
+    assert child["id"] not in reminder_scheduler.scheduled_reminders
+    assert client.get("/api/tasks/", headers=headers).json()["data"] == []
@@ -0,0 +1,133 @@
+"""Delta sync (GET /api/tasks/changes) cursors"""
+import pytest
+
+import main
+import routers.tasks as tasks_router
+from auth_utils import get_current_user_flexible
+from database import encode_change_cursor, decode_change_cursor
+from models import User
+
+
+def read_changes(client, headers, since=None, limit=500):
+    params = {"limit": limit, **({"since": since} if since else {})}
+    response = client.get("/api/tasks/changes", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_cursor_round_trip():
+    assert decode_change_cursor(encode_change_cursor(7, 1.5)) == (7, 1.5, None)
+    assert decode_change_cursor(encode_change_cursor(7, 1.5, 'task-1')) == (7, 1.5, 'task-1')
+    with pytest.raises(ValueError):
+        decode_change_cursor(encode_change_cursor(7, 1.5, 3))
+
+
+def test_fallback_sync(client, auth_headers):
+    headers = auth_headers()
+    first = client.post("/api/tasks/", json={"title": "first"}, headers=headers).json()["data"]
+    body = read_changes(client, headers)
+    assert [task["id"] for task in body["data"]] == [first["id"]]
+
+    client.delete(f"/api/tasks/{first['id']}", headers=headers)
+    second = client.post("/api/tasks/", json={"title": "second"}, headers=headers).json()["data"]
+    body = read_changes(client, headers, body["next_cursor"])
+    assert [task["id"] for task in body["data"]] == [second["id"]]
+    assert body["deleted"] == [first["id"]]
+
+    # A Supabase cursor (it names a task) means nothing to the fallback database
+    cursor = encode_change_cursor(1, decode_change_cursor(body["next_cursor"])[1], '')
+    response = client.get("/api/tasks/changes", params={"since": cursor}, headers=headers)
+    assert response.status_code == 410
+
+
+class FakeChangeFeed:
+    """task_changes() over rows written by transactions that commit in any order"""
+
+    def __init__(self):
+        self.rows = {}
+        self.running = {}
+        self.next_xid = 100
+
+    def begin(self):
+        xid = self.next_xid
+        self.next_xid += 1
+        self.running[xid] = {}
+        return xid
+
+    def write(self, xid, task_id, deleted=False):
+        self.running[xid][task_id] = None if deleted else {
+            'id': task_id, 'user_id': 'u1', 'title': task_id, 'status': 'pending',
+            'inserted_at': '2024-01-01T09:00:00', 'updated_at': '2024-01-01T09:00:00'
+        }
+
+    def commit(self, xid):
+        for task_id, task in self.running.pop(xid).items():
+            self.rows[task_id] = (xid, task)
+
+    def rpc(self, name, params):
+        assert name == 'task_changes'
+        horizon = min(self.running, default=self.next_xid)
+        after_xid, after_id = params['p_after_xid'], params['p_after_id'] or ''
+        changes = sorted(
+            (xid, task_id, task) for task_id, (xid, task) in self.rows.items()
+            if xid < horizon and (task is not None or after_xid is not None)
+            and (after_xid is None or (xid, task_id) > (after_xid, after_id))
+        )[:params['p_limit']]
+        data = {'horizon': horizon,
+                'changes': [{'xid': xid, 'id': task_id, 'task': task} for xid, task_id, task in changes]}
+        return FakeResponse(data)
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    async def execute(self):
+        return self
+
+
+@pytest.fixture
+def supabase_feed(client, monkeypatch):
+    feed = FakeChangeFeed()
+    monkeypatch.setattr(tasks_router, 'is_using_fallback', lambda: False)
+    monkeypatch.setattr(tasks_router, 'get_user_supabase', lambda request: feed)
+    main.app.dependency_overrides[get_current_user_flexible] = lambda: User(id='u1', email='u1@example.com')
+    yield feed
+    main.app.dependency_overrides.pop(get_current_user_flexible)
+
+
+def test_supabase_sync_waits_for_late_commits(client, supabase_feed):
+    feed = supabase_feed
+    slow, fast = feed.begin(), feed.begin()
+    feed.write(slow, 'a')
+    feed.write(fast, 'b')
+    feed.commit(fast)
+
+    # b committed first, but the slow transaction (lower xid) still runs
+    body = read_changes(client, {})
+    assert body["data"] == [] and not body["has_more"]
+
+    feed.commit(slow)
+    body = read_changes(client, {}, body["next_cursor"])
+    assert [task["id"] for task in body["data"]] == ['a', 'b']
+
+    # One transaction's changes split across pages, then a delete
+    batch = feed.begin()
+    for task_id in ('c', 'd', 'e'):
+        feed.write(batch, task_id)
+    feed.write(batch, 'a', deleted=True)
+    feed.commit(batch)
+    seen, deleted, cursor = [], [], body["next_cursor"]
+    while True:
+        body = read_changes(client, {}, cursor, limit=2)
+        seen.extend(task["id"] for task in body["data"])
+        deleted.extend(body["deleted"])
+        cursor = body["next_cursor"]
+        if not body["has_more"]:
+            break
+    assert (seen, deleted) == (['c', 'd', 'e'], ['a'])
+    assert read_changes(client, {}, cursor)["data"] == []
+
+    # A fallback cursor (no task id) is refused
+    response = client.get("/api/tasks/changes", params={"since": encode_change_cursor(1, decode_change_cursor(cursor)[1])})
+    assert response.status_code == 410
@@ -0,0 +1,102 @@
+"""Error reporting of POST /api/tasks/import"""
+import json
+
+from task_import import MAX_IMPORT_ERRORS
+
+
+def ndjson(*rows):
+    return "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+
+
+def import_tasks(client, headers, body, **params):
+    content_type = "text/csv" if params.get("format") == "csv" else "application/x-ndjson"
+    return client.post("/api/tasks/import", params=params, content=body,
+                       headers={**headers, "Content-Type": content_type})
+
+
+def list_tasks(client, headers):
+    return {task["title"]: task for task in client.get("/api/tasks/", headers=headers).json()["data"]}
+
+
+def test_invalid_rows_are_reported_by_line(client, auth_headers):
+    headers = auth_headers()
+    body = ndjson(
+        {"title": "ok"},
+        "{not json",
+        "[1, 2]",
+        "",
+        {"status": "pending"},
+        {"title": "bad status", "status": "later"},
+        {"title": "also ok"}
+    )
+    result = import_tasks(client, headers, body, chunk_size=2).json()
+    assert (result["imported"], result["failed"]) == (2, 4)
+    assert [error["line"] for error in result["errors"]] == [2, 3, 5, 6]
+    assert result["errors"][0]["error"].startswith("Invalid JSON")
+    assert result["errors"][1]["error"] == "Expected a JSON object"
+    assert "title" in result["errors"][2]["error"]
+    assert "status" in result["errors"][3]["error"]
+    assert set(list_tasks(client, headers)) == {"ok", "also ok"}
+
+
+def test_csv_errors(client, auth_headers):
+    headers = auth_headers()
+    body = 'title,status\nfirst,done\n"multi\nline",pending\ntoo,many,cells\nlast,pending\n"open'
+    result = import_tasks(client, headers, body, format="csv").json()
+    assert (result["imported"], result["failed"]) == (3, 2)
+    assert result["errors"] == [
+        {"line": 5, "error": "Expected 2 columns, found 3"},
+        {"line": 7, "error": "Unterminated quoted field"}
+    ]
+    assert list_tasks(client, headers)["multi\nline"]["status"] == "pending"
+
+    response = import_tasks(client, headers, "name,status\nx,done\n", format="csv")
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("The CSV header has no title column")
+
+
+def test_unreadable_upload_keeps_earlier_chunks(client, auth_headers):
+    headers = auth_headers()
+    body = ndjson({"title": "a"}, {"title": "b"}).encode() + b"\n\xff\xfe\n"
+    response = import_tasks(client, headers, body, chunk_size=1)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "The upload is not valid UTF-8 after line 2; 2 tasks were imported before it"
+    assert set(list_tasks(client, headers)) == {"a", "b"}
+
+
+def test_parent_links_that_cannot_be_made(client, auth_headers):
+    headers, other_headers = auth_headers(), auth_headers()
+    mine = client.post("/api/tasks/", json={"title": "existing"}, headers=headers).json()["data"]
+    theirs = client.post("/api/tasks/", json={"title": "theirs"}, headers=other_headers).json()["data"]
+    body = ndjson(
+        {"id": "c", "title": "child", "parentId": "p"},
+        {"id": "p", "title": "parent"},
+        {"title": "under existing", "parentId": mine["id"]},
+        {"title": "under theirs", "parentId": theirs["id"]},
+        {"title": "orphan", "parentId": "missing"},
+        {"id": "x", "title": "x", "parentId": "y"},
+        {"id": "y", "title": "y", "parentId": "x"}
+    )
+    result = import_tasks(client, headers, body, chunk_size=2).json()
+    assert (result["imported"], result["failed"]) == (7, 0)
+    assert result["errors"] == [
+        {"line": 4, "error": f"parentId '{theirs['id']}' not found, imported without parent"},
+        {"line": 5, "error": "parentId 'missing' not found, imported without parent"},
+        # y was linked under x as it came in, so x's deferred link to y is the one refused
+        {"line": 6, "error": "parentId 'y' would make a cycle, imported without parent"}
+    ]
+    tasks = list_tasks(client, headers)
+    assert tasks["child"]["parentId"] == tasks["parent"]["id"]
+    assert tasks["under existing"]["parentId"] == mine["id"]
+    assert tasks["under theirs"]["parentId"] is None
+    assert tasks["y"]["parentId"] == tasks["x"]["id"] and tasks["x"]["parentId"] is None
+    assert client.get("/api/tasks/", headers=other_headers).json()["data"][0]["subtaskCount"] == 0
+
+
+def test_error_list_is_capped(client, auth_headers):
+    headers = auth_headers()
+    body = ndjson(*[{"status": "done"}] * (MAX_IMPORT_ERRORS + 20), {"title": "kept"})
+    result = import_tasks(client, headers, body).json()
+    assert (result["imported"], result["failed"]) == (1, MAX_IMPORT_ERRORS + 20)
+    assert len(result["errors"]) == MAX_IMPORT_ERRORS
+    assert result["message"] == f"1 tasks imported, {MAX_IMPORT_ERRORS + 20} rows skipped"
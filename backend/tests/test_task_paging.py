@@ -0,0 +1,84 @@
+"""Keyset pagination of task lists (query_tasks, GET /api/tasks/?limit=&cursor=)"""
+import random
+
+from postgrest import AsyncPostgrestClient
+
+from database import task_sort_key
+from routers.tasks import _supabase_keyset_after
+
+
+def create_tasks(db, user_id, count, seed=3):
+    rnd = random.Random(seed)
+    for i in range(count):
+        db.create_task({
+            'user_id': user_id,
+            'title': f't{i}',
+            'isStarred': rnd.random() < 0.3,
+            # Few distinct dates, so ties are broken by id
+            'dueAt': rnd.choice([None, '2024-01-01T09:00:00', '2024-01-02T09:00:00', '2024-01-03T09:00:00']),
+            'status': rnd.choice(['pending', 'done'])
+        })
+
+
+def read_pages(db, user_id, limit, **filters):
+    rows, after = [], None
+    while True:
+        page = db.query_tasks(user_id, after=after, limit=limit, **filters)
+        rows.extend(page)
+        if len(page) < limit:
+            return rows
+        after = task_sort_key(page[-1])
+
+
+def test_pages_cover_the_list_once_in_order(store):
+    create_tasks(store, 'u1', 60)
+    create_tasks(store, 'u2', 5)
+    # Ties on the date are broken by id, which the SQLite backend compares as a number
+    expected = [task['id'] for task in store.query_tasks('u1')]
+    keys = [task_sort_key(task)[:3] for task in store.query_tasks('u1')]
+    assert keys == sorted(keys)
+    assert sorted(expected) == sorted(task['id'] for task in store.get_all_tasks() if task['user_id'] == 'u1')
+    for limit in (1, 7, 60, 100):
+        assert [task['id'] for task in read_pages(store, 'u1', limit)] == expected
+
+
+def test_pages_with_filters(store):
+    create_tasks(store, 'u1', 60)
+    tasks = store.query_tasks('u1')
+    for filters in ({'is_starred': False}, {'is_starred': True}, {'status': 'done'},
+                    {'due_from': '2024-01-02T00:00:00', 'due_to': '2024-01-02T23:59:59'}):
+        expected = [task['id'] for task in tasks
+                    if ('is_starred' not in filters or bool(task['isStarred']) == filters['is_starred'])
+                    and ('status' not in filters or task['status'] == filters['status'])
+                    and ('due_from' not in filters or task['dueAt'] == '2024-01-02T09:00:00')]
+        assert [task['id'] for task in read_pages(store, 'u1', 4, **filters)] == expected, filters
+
+
+def test_api_pages_match_the_full_list(client, auth_headers):
+    headers = auth_headers()
+    for i in range(12):
+        client.post("/api/tasks/", json={"title": f"t{i}", "isStarred": i % 4 == 0,
+                                         "dueAt": f"2024-01-0{i % 3 + 1}T09:00:00" if i % 5 else None}, headers=headers)
+    full = [task["id"] for task in client.get("/api/tasks/", headers=headers).json()["data"]]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 5, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/tasks/", params=params, headers=headers).json()
+        seen.extend(task["id"] for task in body["data"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == full
+    assert len(full) == 12
+
+    assert client.get("/api/tasks/", params={"cursor": "not-a-cursor"}, headers=headers).status_code == 400
+
+
+def test_supabase_keyset_keeps_unstarred_rows_with_null_isstarred():
+    # NULL isStarred sorts like false (task_sort_key), so it must pass the not-starred filter
+    for after in ((False, False, '2024-01-01T09:00:00', 'id-1'), (True, True, '', 'id-1')):
+        query = AsyncPostgrestClient("http://localhost").from_('tasks').select('*')
+        condition = _supabase_keyset_after(query, after).params.get('or')
+        assert 'isStarred.not.is.true' in condition
+        assert 'isStarred.eq.false' not in condition
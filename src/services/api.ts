@@ -103,6 +103,58 @@ class ApiService {
     }
   }
 
+  async getTaskTree(taskId: string, depth?: number) {
+    const query = depth !== undefined ? `?depth=${depth}` : '';
+    return this.request<{
+      success: boolean;
+      data: any;
+      truncated: boolean;
+      message?: string;
+    }>(`/api/tasks/${taskId}/tree${query}`);
+  }
+
+  async getTaskChanges(since?: string | null) {
+    const query = since ? `?since=${encodeURIComponent(since)}` : '';
+    return this.request<{
+      success: boolean;
+      data: any[];
+      deleted: string[];
+      next_cursor: string;
+      has_more: boolean;
+      message?: string;
+    }>(`/api/tasks/changes${query}`);
+  }
+
+  async exportTasks(format: 'ndjson' | 'csv' = 'ndjson') {
+    const response = await fetch(`${this.baseUrl}/api/tasks/export?format=${format}`, {
+      headers: this.token ? { Authorization: `Bearer ${this.token}` } : {},
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new ApiError(
+        response.status,
+        errorData.detail || `HTTP ${response.status}: ${response.statusText}`
+      );
+    }
+
+    return response.blob();
+  }
+
+  async importTasks(file: Blob, format: 'ndjson' | 'csv' = 'ndjson') {
+    return this.request<{
+      success: boolean;
+      imported: number;
+      failed: number;
+      errors: Array<{ line: number; error: string }>;
+      message?: string;
+    }>(`/api/tasks/import?format=${format}`, {
+      method: 'POST',
+      headers: { 'Content-Type': format === 'csv' ? 'text/csv' : 'application/x-ndjson' },
+      body: file,
+    });
+  }
+
   async createTask(task: {
     title: string;
     dueAt?: string | null;
@@ -177,6 +229,48 @@ class ApiService {
     }
   }
 
+  async deleteTaskTree(taskId: string) {
+    return this.request<{
+      success: boolean;
+      message: string;
+      deleted_ids: string[];
+    }>(`/api/tasks/${taskId}?cascade=true`, {
+      method: 'DELETE',
+    });
+  }
+
+  async setTaskTreeStatus(taskId: string, status: 'pending' | 'done') {
+    return this.request<{
+      success: boolean;
+      message: string;
+      updated_ids: string[];
+    }>(`/api/tasks/${taskId}/status?cascade=true`, {
+      method: 'PUT',
+      body: JSON.stringify({ status }),
+    });
+  }
+
+  async batchTasks(operations: Array<{
+    op: 'create' | 'update' | 'delete';
+    id?: string;
+    task?: Record<string, unknown>;
+  }>) {
+    return this.request<{
+      success: boolean;
+      data: Array<{
+        op: 'create' | 'update' | 'delete';
+        id?: string;
+        success: boolean;
+        data?: any;
+        error?: string;
+      }>;
+      message?: string;
+    }>('/api/tasks/batch', {
+      method: 'POST',
+      body: JSON.stringify({ operations }),
+    });
+  }
+
   async toggleTaskStatus(taskId: string) {
     return this.request(`/api/tasks/${taskId}/status`, {
       method: 'PUT',
@@ -256,12 +350,13 @@ class ApiService {
     });
   }
 
-  async deleteCategory(categoryId: string) {
+  async deleteCategory(categoryId: string, moveTo?: string) {
+    const query = moveTo ? `?move_to=${encodeURIComponent(moveTo)}` : '';
     return this.request<{
       success: boolean;
       data: any;
       message?: string;
-    }>(`/api/categories/${categoryId}`, {
+    }>(`/api/categories/${categoryId}${query}`, {
       method: 'DELETE',
     });
   }
@@ -11,6 +11,11 @@ export interface Task {
   is_folder?: boolean;
   inserted_at: string;
   updated_at: string;
+  // Subtask progress, kept up to date by the backend
+  subtaskCount?: number;
+  subtasksDone?: number;
+  descendantCount?: number;
+  descendantsDone?: number;
 }
 
 export interface SuggestedTask {
@@ -0,0 +1,14 @@
+/*
+  # Index for paginated task lists
+
+  1. Schema Changes
+    - Add a composite index matching the task list order
+      (starred first, then due date with undated last, then id)
+
+  2. Notes
+    - Lets GET /api/tasks/ seek straight to a keyset cursor and read one
+      page per request instead of sorting the user's whole task list
+*/
+
+CREATE INDEX IF NOT EXISTS idx_tasks_user_list_order
+  ON tasks (user_id, "isStarred" DESC NULLS LAST, "dueAt" ASC NULLS LAST, id);
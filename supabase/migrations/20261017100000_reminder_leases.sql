@@ -0,0 +1,114 @@
+/*
+  # Reminder ownership leases
+
+  1. New Tables
+    - `reminder_workers`: heartbeat of every backend process
+    - `reminder_leases`: one row per task bucket, owned by one worker at a time
+    - `reminder_changes`: tasks rescheduled/cancelled by a worker that does not
+      own their bucket, polled by the owner
+    - `reminder_fired`: one row per (task, fire time) so a reminder fires once
+
+  2. Functions
+    - reminder_heartbeat, claim_reminder_leases, release_reminder_leases,
+      unregister_reminder_worker, claim_reminder_fire (atomic lease changes)
+
+  3. Security
+    - RLS enabled with no policies: only the service role key (used by the
+      backend scheduler, REMINDER_LEASE_BACKEND=supabase) can access them
+*/
+
+CREATE TABLE IF NOT EXISTS reminder_workers (
+  owner text PRIMARY KEY,
+  expires_at timestamptz NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS reminder_leases (
+  bucket integer PRIMARY KEY,
+  owner text NOT NULL DEFAULT '',
+  expires_at timestamptz NOT NULL DEFAULT 'epoch'
+);
+CREATE INDEX IF NOT EXISTS idx_reminder_leases_owner ON reminder_leases (owner);
+
+CREATE TABLE IF NOT EXISTS reminder_changes (
+  seq bigserial PRIMARY KEY,
+  bucket integer NOT NULL,
+  task_id text NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_reminder_changes_created_at ON reminder_changes (created_at);
+
+CREATE TABLE IF NOT EXISTS reminder_fired (
+  task_id text NOT NULL,
+  fire_at double precision NOT NULL,
+  fired_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (task_id, fire_at)
+);
+CREATE INDEX IF NOT EXISTS idx_reminder_fired_fired_at ON reminder_fired (fired_at);
+
+ALTER TABLE reminder_workers ENABLE ROW LEVEL SECURITY;
+ALTER TABLE reminder_leases ENABLE ROW LEVEL SECURITY;
+ALTER TABLE reminder_changes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE reminder_fired ENABLE ROW LEVEL SECURITY;
+
+-- Register a worker as alive and prune old rows; returns the number of live workers
+CREATE OR REPLACE FUNCTION reminder_heartbeat(p_owner text, p_ttl double precision)
+RETURNS integer AS $$
+DECLARE
+  live integer;
+BEGIN
+  INSERT INTO reminder_workers (owner, expires_at)
+  VALUES (p_owner, now() + make_interval(secs => p_ttl))
+  ON CONFLICT (owner) DO UPDATE SET expires_at = EXCLUDED.expires_at;
+  DELETE FROM reminder_workers WHERE expires_at < now();
+  DELETE FROM reminder_changes WHERE created_at < now() - interval '1 hour';
+  DELETE FROM reminder_fired WHERE fired_at < now() - interval '1 day';
+  SELECT count(*) INTO live FROM reminder_workers;
+  RETURN live;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Renew the worker's leases and claim up to p_want expired or free buckets
+CREATE OR REPLACE FUNCTION claim_reminder_leases(p_owner text, p_buckets integer, p_want integer, p_ttl double precision)
+RETURNS SETOF integer AS $$
+BEGIN
+  INSERT INTO reminder_leases (bucket)
+  SELECT generate_series(0, p_buckets - 1)
+  ON CONFLICT (bucket) DO NOTHING;
+
+  UPDATE reminder_leases SET expires_at = now() + make_interval(secs => p_ttl)
+  WHERE owner = p_owner AND expires_at >= now();
+
+  UPDATE reminder_leases SET owner = p_owner, expires_at = now() + make_interval(secs => p_ttl)
+  WHERE bucket IN (
+    SELECT bucket FROM reminder_leases
+    WHERE expires_at < now() AND bucket < p_buckets
+    ORDER BY bucket
+    LIMIT greatest(p_want, 0)
+    FOR UPDATE SKIP LOCKED
+  );
+
+  RETURN QUERY SELECT bucket FROM reminder_leases WHERE owner = p_owner AND expires_at >= now();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION release_reminder_leases(p_owner text, p_buckets integer[])
+RETURNS void AS $$
+  UPDATE reminder_leases SET owner = '', expires_at = 'epoch'
+  WHERE owner = p_owner AND bucket = ANY(p_buckets);
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION unregister_reminder_worker(p_owner text)
+RETURNS void AS $$
+  UPDATE reminder_leases SET owner = '', expires_at = 'epoch' WHERE owner = p_owner;
+  DELETE FROM reminder_workers WHERE owner = p_owner;
+$$ LANGUAGE sql;
+
+-- True for exactly one caller per (task, fire time)
+CREATE OR REPLACE FUNCTION claim_reminder_fire(p_task_id text, p_fire_at double precision)
+RETURNS boolean AS $$
+BEGIN
+  INSERT INTO reminder_fired (task_id, fire_at) VALUES (p_task_id, p_fire_at)
+  ON CONFLICT DO NOTHING;
+  RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,18 @@
+/*
+  # Claim fired reminders in batches
+
+  1. Functions
+    - claim_reminder_fires(task_ids, fire_ats): claims every (task, fire time)
+      pair of a scheduler tick in one call and returns the task ids this
+      caller won; replaces one claim_reminder_fire call per reminder
+*/
+
+CREATE OR REPLACE FUNCTION claim_reminder_fires(p_task_ids text[], p_fire_ats double precision[])
+RETURNS SETOF text AS $$
+  INSERT INTO reminder_fired (task_id, fire_at)
+  SELECT task_id, fire_at FROM unnest(p_task_ids, p_fire_ats) AS claims(task_id, fire_at)
+  ON CONFLICT DO NOTHING
+  RETURNING task_id;
+$$ LANGUAGE sql;
+
+DROP FUNCTION IF EXISTS claim_reminder_fire(text, double precision);
@@ -0,0 +1,92 @@
+/*
+  # Task change log for delta sync (GET /api/tasks/changes)
+
+  1. Schema Changes
+    - `tasks.change_seq`: drawn from `task_change_seq` on every insert and
+      update (updated_at is refreshed at the same time)
+    - Index on (user_id, change_seq) so a sync reads only the changed rows
+
+  2. New Tables
+    - `task_tombstones`: one row per deleted task (including cascaded
+      subtasks and tasks moved to another user), with the change_seq of the
+      deletion, kept for the retention window
+
+  3. Functions
+    - prune_task_tombstones(retention seconds): drop expired tombstones.
+      Schedule it (for example with pg_cron) using the backend's
+      TASK_TOMBSTONE_RETENTION_SECONDS; older sync cursors get 410 and resync.
+
+  4. Security
+    - Users can read their own tombstones; rows are only written by triggers
+*/
+
+CREATE SEQUENCE IF NOT EXISTS task_change_seq;
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS change_seq bigint NOT NULL DEFAULT nextval('task_change_seq');
+CREATE INDEX IF NOT EXISTS idx_tasks_user_change_seq ON tasks (user_id, change_seq);
+
+CREATE TABLE IF NOT EXISTS task_tombstones (
+  id uuid PRIMARY KEY,
+  user_id uuid NOT NULL,
+  change_seq bigint NOT NULL DEFAULT nextval('task_change_seq'),
+  deleted_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_task_tombstones_user_change_seq ON task_tombstones (user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_task_tombstones_deleted_at ON task_tombstones (deleted_at);
+
+ALTER TABLE task_tombstones ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can read own task tombstones" ON task_tombstones;
+CREATE POLICY "Users can read own task tombstones"
+  ON task_tombstones FOR SELECT
+  TO authenticated
+  USING (auth.uid() = user_id);
+
+CREATE OR REPLACE FUNCTION tasks_bump_change_seq()
+RETURNS trigger AS $$
+BEGIN
+  NEW.change_seq := nextval('task_change_seq');
+  NEW.updated_at := now();
+  IF OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+    INSERT INTO task_tombstones (id, user_id)
+    VALUES (OLD.id, OLD.user_id)
+    ON CONFLICT (id) DO UPDATE
+      SET user_id = excluded.user_id, change_seq = excluded.change_seq, deleted_at = excluded.deleted_at;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS tasks_bump_change_seq ON tasks;
+CREATE TRIGGER tasks_bump_change_seq
+  BEFORE UPDATE ON tasks
+  FOR EACH ROW EXECUTE FUNCTION tasks_bump_change_seq();
+
+CREATE OR REPLACE FUNCTION tasks_record_tombstone()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO task_tombstones (id, user_id)
+  VALUES (OLD.id, OLD.user_id)
+  ON CONFLICT (id) DO UPDATE
+    SET user_id = excluded.user_id, change_seq = excluded.change_seq, deleted_at = excluded.deleted_at;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS tasks_record_tombstone ON tasks;
+CREATE TRIGGER tasks_record_tombstone
+  AFTER DELETE ON tasks
+  FOR EACH ROW EXECUTE FUNCTION tasks_record_tombstone();
+
+CREATE OR REPLACE FUNCTION prune_task_tombstones(p_retention_seconds double precision)
+RETURNS integer AS $$
+DECLARE
+  pruned integer;
+BEGIN
+  DELETE FROM task_tombstones WHERE deleted_at < now() - make_interval(secs => p_retention_seconds);
+  GET DIAGNOSTICS pruned = ROW_COUNT;
+  RETURN pruned;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION prune_task_tombstones(double precision) FROM PUBLIC, anon, authenticated;
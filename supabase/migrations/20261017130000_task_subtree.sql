@@ -0,0 +1,36 @@
+/*
+  # Subtask tree in one query (GET /api/tasks/{id}/tree)
+
+  1. Functions
+    - task_subtree(root id, max depth, row limit): the task and its
+      descendants down to `max depth` levels, breadth first with siblings in
+      list order, at most `row limit` rows. One recursive walk of
+      idx_tasks_parent_id; the backend nests the rows.
+
+  2. Security
+    - SECURITY INVOKER: row level security on tasks applies, so a user only
+      ever walks their own tasks
+*/
+
+CREATE OR REPLACE FUNCTION task_subtree(p_root uuid, p_max_depth integer, p_limit integer)
+RETURNS SETOF tasks AS $$
+  WITH RECURSIVE subtree(id, depth) AS (
+    SELECT id, 0 FROM tasks WHERE id = p_root
+    UNION ALL
+    SELECT child.id, subtree.depth + 1
+    FROM subtree
+    JOIN tasks child ON child.parent_id = subtree.id
+    WHERE subtree.depth < p_max_depth
+  ),
+  -- The recursion stops as soon as enough rows were produced
+  limited AS (
+    SELECT id, depth FROM subtree LIMIT p_limit
+  )
+  SELECT tasks.*
+  FROM limited
+  JOIN tasks ON tasks.id = limited.id
+  ORDER BY limited.depth, tasks."isStarred" DESC NULLS LAST, tasks."dueAt" ASC NULLS LAST, tasks.id;
+$$ LANGUAGE sql STABLE SECURITY INVOKER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION task_subtree(uuid, integer, integer) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION task_subtree(uuid, integer, integer) TO authenticated;
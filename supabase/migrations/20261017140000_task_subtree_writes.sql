@@ -0,0 +1,49 @@
+/*
+  # Cascading subtask delete and status update (?cascade=true)
+
+  1. Functions
+    - delete_task_subtree(root id): delete the task and all of its
+      descendants in one statement, returning their ids so the backend can
+      cancel their reminders in one batch
+    - set_task_subtree_status(root id, status): set the status of the task
+      and all of its descendants in one statement, returning their ids
+    Both collect the subtree with one recursive walk of idx_tasks_parent_id
+    (UNION, so a parent cycle cannot loop).
+
+  2. Security
+    - SECURITY INVOKER: row level security on tasks applies, so a user only
+      ever reaches their own tasks
+*/
+
+CREATE OR REPLACE FUNCTION delete_task_subtree(p_root uuid)
+RETURNS SETOF uuid AS $$
+  WITH RECURSIVE subtree(id) AS (
+    SELECT id FROM tasks WHERE id = p_root
+    UNION
+    SELECT child.id
+    FROM subtree
+    JOIN tasks child ON child.parent_id = subtree.id
+  )
+  DELETE FROM tasks
+  WHERE id IN (SELECT id FROM subtree)
+  RETURNING id;
+$$ LANGUAGE sql VOLATILE SECURITY INVOKER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION set_task_subtree_status(p_root uuid, p_status text)
+RETURNS SETOF uuid AS $$
+  WITH RECURSIVE subtree(id) AS (
+    SELECT id FROM tasks WHERE id = p_root
+    UNION
+    SELECT child.id
+    FROM subtree
+    JOIN tasks child ON child.parent_id = subtree.id
+  )
+  UPDATE tasks SET status = p_status
+  WHERE id IN (SELECT id FROM subtree)
+  RETURNING id;
+$$ LANGUAGE sql VOLATILE SECURITY INVOKER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION delete_task_subtree(uuid) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION delete_task_subtree(uuid) TO authenticated;
+REVOKE EXECUTE ON FUNCTION set_task_subtree_status(uuid, text) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION set_task_subtree_status(uuid, text) TO authenticated;
@@ -0,0 +1,154 @@
+/*
+  # Subtask progress counters on every task
+
+  1. Schema Changes
+    - `tasks.subtask_count` / `tasks.subtasks_done`: direct subtasks, and how
+      many of them are done
+    - `tasks.descendant_count` / `tasks.descendants_done`: the same over all
+      subtasks at any depth
+    Existing rows are filled in once, below.
+
+  2. Triggers
+    - tasks_roll_up_subtasks: after a task is inserted or deleted, or its
+      parent_id, status or user_id changes, take it (with its own subtree)
+      out of the counters of its old parent and ancestors and add it to the
+      new ones. One walk up the parent chain per write; UNION stops at a
+      parent cycle.
+    Only a parent owned by the same user counts a task: the walk stops at
+    the first ancestor of another user, so a parentId pointing at someone
+    else's task never reaches their counters (the functions run as
+    SECURITY DEFINER, past RLS). A task moved to another user recounts its
+    own subtasks for the new owner.
+    The counter updates refresh change_seq/updated_at of the ancestors
+    (tasks_bump_change_seq), so delta sync picks the new counts up.
+*/
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS subtask_count integer NOT NULL DEFAULT 0;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS subtasks_done integer NOT NULL DEFAULT 0;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS descendant_count integer NOT NULL DEFAULT 0;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS descendants_done integer NOT NULL DEFAULT 0;
+
+-- Add (p_sign = 1) or remove (p_sign = -1) a task and its subtree in the counters
+-- of its ancestors owned by the same user
+CREATE OR REPLACE FUNCTION tasks_roll_up(p_task tasks, p_sign integer)
+RETURNS void AS $$
+  UPDATE tasks
+  SET subtask_count = subtask_count + p_sign,
+      subtasks_done = subtasks_done + p_sign * (p_task.status = 'done')::integer
+  WHERE id = p_task.parent_id AND user_id = p_task.user_id;
+
+  WITH RECURSIVE ancestors(id) AS (
+    SELECT id FROM tasks WHERE id = p_task.parent_id AND user_id = p_task.user_id
+    UNION
+    SELECT parent.id
+    FROM ancestors
+    JOIN tasks child ON child.id = ancestors.id
+    JOIN tasks parent ON parent.id = child.parent_id
+    WHERE parent.user_id = p_task.user_id
+  )
+  UPDATE tasks
+  SET descendant_count = descendant_count + p_sign * (1 + p_task.descendant_count),
+      descendants_done = descendants_done + p_sign * ((p_task.status = 'done')::integer + p_task.descendants_done)
+  WHERE id IN (SELECT id FROM ancestors);
+$$ LANGUAGE sql VOLATILE SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION tasks_roll_up(tasks, integer) FROM PUBLIC, anon, authenticated;
+
+-- Counters of a task from its direct subtasks owned by the same user
+CREATE OR REPLACE FUNCTION tasks_recount_subtasks(p_task_id uuid)
+RETURNS void AS $$
+  UPDATE tasks
+  SET subtask_count = counts.subtask_count,
+      subtasks_done = counts.subtasks_done,
+      descendant_count = counts.descendant_count,
+      descendants_done = counts.descendants_done
+  FROM (
+    SELECT count(child.id) AS subtask_count,
+           count(child.id) FILTER (WHERE child.status = 'done') AS subtasks_done,
+           coalesce(sum(1 + child.descendant_count), 0) AS descendant_count,
+           coalesce(sum((child.status = 'done')::integer + child.descendants_done), 0) AS descendants_done
+    FROM tasks task
+    JOIN tasks child ON child.parent_id = task.id AND child.user_id = task.user_id AND child.id <> task.id
+    WHERE task.id = p_task_id
+  ) counts
+  WHERE tasks.id = p_task_id;
+$$ LANGUAGE sql VOLATILE SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION tasks_recount_subtasks(uuid) FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION tasks_roll_up_subtasks()
+RETURNS trigger AS $$
+DECLARE
+  moved tasks;
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    IF OLD.parent_id IS NOT NULL THEN
+      PERFORM tasks_roll_up(OLD, -1);
+    END IF;
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    moved := NEW;
+    IF TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+      PERFORM tasks_recount_subtasks(NEW.id);
+      SELECT * INTO moved FROM tasks WHERE id = NEW.id;
+    END IF;
+    IF NEW.parent_id IS NOT NULL THEN
+      PERFORM tasks_roll_up(moved, 1);
+    END IF;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS tasks_roll_up_subtasks_insert ON tasks;
+CREATE TRIGGER tasks_roll_up_subtasks_insert
+  AFTER INSERT ON tasks
+  FOR EACH ROW
+  WHEN (NEW.parent_id IS NOT NULL)
+  EXECUTE FUNCTION tasks_roll_up_subtasks();
+
+DROP TRIGGER IF EXISTS tasks_roll_up_subtasks_update ON tasks;
+CREATE TRIGGER tasks_roll_up_subtasks_update
+  AFTER UPDATE OF parent_id, status, user_id ON tasks
+  FOR EACH ROW
+  WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id OR OLD.status IS DISTINCT FROM NEW.status
+        OR OLD.user_id IS DISTINCT FROM NEW.user_id)
+  EXECUTE FUNCTION tasks_roll_up_subtasks();
+
+DROP TRIGGER IF EXISTS tasks_roll_up_subtasks_delete ON tasks;
+CREATE TRIGGER tasks_roll_up_subtasks_delete
+  AFTER DELETE ON tasks
+  FOR EACH ROW
+  WHEN (OLD.parent_id IS NOT NULL)
+  EXECUTE FUNCTION tasks_roll_up_subtasks();
+
+-- Fill in the counters of existing tasks: every task counts once in each ancestor
+-- up to the first one owned by another user
+WITH RECURSIVE chain(ancestor_id, owner_id, done, direct) AS (
+  SELECT parent.id, child.user_id, (child.status = 'done')::integer, true
+  FROM tasks child
+  JOIN tasks parent ON parent.id = child.parent_id AND parent.user_id = child.user_id
+  UNION ALL
+  SELECT parent.id, chain.owner_id, chain.done, false
+  FROM chain
+  JOIN tasks ON tasks.id = chain.ancestor_id
+  JOIN tasks parent ON parent.id = tasks.parent_id AND parent.user_id = chain.owner_id
+) CYCLE ancestor_id SET is_cycle USING path,
+counts AS (
+  SELECT chain.ancestor_id AS id,
+         count(*) FILTER (WHERE chain.direct) AS subtask_count,
+         coalesce(sum(chain.done) FILTER (WHERE chain.direct), 0) AS subtasks_done,
+         count(*) AS descendant_count,
+         sum(chain.done) AS descendants_done
+  FROM chain
+  JOIN tasks ON tasks.id = chain.ancestor_id
+  WHERE NOT chain.is_cycle
+  GROUP BY chain.ancestor_id
+)
+UPDATE tasks
+SET subtask_count = counts.subtask_count,
+    subtasks_done = counts.subtasks_done,
+    descendant_count = counts.descendant_count,
+    descendants_done = counts.descendants_done
+FROM counts
+WHERE tasks.id = counts.id;
@@ -0,0 +1,10 @@
+/*
+  # Category renames and deletes carried over to tasks
+
+  1. Indexes
+    - Index on tasks (user_id, category): renaming or deleting a category
+      moves the user's tasks with one UPDATE ... WHERE user_id = ? AND
+      category = ?, which reads only the affected rows
+*/
+
+CREATE INDEX IF NOT EXISTS idx_tasks_user_category ON tasks (user_id, category);
@@ -0,0 +1,33 @@
+/*
+  # Batch task updates in one statement (POST /api/tasks/batch)
+
+  1. Functions
+    - update_tasks_batch(updates): apply a JSON array of
+      {id, title?, status?, dueAt?, isStarred?, category?} objects with one
+      UPDATE ... FROM jsonb_to_recordset, returning the updated rows. Only
+      the fields present in an object are written; the columns kept by
+      triggers (change_seq, updated_at, the subtask counters) are never sent
+      back, so a concurrent trigger update cannot be overwritten.
+
+  2. Security
+    - SECURITY INVOKER: row level security on tasks applies, and rows are
+      limited to the caller's own (auth.uid())
+*/
+
+CREATE OR REPLACE FUNCTION update_tasks_batch(p_updates jsonb)
+RETURNS SETOF tasks AS $$
+  UPDATE tasks
+  SET title = COALESCE(changes.title, tasks.title),
+      status = COALESCE(changes.status, tasks.status),
+      "dueAt" = COALESCE(changes."dueAt", tasks."dueAt"),
+      "isStarred" = COALESCE(changes."isStarred", tasks."isStarred"),
+      category = COALESCE(changes.category, tasks.category)
+  FROM jsonb_to_recordset(p_updates) AS changes(
+    id uuid, title text, status text, "dueAt" timestamptz, "isStarred" boolean, category text
+  )
+  WHERE tasks.id = changes.id AND tasks.user_id = auth.uid()
+  RETURNING tasks.*;
+$$ LANGUAGE sql VOLATILE SECURITY INVOKER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION update_tasks_batch(jsonb) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION update_tasks_batch(jsonb) TO authenticated;
@@ -0,0 +1,18 @@
+/*
+  # isStarred is never NULL
+
+  1. Schema Changes
+    - Backfill NULL `isStarred` values with false, then make the column
+      NOT NULL DEFAULT false
+
+  2. Notes
+    - The task list sorts NULL like false (task_sort_key() in the backend),
+      but ORDER BY "isStarred" DESC NULLS LAST puts NULL rows after every
+      false row, so keyset pages could skip or repeat them. Without NULLs
+      both orders agree and idx_tasks_user_list_order still matches.
+*/
+
+UPDATE tasks SET "isStarred" = false WHERE "isStarred" IS NULL;
+
+ALTER TABLE tasks ALTER COLUMN "isStarred" SET DEFAULT false;
+ALTER TABLE tasks ALTER COLUMN "isStarred" SET NOT NULL;
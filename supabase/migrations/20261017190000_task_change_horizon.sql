@@ -0,0 +1,99 @@
+/*
+  # Commit-safe cursor for delta sync (GET /api/tasks/changes)
+
+  `change_seq` is drawn when a row is written, not when its transaction
+  commits: a transaction holding seq 5 can commit after one holding seq 6,
+  and a sync that already moved its cursor past 6 never sees 5. A finished
+  transaction can also hold a higher seq than one still running, so no bound
+  on change_seq computed from visible rows is safe.
+
+  The sync now pages on the id of the writing transaction instead, and only
+  hands out rows written by transactions below the snapshot's xmin: all of
+  those have finished, and any later write gets an id at or above it.
+
+  1. Schema Changes
+    - `tasks.change_xid`, `task_tombstones.change_xid`: pg_current_xact_id()
+      of the transaction that last wrote the row (set by the existing
+      triggers next to change_seq)
+    - Indexes on (user_id, change_xid, id)
+
+  2. Functions
+    - task_changes(after xid, after id, limit): the caller's changed tasks
+      and tombstones after (after xid, after id) in (change_xid, id) order,
+      plus the horizon (snapshot xmin) to resume from once caught up.
+      Runs as the caller, so RLS applies.
+*/
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+CREATE INDEX IF NOT EXISTS idx_tasks_user_change_xid ON tasks (user_id, change_xid, id);
+
+ALTER TABLE task_tombstones ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+CREATE INDEX IF NOT EXISTS idx_task_tombstones_user_change_xid ON task_tombstones (user_id, change_xid, id);
+
+CREATE OR REPLACE FUNCTION tasks_bump_change_seq()
+RETURNS trigger AS $$
+BEGIN
+  NEW.change_seq := nextval('task_change_seq');
+  NEW.change_xid := pg_current_xact_id();
+  NEW.updated_at := now();
+  IF OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+    INSERT INTO task_tombstones (id, user_id)
+    VALUES (OLD.id, OLD.user_id)
+    ON CONFLICT (id) DO UPDATE
+      SET user_id = excluded.user_id, change_seq = excluded.change_seq,
+          change_xid = excluded.change_xid, deleted_at = excluded.deleted_at;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION tasks_record_tombstone()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO task_tombstones (id, user_id)
+  VALUES (OLD.id, OLD.user_id)
+  ON CONFLICT (id) DO UPDATE
+    SET user_id = excluded.user_id, change_seq = excluded.change_seq,
+        change_xid = excluded.change_xid, deleted_at = excluded.deleted_at;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- p_after_xid NULL: full sync, live tasks only
+CREATE OR REPLACE FUNCTION task_changes(p_after_xid bigint, p_after_id uuid, p_limit integer)
+RETURNS jsonb AS $$
+  WITH horizon AS (
+    SELECT pg_snapshot_xmin(pg_current_snapshot()) AS xmin
+  ), resume AS (
+    SELECT p_after_xid::text::xid8 AS xid,
+           COALESCE(p_after_id, '00000000-0000-0000-0000-000000000000'::uuid) AS id
+  ), changes AS (
+    SELECT t.change_xid, t.id, to_jsonb(t) - 'change_xid' AS task
+    FROM tasks t, horizon h, resume a
+    WHERE t.user_id = auth.uid()
+      AND t.change_xid < h.xmin
+      AND (a.xid IS NULL OR (t.change_xid, t.id) > (a.xid, a.id))
+    UNION ALL
+    SELECT d.change_xid, d.id, NULL
+    FROM task_tombstones d, horizon h, resume a
+    WHERE a.xid IS NOT NULL
+      AND d.user_id = auth.uid()
+      AND d.change_xid < h.xmin
+      AND (d.change_xid, d.id) > (a.xid, a.id)
+      -- A task moved away and back has both; the live row wins
+      AND NOT EXISTS (SELECT 1 FROM tasks t WHERE t.id = d.id AND t.user_id = d.user_id)
+    ORDER BY 1, 2
+    LIMIT p_limit
+  )
+  SELECT jsonb_build_object(
+    'horizon', (SELECT xmin::text::bigint FROM horizon),
+    'changes', COALESCE(
+      (SELECT jsonb_agg(jsonb_build_object('xid', change_xid::text::bigint, 'id', id, 'task', task)
+                        ORDER BY change_xid, id)
+       FROM changes),
+      '[]'::jsonb
+    )
+  );
+$$ LANGUAGE sql STABLE SECURITY INVOKER SET search_path = public;
+
+GRANT EXECUTE ON FUNCTION task_changes(bigint, uuid, integer) TO authenticated;
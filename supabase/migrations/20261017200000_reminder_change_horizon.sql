@@ -0,0 +1,57 @@
+/*
+  # Commit-safe polling of reminder change notifications
+
+  `reminder_changes.seq` is drawn when a notification is inserted, not when
+  it commits, so a worker polling with `seq > last seen` could move past a
+  notification that commits late and miss a cancellation. Notifications are
+  now read in (transaction id, seq) order, and only from transactions below
+  the snapshot's xmin, which have all finished.
+
+  1. Schema Changes
+    - `reminder_changes.change_xid`: pg_current_xact_id() of the inserting
+      transaction, indexed with seq
+
+  2. Functions
+    - reminder_changes_horizon(): the snapshot xmin, where a new worker
+      starts polling
+    - poll_reminder_changes(after xid, after seq, limit): notifications after
+      (after xid, after seq) below the horizon, plus the horizon
+
+  3. Security
+    - Service role only, like the other lease functions
+*/
+
+ALTER TABLE reminder_changes ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+CREATE INDEX IF NOT EXISTS idx_reminder_changes_change_xid ON reminder_changes (change_xid, seq);
+
+CREATE OR REPLACE FUNCTION reminder_changes_horizon()
+RETURNS bigint AS $$
+  SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION poll_reminder_changes(p_after_xid bigint, p_after_seq bigint, p_limit integer)
+RETURNS jsonb AS $$
+  WITH horizon AS (
+    SELECT pg_snapshot_xmin(pg_current_snapshot()) AS xmin
+  ), changes AS (
+    SELECT c.change_xid, c.seq, c.bucket, c.task_id
+    FROM reminder_changes c, horizon h
+    WHERE c.change_xid < h.xmin
+      AND (c.change_xid, c.seq) > (p_after_xid::text::xid8, p_after_seq)
+    ORDER BY c.change_xid, c.seq
+    LIMIT p_limit
+  )
+  SELECT jsonb_build_object(
+    'horizon', (SELECT xmin::text::bigint FROM horizon),
+    'changes', COALESCE(
+      (SELECT jsonb_agg(jsonb_build_object('xid', change_xid::text::bigint, 'seq', seq,
+                                           'bucket', bucket, 'task_id', task_id)
+                        ORDER BY change_xid, seq)
+       FROM changes),
+      '[]'::jsonb
+    )
+  );
+$$ LANGUAGE sql STABLE;
+
+REVOKE EXECUTE ON FUNCTION reminder_changes_horizon() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION poll_reminder_changes(bigint, bigint, integer) FROM PUBLIC, anon, authenticated;
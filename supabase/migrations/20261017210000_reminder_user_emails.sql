@@ -0,0 +1,19 @@
+/*
+  # Email lookup for reminder delivery
+
+  1. Functions
+    - reminder_user_emails(user_ids): (id, email) of the given users from
+      auth.users, which PostgREST does not expose; the scheduler looks up
+      every user of a reminder tick in one call
+
+  2. Security
+    - SECURITY DEFINER to read auth.users; callable by the service role only
+*/
+
+CREATE OR REPLACE FUNCTION reminder_user_emails(p_user_ids uuid[])
+RETURNS TABLE (id uuid, email text) AS $$
+  SELECT u.id, u.email::text FROM auth.users u WHERE u.id = ANY(p_user_ids);
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION reminder_user_emails(uuid[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION reminder_user_emails(uuid[]) TO service_role;
@@ -0,0 +1,74 @@
+/*
+  # Category renames and deletes in one transaction
+
+  Renaming a category took three requests (read the old name, update the
+  category, refile its tasks) and deleting one with ?move_to= took three as
+  well; a failure in between left tasks under a name no category has.
+
+  1. Functions
+    - update_category(id, name, color): updates the caller's category and,
+      when the name changes, moves the tasks filed under the old name;
+      returns the updated row (none if the category is not the caller's)
+    - delete_category(id, move_to): deletes the caller's category and moves
+      its tasks to the `move_to` category's name (NULL: uncategorised);
+      returns 'deleted', 'not_found' or 'target_not_found'
+
+  Both run as the caller, so RLS applies, and use idx_tasks_user_category.
+*/
+
+CREATE OR REPLACE FUNCTION update_category(p_category_id uuid, p_name text, p_color text)
+RETURNS SETOF categories AS $$
+DECLARE
+  old_name text;
+  updated categories;
+BEGIN
+  SELECT name INTO old_name FROM categories
+  WHERE id = p_category_id AND user_id = auth.uid()
+  FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  UPDATE categories
+  SET name = COALESCE(p_name, name), color = COALESCE(p_color, color), updated_at = now()
+  WHERE id = p_category_id
+  RETURNING * INTO updated;
+
+  IF updated.name IS DISTINCT FROM old_name THEN
+    UPDATE tasks SET category = updated.name WHERE user_id = auth.uid() AND category = old_name;
+  END IF;
+  RETURN NEXT updated;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION delete_category(p_category_id uuid, p_move_to uuid)
+RETURNS text AS $$
+DECLARE
+  old_name text;
+  target_name text;
+BEGIN
+  IF p_move_to IS NOT NULL THEN
+    SELECT name INTO target_name FROM categories
+    WHERE id = p_move_to AND user_id = auth.uid()
+    FOR SHARE;
+    IF NOT FOUND THEN
+      RETURN 'target_not_found';
+    END IF;
+  END IF;
+
+  DELETE FROM categories
+  WHERE id = p_category_id AND user_id = auth.uid()
+  RETURNING name INTO old_name;
+  IF NOT FOUND THEN
+    RETURN 'not_found';
+  END IF;
+
+  IF target_name IS DISTINCT FROM old_name THEN
+    UPDATE tasks SET category = target_name WHERE user_id = auth.uid() AND category = old_name;
+  END IF;
+  RETURN 'deleted';
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER SET search_path = public;
+
+GRANT EXECUTE ON FUNCTION update_category(uuid, text, text) TO authenticated;
+GRANT EXECUTE ON FUNCTION delete_category(uuid, uuid) TO authenticated;
@@ -0,0 +1,65 @@
+/*
+  # Task batches in one transaction, in request order (POST /api/tasks/batch)
+
+  A batch ran as one insert, one update_tasks_batch call and one delete:
+  updates were applied before deletes whatever order the client sent them
+  in, so "update X; delete X; update X" reported the last update as a
+  success where the fallback databases report it not found, and a failed
+  delete left the inserts and updates of the batch applied.
+
+  1. Functions
+    - apply_task_batch(operations): apply a JSON array of
+      {op, id, data} objects in order, in the calling transaction. Returns
+      one element per operation: the created, updated or deleted row, or
+      null when the task is not the caller's. Updates write only the fields
+      present in `data`, like update_tasks_batch did.
+    - update_tasks_batch is dropped (no longer called)
+
+  2. Security
+    - SECURITY INVOKER: row level security on tasks applies, and rows are
+      limited to the caller's own (auth.uid())
+*/
+
+CREATE OR REPLACE FUNCTION apply_task_batch(p_operations jsonb)
+RETURNS jsonb AS $$
+DECLARE
+  operation jsonb;
+  fields jsonb;
+  task tasks;
+  results jsonb := '[]'::jsonb;
+BEGIN
+  FOR operation IN SELECT value FROM jsonb_array_elements(p_operations) LOOP
+    fields := COALESCE(operation->'data', '{}'::jsonb);
+    task := NULL;
+    IF operation->>'op' = 'create' THEN
+      INSERT INTO tasks (user_id, title, status, "dueAt", "isStarred", category, parent_id)
+      VALUES (auth.uid(), fields->>'title', COALESCE(fields->>'status', 'pending'),
+              (fields->>'dueAt')::timestamptz, COALESCE((fields->>'isStarred')::boolean, false),
+              fields->>'category', (fields->>'parent_id')::uuid)
+      RETURNING * INTO task;
+    ELSIF operation->>'op' = 'update' THEN
+      UPDATE tasks
+      SET title = COALESCE(fields->>'title', title),
+          status = COALESCE(fields->>'status', status),
+          "dueAt" = COALESCE((fields->>'dueAt')::timestamptz, "dueAt"),
+          "isStarred" = COALESCE((fields->>'isStarred')::boolean, "isStarred"),
+          category = COALESCE(fields->>'category', category)
+      WHERE id = (operation->>'id')::uuid AND user_id = auth.uid()
+      RETURNING * INTO task;
+    ELSE
+      DELETE FROM tasks
+      WHERE id = (operation->>'id')::uuid AND user_id = auth.uid()
+      RETURNING * INTO task;
+    END IF;
+    results := results || jsonb_build_array(
+      CASE WHEN task.id IS NULL THEN NULL ELSE to_jsonb(task) - 'change_xid' END
+    );
+  END LOOP;
+  RETURN results;
+END;
+$$ LANGUAGE plpgsql VOLATILE SECURITY INVOKER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION apply_task_batch(jsonb) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION apply_task_batch(jsonb) TO authenticated;
+
+DROP FUNCTION IF EXISTS update_tasks_batch(jsonb);
@@ -0,0 +1,84 @@
+/*
+  # Shared list versions for conditional GETs (ETags of GET /api/tasks/ and /api/categories/)
+
+  List versions were kept per process: only the worker that handled a write
+  bumped its version, and every other worker or replica kept answering 304
+  to the stale ETag. The versions now live in the database and are bumped by
+  triggers in the transaction that writes the rows, so they change for every
+  replica when the write commits, whichever path made it.
+
+  1. Schema Changes
+    - `list_versions` (user_id, kind, version): kind is 'tasks' or
+      'categories'; version is epoch microseconds and only ever grows
+
+  2. Functions and Triggers
+    - bump_list_versions(kind): statement-level trigger function, bumps the
+      version of every user whose rows the statement inserted, updated
+      (both owners when a row moves) or deleted
+    - On tasks and categories, one trigger per statement type
+
+  3. Security
+    - RLS on with no policies: only the service role reads the table, the
+      trigger function writes it as its owner
+*/
+
+CREATE TABLE IF NOT EXISTS list_versions (
+  user_id uuid NOT NULL,
+  kind text NOT NULL,
+  version bigint NOT NULL,
+  PRIMARY KEY (user_id, kind)
+);
+
+ALTER TABLE list_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION bump_list_versions()
+RETURNS trigger AS $$
+DECLARE
+  now_us bigint := (extract(epoch FROM clock_timestamp()) * 1000000)::bigint;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO list_versions (user_id, kind, version)
+    SELECT DISTINCT user_id, TG_ARGV[0], now_us FROM new_rows
+    ON CONFLICT (user_id, kind) DO UPDATE SET version = GREATEST(list_versions.version + 1, excluded.version);
+  ELSIF TG_OP = 'UPDATE' THEN
+    INSERT INTO list_versions (user_id, kind, version)
+    SELECT user_id, TG_ARGV[0], now_us FROM (SELECT user_id FROM new_rows UNION SELECT user_id FROM old_rows) AS users
+    ON CONFLICT (user_id, kind) DO UPDATE SET version = GREATEST(list_versions.version + 1, excluded.version);
+  ELSE
+    INSERT INTO list_versions (user_id, kind, version)
+    SELECT DISTINCT user_id, TG_ARGV[0], now_us FROM old_rows
+    ON CONFLICT (user_id, kind) DO UPDATE SET version = GREATEST(list_versions.version + 1, excluded.version);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS tasks_list_version_insert ON tasks;
+CREATE TRIGGER tasks_list_version_insert AFTER INSERT ON tasks
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_list_versions('tasks');
+
+DROP TRIGGER IF EXISTS tasks_list_version_update ON tasks;
+CREATE TRIGGER tasks_list_version_update AFTER UPDATE ON tasks
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_list_versions('tasks');
+
+DROP TRIGGER IF EXISTS tasks_list_version_delete ON tasks;
+CREATE TRIGGER tasks_list_version_delete AFTER DELETE ON tasks
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_list_versions('tasks');
+
+DROP TRIGGER IF EXISTS categories_list_version_insert ON categories;
+CREATE TRIGGER categories_list_version_insert AFTER INSERT ON categories
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_list_versions('categories');
+
+DROP TRIGGER IF EXISTS categories_list_version_update ON categories;
+CREATE TRIGGER categories_list_version_update AFTER UPDATE ON categories
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_list_versions('categories');
+
+DROP TRIGGER IF EXISTS categories_list_version_delete ON categories;
+CREATE TRIGGER categories_list_version_delete AFTER DELETE ON categories
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_list_versions('categories');